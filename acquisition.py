@@ -0,0 +1,124 @@
+"""Background acquisition thread decoupling servo I/O from the GUI.
+
+The worker owns the servo: every command and every poll runs on its thread.
+Snapshots and status messages are published on :attr:`AcquisitionWorker.events`
+as ``("snapshot", SdoSnapshot)`` and ``("status", str)`` tuples, so a GUI
+only has to drain the queue and render the newest snapshot.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from typing import Callable, Optional, Sequence
+
+
+class AcquisitionWorker:
+    """Poll ``entries`` from ``servo`` every ``period`` seconds on a thread.
+
+    Parameters
+    ----------
+    servo
+        ``EthercatServo`` or ``ServoSimulator``; only this worker may use it
+        once started.
+    entries : sequence
+        ``(index, subindex, size[, signed])`` tuples passed to
+        ``read_sdo_many``.
+    period : float
+        Acquisition period in seconds, independent of any redraw rate.
+    max_events : int
+        Capacity of :attr:`events`; the oldest event is dropped when a slow
+        consumer lets it fill up.
+    on_snapshot : callable, optional
+        Called with every snapshot on the worker thread, before it is
+        published.  Unlike :attr:`events` it sees every sample, e.g. to fill
+        a :class:`telemetry.Recorder` at the full acquisition rate.
+    """
+
+    def __init__(self, servo, entries: Sequence, period: float = 0.05, max_events: int = 64,
+                 on_snapshot: Optional[Callable] = None) -> None:
+        self.servo = servo
+        self.entries = list(entries)
+        self.period = period
+        self.on_snapshot = on_snapshot
+        self.events: queue.Queue = queue.Queue(maxsize=max_events)
+        self.polling = False
+        self._commands: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="servo-acquisition", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 1.0) -> None:
+        """Run pending commands, then stop; give up waiting after ``timeout``."""
+        self._stop.set()
+        self._commands.put(None)  # wake the thread
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, func: Callable, *args, done: Optional[str] = None) -> None:
+        """Queue ``func(*args)`` for the worker thread and return immediately.
+
+        ``done`` is published as a status message on success; exceptions are
+        published as ``"Error: ..."``.
+        """
+        self._commands.put((func, args, done))
+
+    def publish(self, kind: str, payload) -> None:
+        while True:
+            try:
+                self.events.put_nowait((kind, payload))
+                return
+            except queue.Full:
+                try:
+                    self.events.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _execute(self, command) -> None:
+        func, args, done = command
+        try:
+            func(*args)
+        except Exception as exc:
+            self.publish("status", f"Error: {exc}")
+        else:
+            if done:
+                self.publish("status", done)
+
+    def _run(self) -> None:
+        next_poll = time.monotonic()
+        while True:
+            timeout = max(0.0, next_poll - time.monotonic()) if self.polling else None
+            try:
+                command = self._commands.get(timeout=timeout)
+            except queue.Empty:
+                command = None
+            if command is not None:
+                self._execute(command)
+            if self._stop.is_set():
+                # Finish whatever was queued before stop(), e.g. close().
+                while True:
+                    try:
+                        command = self._commands.get_nowait()
+                    except queue.Empty:
+                        return
+                    if command is not None:
+                        self._execute(command)
+            if self.polling and time.monotonic() >= next_poll:
+                next_poll += self.period
+                if next_poll < time.monotonic():
+                    next_poll = time.monotonic() + self.period
+                try:
+                    snapshot = self.servo.read_sdo_many(self.entries)
+                    if self.on_snapshot is not None:
+                        self.on_snapshot(snapshot)
+                    self.publish("snapshot", snapshot)
+                except Exception as exc:
+                    self.publish("status", f"Error: {exc}")
@@ -0,0 +1,82 @@
+"""Asyncio front end for the blocking servo backends.
+
+:class:`AsyncServo` owns one I/O thread per servo.  Every servo method is
+available as a coroutine that runs the call on that thread, so the event loop
+keeps running while a drive is opened or enabled, and several servos can be
+driven concurrently with :func:`asyncio.gather`.  Calls on one servo are
+serialised in submission order, as the mailbox requires.
+
+A call that times out or whose task is cancelled stops being awaited at once,
+but the operation already running on the I/O thread finishes; later calls
+queue behind it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Optional, Sequence
+
+
+class AsyncServo:
+    """Awaitable wrapper around an ``EthercatServo`` or ``ServoSimulator``.
+
+    Parameters
+    ----------
+    servo
+        The blocking backend.  Once wrapped, only the I/O thread may use it.
+    timeout : float, optional
+        Default timeout in seconds for every call; ``None`` waits forever.
+        Override per call with the ``timeout`` keyword.
+    """
+
+    def __init__(self, servo, timeout: Optional[float] = None) -> None:
+        self.servo = servo
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="servo-io")
+
+    async def call(self, func, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run ``func(*args, **kwargs)`` on the I/O thread and await it."""
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        if timeout is None:
+            timeout = self.timeout
+        if timeout is None:
+            return await future
+        return await asyncio.wait_for(future, timeout)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.servo, name)
+        if not callable(attr):
+            return attr
+
+        async def method(*args, timeout: Optional[float] = None, **kwargs):
+            return await self.call(attr, *args, timeout=timeout, **kwargs)
+
+        method.__name__ = name
+        method.__doc__ = attr.__doc__
+        return method
+
+    async def poll(self, entries: Sequence, period: float) -> AsyncIterator:
+        """Yield a ``read_sdo_many(entries)`` snapshot every ``period`` seconds."""
+        loop = asyncio.get_running_loop()
+        next_poll = loop.time()
+        while True:
+            yield await self.call(self.servo.read_sdo_many, entries)
+            next_poll += period
+            await asyncio.sleep(max(0.0, next_poll - loop.time()))
+
+    async def aclose(self) -> None:
+        """Close the servo on the I/O thread and stop the thread."""
+        try:
+            await self.call(self.servo.close)
+        finally:
+            self._executor.shutdown(wait=False)
+
+    def shutdown(self) -> None:
+        """Synchronous :meth:`aclose` for code outside an event loop."""
+        try:
+            self._executor.submit(self.servo.close).result()
+        finally:
+            self._executor.shutdown(wait=False)
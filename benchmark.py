@@ -0,0 +1,253 @@
+"""Performance benchmarks for the servo backends.
+
+Measures ESI loading, single SDO reads and writes, batched snapshot reads,
+the time from ``open()`` to *Operation enabled*, a full ``demo.main`` run and
+the process-data cycle of a 1 and 1000 slave ``SimulatedNetwork``, on the
+simulator (default), a ``servo-sim`` daemon or real hardware::
+
+    python benchmark.py                          # sim backend
+    python benchmark.py --backend hw --ifname eth0
+    python benchmark.py --baseline outputs/benchmarks/sim/baseline.json
+
+Results are written as JSON to ``outputs/benchmarks/<backend>/<commit>.json``.
+With ``--baseline`` every metric is compared with a saved run and the script
+exits with status 1 if one got worse by more than ``--threshold``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import demo
+from object_dictionary import load_cached_devices, parse_esi
+
+RESULTS_DIR = Path(__file__).resolve().parent / "outputs" / "benchmarks"
+ESI_PATH = "JMC_DRIVE_V1.8.xml"
+DEFAULT_THRESHOLD = 0.25
+
+# Objects read by the snapshot benchmark, as shown in the GUI register panel.
+SNAPSHOT_ENTRIES = [
+    (0x6040, 0, 2), (0x6041, 0, 2), (0x6060, 0, 1, True), (0x6061, 0, 1, True),
+    (0x607A, 0, 4, True), (0x60FF, 0, 4, True), (0x6064, 0, 4, True), (0x60FE, 1, 4),
+]
+
+
+class Metric(NamedTuple):
+    value: float
+    unit: str
+    better: str  # "lower" or "higher"
+
+
+def median_time(func: Callable[[], object], repeat: int) -> float:
+    """Median wall time of ``repeat`` calls to ``func`` in seconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def rate(func: Callable[[], object], count: int, repeat: int = 3) -> float:
+    """Best-of-``repeat`` calls per second for ``count`` calls to ``func``."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(count):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return count / best
+
+
+def bench_esi(esi_path: str, repeat: int) -> Dict[str, Metric]:
+    from servo_simulator import ServoSimulator
+
+    parse = median_time(lambda: parse_esi(esi_path), max(1, repeat // 2))
+    load_cached_devices(esi_path)  # make sure the cache file exists
+    cached = median_time(lambda: load_cached_devices(esi_path), repeat)
+    sim_open = median_time(lambda: ServoSimulator(esi_path=esi_path).open(), repeat)
+    return {
+        "esi_parse_ms": Metric(parse * 1000, "ms", "lower"),
+        "esi_cached_load_ms": Metric(cached * 1000, "ms", "lower"),
+        "sim_open_ms": Metric(sim_open * 1000, "ms", "lower"),
+    }
+
+
+def bench_servo(factory: Callable[[], object], count: int, repeat: int) -> Dict[str, Metric]:
+    def connect_and_enable():
+        servo = factory()
+        servo.open()
+        try:
+            servo.set_mode(1)
+            servo.enable_operation()
+        finally:
+            servo.close()
+
+    enable = median_time(connect_and_enable, repeat)
+
+    servo = factory()
+    servo.open()
+    try:
+        servo.set_mode(1)
+        servo.enable_operation()
+        position = servo.read_actual_position()
+        reads = rate(servo.read_statusword, count)
+        writes = rate(lambda: servo.set_target_position(position), count)
+        snapshots = rate(lambda: servo.read_sdo_many(SNAPSHOT_ENTRIES), max(1, count // 4))
+    finally:
+        servo.close()
+    return {
+        "connect_enable_ms": Metric(enable * 1000, "ms", "lower"),
+        "sdo_read_per_s": Metric(reads, "ops/s", "higher"),
+        "sdo_write_per_s": Metric(writes, "ops/s", "higher"),
+        "snapshot_read_per_s": Metric(snapshots, "snapshots/s", "higher"),
+    }
+
+
+def bench_network(cycles: int) -> Dict[str, Metric]:
+    from sim_network import benchmark as network_cycle
+
+    return {
+        f"network_cycle_{count}_us": Metric(network_cycle(count, cycles) * 1e6, "us", "lower")
+        for count in (1, 1000)
+    }
+
+
+def bench_demo(backend: str, ifname: Optional[str], repeat: int) -> Dict[str, Metric]:
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            demo.main(ifname, backend)
+
+    return {"demo_main_ms": Metric(median_time(run, repeat) * 1000, "ms", "lower")}
+
+
+def git_commit() -> Tuple[str, bool]:
+    """Return the current commit and whether the work tree has changes."""
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], text=True,
+                                         stderr=subprocess.DEVNULL).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"],
+                                             text=True, stderr=subprocess.DEVNULL).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, dirty
+
+
+def run_benchmarks(backend: str = "sim", ifname: Optional[str] = None, quick: bool = False,
+                   esi_path: str = ESI_PATH) -> Dict[str, object]:
+    """Run all benchmarks for ``backend`` and return the JSON-ready record."""
+    repeat = 3 if quick else 7
+    count = 200 if quick else 2000
+    if backend == "hw":
+        # Mailbox round trips take milliseconds; keep hardware runs short.
+        count = min(count, 200)
+    servo_cls, get_adapter_name = demo.import_backend(backend)
+    if ifname is None and backend != "remote":
+        ifname = os.environ.get(demo.ENV_IFNAME)
+    if ifname is None:
+        ifname = get_adapter_name()
+
+    results: Dict[str, Metric] = {}
+    results.update(bench_esi(esi_path, repeat))
+    results.update(bench_servo(lambda: servo_cls(ifname=ifname, slave_pos=0), count, repeat))
+    results.update(bench_demo(backend, ifname, 1 if backend != "sim" else repeat))
+    if backend == "sim":
+        # SimulatedNetwork is in-process; its numbers say nothing about the
+        # daemon or the hardware.
+        results.update(bench_network(count // 2))
+
+    commit, dirty = git_commit()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "backend": backend,
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": {name: m._asdict() for name, m in results.items()},
+    }
+
+
+def save(record: Dict[str, object], directory: Path = RESULTS_DIR) -> Path:
+    path = Path(directory) / str(record["backend"]) / f"{record['commit']}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(record, indent=2) + "\n")
+    return path
+
+
+def compare(current: Dict[str, object], baseline: Dict[str, object],
+            threshold: float = DEFAULT_THRESHOLD) -> List[Tuple[str, float, float, float, bool]]:
+    """Compare two records metric by metric.
+
+    Returns ``(name, baseline, current, change, regressed)`` rows where
+    ``change`` is the relative slowdown (positive is worse) and ``regressed``
+    is true if it exceeds ``threshold``.  Metrics missing from either record
+    are skipped.
+    """
+    rows = []
+    base_results = baseline["results"]
+    for name, cur in current["results"].items():
+        base = base_results.get(name)
+        if base is None or not base["value"] or not cur["value"]:
+            continue
+        if cur["better"] == "lower":
+            change = cur["value"] / base["value"] - 1.0
+        else:
+            change = base["value"] / cur["value"] - 1.0
+        rows.append((name, base["value"], cur["value"], change, change > threshold))
+    return rows
+
+
+def format_record(record: Dict[str, object]) -> str:
+    lines = [f"commit={record['commit']}{' (dirty)' if record['dirty'] else ''} backend={record['backend']}"]
+    for name, m in record["results"].items():
+        lines.append(f"  {name:22} {m['value']:14.2f} {m['unit']}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark servo I/O, ESI loading and motion")
+    parser.add_argument("--backend", choices=["sim", "remote", "hw"], default="sim")
+    parser.add_argument("--ifname", default=None, help="adapter (hw) or socket (remote)")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations")
+    parser.add_argument("--output", default=str(RESULTS_DIR), help="results directory")
+    parser.add_argument("--baseline", help="JSON record to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed relative slowdown before failing (default 0.25)")
+    parser.add_argument("--save-baseline", metavar="FILE", help="also write this run to FILE")
+    args = parser.parse_args(argv)
+
+    # Read the baseline first: it may be the file this run is about to replace.
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    record = run_benchmarks(args.backend, args.ifname, args.quick)
+    path = save(record, Path(args.output))
+    print(format_record(record))
+    print(f"Wrote {path}")
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(record, indent=2) + "\n")
+
+    if baseline is None:
+        return 0
+    regressions = 0
+    print(f"Compared with {baseline['commit']} (threshold {args.threshold:.0%}):")
+    for name, base, cur, change, regressed in compare(record, baseline, args.threshold):
+        regressions += regressed
+        flag = "REGRESSION" if regressed else "ok"
+        print(f"  {name:22} {base:14.2f} -> {cur:14.2f} {change:+7.1%}  {flag}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
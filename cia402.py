@@ -0,0 +1,253 @@
+"""CiA 402 drive state machine.
+
+Decodes the statusword (0x6041), computes the controlword needed to move
+towards *Operation enabled* and drives a servo there by polling the
+statusword instead of sleeping for fixed periods.  The same transition
+table is used by :class:`servo_simulator.ServoSimulator` to emulate the
+drive.
+
+A servo passed to the helpers must provide ``read_statusword()``,
+``write_controlword(cw)``, ``read_mode_display()`` and a ``clock`` with
+``time()`` and ``sleep()``.  When the servo exchanges process data (a
+``pdo_loop`` attribute that is not ``None``), :func:`wait_until` wakes up on
+every completed cycle instead of sleeping.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, NamedTuple
+
+NOT_READY_TO_SWITCH_ON = "not ready to switch on"
+SWITCH_ON_DISABLED = "switch on disabled"
+READY_TO_SWITCH_ON = "ready to switch on"
+SWITCHED_ON = "switched on"
+OPERATION_ENABLED = "operation enabled"
+QUICK_STOP_ACTIVE = "quick stop active"
+FAULT_REACTION_ACTIVE = "fault reaction active"
+FAULT = "fault"
+
+# (mask, value, state) in the order the standard lists them.
+_STATUS_PATTERNS = (
+    (0x4F, 0x00, NOT_READY_TO_SWITCH_ON),
+    (0x4F, 0x40, SWITCH_ON_DISABLED),
+    (0x6F, 0x21, READY_TO_SWITCH_ON),
+    (0x6F, 0x23, SWITCHED_ON),
+    (0x6F, 0x27, OPERATION_ENABLED),
+    (0x6F, 0x07, QUICK_STOP_ACTIVE),
+    (0x4F, 0x0F, FAULT_REACTION_ACTIVE),
+    (0x4F, 0x08, FAULT),
+)
+
+# Statusword bits 0-6 reported in each state.
+STATUS_BITS = {
+    NOT_READY_TO_SWITCH_ON: 0x00,
+    SWITCH_ON_DISABLED: 0x40,
+    READY_TO_SWITCH_ON: 0x21,
+    SWITCHED_ON: 0x23,
+    OPERATION_ENABLED: 0x27,
+    QUICK_STOP_ACTIVE: 0x07,
+    FAULT_REACTION_ACTIVE: 0x0F,
+    FAULT: 0x08,
+}
+
+# Further statusword bits.
+SW_VOLTAGE_ENABLED = 0x0010
+SW_WARNING = 0x0080
+SW_REMOTE = 0x0200
+SW_TARGET_REACHED = 0x0400
+SW_SETPOINT_ACK = 0x1000
+
+# Controlword commands.
+CW_DISABLE_VOLTAGE = 0x00
+CW_QUICK_STOP = 0x02
+CW_SHUTDOWN = 0x06
+CW_SWITCH_ON = 0x07
+CW_ENABLE_OPERATION = 0x0F
+CW_FAULT_RESET = 0x80
+CW_NEW_SETPOINT = 0x10
+CW_CHANGE_IMMEDIATELY = 0x20
+# Enable operation plus a rising "new set-point" edge, as sent by
+# ``start_motion()`` in profile position mode.
+CW_START_MOTION = CW_ENABLE_OPERATION | CW_NEW_SETPOINT | CW_CHANGE_IMMEDIATELY
+
+# Command to issue in each state on the way to operation enabled.
+_NEXT_COMMAND = {
+    SWITCH_ON_DISABLED: CW_SHUTDOWN,
+    READY_TO_SWITCH_ON: CW_SWITCH_ON,
+    SWITCHED_ON: CW_ENABLE_OPERATION,
+    QUICK_STOP_ACTIVE: CW_DISABLE_VOLTAGE,
+}
+
+
+class DriveStateError(RuntimeError):
+    """The drive did not reach the requested state in time."""
+
+
+def decode_state(statusword: int) -> str:
+    for mask, value, state in _STATUS_PATTERNS:
+        if statusword & mask == value:
+            return state
+    return NOT_READY_TO_SWITCH_ON
+
+
+def next_state(state: str, controlword: int, previous_controlword: int = 0) -> str:
+    """Return the state a drive enters when ``controlword`` is written."""
+    if state == FAULT:
+        if controlword & CW_FAULT_RESET and not previous_controlword & CW_FAULT_RESET:
+            return SWITCH_ON_DISABLED
+        return FAULT
+    if state in (NOT_READY_TO_SWITCH_ON, FAULT_REACTION_ACTIVE):
+        return state
+    if controlword & 0x02 == 0:  # disable voltage
+        return SWITCH_ON_DISABLED
+    if controlword & 0x04 == 0:  # quick stop
+        if state == OPERATION_ENABLED:
+            return QUICK_STOP_ACTIVE
+        if state == QUICK_STOP_ACTIVE:
+            return state
+        return SWITCH_ON_DISABLED
+    command = controlword & 0x0F
+    if command in (0x06, 0x0E):  # shutdown
+        if state in (SWITCH_ON_DISABLED, SWITCHED_ON, OPERATION_ENABLED):
+            return READY_TO_SWITCH_ON
+    elif command == 0x07:  # switch on / disable operation
+        if state in (READY_TO_SWITCH_ON, OPERATION_ENABLED):
+            return SWITCHED_ON
+    elif command == 0x0F:  # enable operation
+        if state in (SWITCHED_ON, QUICK_STOP_ACTIVE):
+            return OPERATION_ENABLED
+    return state
+
+
+def wait_for_state(servo, states, timeout: float = 1.0, poll_interval: float = 0.001) -> str:
+    """Poll the statusword until the drive is in one of ``states``."""
+    if isinstance(states, str):
+        states = (states,)
+    deadline = servo.clock.time() + timeout
+    while True:
+        state = decode_state(servo.read_statusword())
+        if state in states:
+            return state
+        if servo.clock.time() >= deadline:
+            raise DriveStateError(
+                f"Drive stuck in '{state}' waiting for {' or '.join(repr(s) for s in states)}"
+            )
+        servo.clock.sleep(poll_interval)
+
+
+def enable_operation(servo, step_timeout: float = 1.0, poll_interval: float = 0.001,
+                     max_fault_resets: int = 1) -> None:
+    """Bring the drive to *Operation enabled*, resetting a fault if needed.
+
+    Every transition is confirmed through the statusword and must complete
+    within ``step_timeout`` seconds.
+    """
+    resets = 0
+    state = decode_state(servo.read_statusword())
+    for _ in range(8):
+        if state == OPERATION_ENABLED:
+            return
+        if state in (FAULT, FAULT_REACTION_ACTIVE):
+            if resets >= max_fault_resets:
+                raise DriveStateError("Drive fault persists after fault reset")
+            resets += 1
+            if state == FAULT_REACTION_ACTIVE:
+                wait_for_state(servo, FAULT, step_timeout, poll_interval)
+            # Fault reset acts on the rising edge of bit 7; every other
+            # command this module sends has the bit cleared.
+            servo.write_controlword(CW_FAULT_RESET)
+            state = wait_for_state(servo, SWITCH_ON_DISABLED, step_timeout, poll_interval)
+            continue
+        if state == NOT_READY_TO_SWITCH_ON:
+            state = wait_for_state(servo, SWITCH_ON_DISABLED, step_timeout, poll_interval)
+            continue
+        command = _NEXT_COMMAND[state]
+        servo.write_controlword(command)
+        expected = {
+            CW_SHUTDOWN: READY_TO_SWITCH_ON,
+            CW_SWITCH_ON: SWITCHED_ON,
+            CW_ENABLE_OPERATION: OPERATION_ENABLED,
+            CW_DISABLE_VOLTAGE: SWITCH_ON_DISABLED,
+        }[command]
+        state = wait_for_state(servo, (expected, FAULT, FAULT_REACTION_ACTIVE),
+                               step_timeout, poll_interval)
+    raise DriveStateError(f"Drive did not reach '{OPERATION_ENABLED}'")
+
+
+def wait_for_mode(servo, mode: int, timeout: float = 1.0, poll_interval: float = 0.001) -> None:
+    """Wait until the mode of operation display (0x6061) reports ``mode``."""
+    deadline = servo.clock.time() + timeout
+    while servo.read_mode_display() != mode:
+        if servo.clock.time() >= deadline:
+            raise DriveStateError(f"Drive did not switch to mode {mode}")
+        servo.clock.sleep(poll_interval)
+
+
+class MotionResult(NamedTuple):
+    """Servo-clock seconds from the call until each handshake step."""
+
+    ack_time: float
+    settle_time: float
+
+
+def wait_until(servo, predicate: Callable[[], bool], timeout: float = 1.0,
+               poll_interval: float = 0.001, max_interval: float = 0.01) -> float:
+    """Wait until ``predicate()`` is true and return the seconds it took.
+
+    With process data the predicate is checked after every cycle.  Otherwise
+    the interval between checks starts at ``poll_interval`` and grows by half
+    each time up to ``max_interval``, so short waits are detected quickly
+    and long ones do not flood the mailbox.
+
+    Raises
+    ------
+    DriveStateError
+        If ``predicate()`` is still false after ``timeout`` seconds.
+    """
+    clock = servo.clock
+    start = clock.time()
+    deadline = start + timeout
+    pdo_loop = getattr(servo, "pdo_loop", None)
+    interval = poll_interval
+    while not predicate():
+        now = clock.time()
+        if now >= deadline:
+            raise DriveStateError(f"Condition not met within {timeout} s")
+        if pdo_loop is not None:
+            pdo_loop.wait_cycles(1, timeout=max(deadline - now, 0.0))
+        else:
+            clock.sleep(min(interval, deadline - now))
+            interval = min(interval * 1.5, max_interval)
+    return clock.time() - start
+
+
+def wait_for_target_reached(servo, timeout: float = 10.0, ack_timeout: float = 1.0,
+                            **poll) -> MotionResult:
+    """Complete the profile-position set-point handshake and wait for the move.
+
+    Call right after ``start_motion()``: waits for *set-point acknowledge*
+    (statusword bit 12), clears *new set-point* (controlword bit 4) so that
+    the next ``start_motion()`` is an edge again, then waits for *target
+    reached* (bit 10).  ``poll`` is passed to :func:`wait_until`.  Both
+    times are also recorded in the servo's instruments as ``setpoint_ack``
+    and ``settle``.
+    """
+    start = servo.clock.time()
+    try:
+        wait_until(servo, lambda: servo.read_statusword() & SW_SETPOINT_ACK, ack_timeout, **poll)
+    except DriveStateError:
+        raise DriveStateError("Drive did not acknowledge the new set-point") from None
+    ack_time = servo.clock.time() - start
+    servo.write_controlword(CW_START_MOTION & ~CW_NEW_SETPOINT)
+    try:
+        wait_until(servo, lambda: servo.read_statusword() & SW_TARGET_REACHED,
+                   max(timeout - ack_time, 0.0), **poll)
+    except DriveStateError:
+        raise DriveStateError(f"Target not reached within {timeout} s") from None
+    result = MotionResult(ack_time, servo.clock.time() - start)
+    instruments = getattr(servo, "instruments", None)
+    if instruments is not None:
+        # Servo-clock durations, meaningful in simulated time as well.
+        instruments.record("setpoint_ack", int(result.ack_time * 1e9))
+        instruments.record("settle", int(result.settle_time * 1e9))
+    return result
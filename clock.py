@@ -0,0 +1,47 @@
+"""Clocks shared by the servo backends.
+
+Everything that waits or timestamps goes through a clock object with
+``time()`` and ``sleep()`` so the simulator can run on a
+:class:`VirtualClock` and tests can advance simulated time instantly.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+
+
+class MonotonicClock:
+    """Wall-clock time based on :func:`time.monotonic`."""
+
+    def time(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class VirtualClock:
+    """Simulated time that only moves when told to.
+
+    ``sleep()`` returns immediately after advancing the clock, so code that
+    waits for two seconds of simulated time finishes in microseconds.
+    """
+
+    def __init__(self, start: float = 0.0) -> None:
+        self._now = start
+        self._lock = threading.Lock()
+
+    def time(self) -> float:
+        return self._now
+
+    def advance(self, seconds: float) -> None:
+        if seconds < 0:
+            raise ValueError("Cannot move a clock backwards")
+        with self._lock:
+            self._now += seconds
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            self.advance(seconds)
@@ -1,6 +1,10 @@
 import os
 import argparse
+import functools
 import time
+from typing import Dict, NamedTuple
+
+import cia402
 
 # Example 30:1 planetary gearbox
 GEAR_RATIO = 30
@@ -11,11 +15,34 @@ ENV_IFNAME = "ECAT_IFNAME"
 def import_backend(backend: str):
     """Return Servo class and adapter helper for chosen backend."""
     if backend == "sim":
-        from servo_simulator import ServoSimulator as EthercatServo
+        from clock import VirtualClock
+        from servo_simulator import ServoSimulator
+
+        # Simulated time lets the demo's waits complete instantly.
+        EthercatServo = functools.partial(ServoSimulator, clock=VirtualClock())
 
         def get_adapter_name(search: str = "default") -> str:
             return "sim"
 
+    elif backend == "remote":
+        from sim_client import RemoteServo as EthercatServo
+        from sim_client import socket_path
+
+        # The "adapter" of a servo-sim daemon is its socket.
+        def get_adapter_name(search: str = "default") -> str:
+            return socket_path()
+
+    elif backend == "replay":
+        from replay import REPLAY_ENV
+        from replay import replay_servo as EthercatServo
+
+        # The "adapter" of a replay is the traffic log.
+        def get_adapter_name(search: str = "default") -> str:
+            path = os.environ.get(REPLAY_ENV)
+            if not path:
+                raise RuntimeError(f"Pass the traffic log with --ifname or {REPLAY_ENV}")
+            return path
+
     else:
         from ethercat_servo import EthercatServo
         from get_adapter_name import get_adapter_name
@@ -23,15 +50,74 @@ def import_backend(backend: str):
     return EthercatServo, get_adapter_name
 
 
-def main(ifname: str | None = None, backend: str | None = None) -> None:
-    """Run a small motion demo on the first EtherCAT slave or simulator."""
+class DemoResult(NamedTuple):
+    """Outcome of :func:`run`.
+
+    Holds the final position, the wall-clock seconds spent in each phase
+    and the servo-clock seconds from ``start_motion()`` to *target reached*.
+    """
+
+    final_position: int
+    timings: Dict[str, float]
+    settle_time: float = 0.0
+
+
+def run(servo, target: int = 10000, gear_ratio: float = GEAR_RATIO,
+        timeout: float = 10.0, record: str | None = None) -> DemoResult:
+    """Run the motion demo on an already opened ``servo``.
+
+    Moves the gearbox output to ``target`` in profile-position mode, waits
+    until the drive reports the target as reached (at most ``timeout``
+    seconds) and reports the actual position.  When ``record`` names a
+    directory, the move is captured there at 1 kHz with
+    :class:`telemetry.Recorder`.  The servo is left open.
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    def phase(name):
+        nonlocal start
+        now = time.perf_counter()
+        timings[name] = now - start
+        start = now
+
+    servo.set_mode(1)             # profile-position mode
+    phase("set_mode")
+    servo.enable_operation()
+    phase("enable_operation")
+    servo.release_brake()
+    servo.enable_controller()
+    phase("outputs")
+    servo.set_target_position_after_gearbox(target, gear_ratio)
+    servo.start_motion()
+    moved = servo.clock.time()
+    phase("start_motion")
+    if record:
+        from telemetry import Recorder
+
+        done = cia402.SW_SETPOINT_ACK | cia402.SW_TARGET_REACHED
+        recorder = Recorder(servo, path=record)
+        try:
+            recorder.record(timeout, period=0.001,
+                            until=lambda: servo.read_statusword() & done == done)
+        finally:
+            recorder.close()
+    servo.wait_for_target_reached(timeout)
+    settle_time = servo.clock.time() - moved
+    phase("settle")
+    return DemoResult(servo.read_actual_position(), timings, settle_time)
+
+
+def main(ifname: str | None = None, backend: str | None = None,
+         record: str | None = None) -> DemoResult:
+    """Open the first EtherCAT slave or simulator and :func:`run` the demo."""
 
     if backend is None:
         backend = "sim" if os.getenv("SIMULATION") == "1" else "hw"
 
     EthercatServo, get_adapter_name = import_backend(backend)
 
-    if ifname is None:
+    if ifname is None and backend not in ("remote", "replay"):
         ifname = os.environ.get(ENV_IFNAME)
     if ifname is None:
         ifname = get_adapter_name()
@@ -39,14 +125,10 @@ def main(ifname: str | None = None, backend: str | None = None) -> None:
     servo = EthercatServo(ifname=ifname, slave_pos=0)
     servo.open()
     try:
-        servo.set_mode(1)             # profile-position mode
-        servo.enable_operation()
-        servo.release_brake()
-        servo.enable_controller()
-        servo.set_target_position_after_gearbox(10000, GEAR_RATIO)
-        servo.start_motion()
-        time.sleep(2)
-        print("Actual position:", servo.read_actual_position())
+        result = run(servo, record=record)
+        print("Actual position:", result.final_position)
+        print(f"Target reached after {result.settle_time * 1000:.1f} ms")
+        return result
     finally:
         servo.close()
 
@@ -61,9 +143,16 @@ if __name__ == "__main__":
     )
     parser.add_argument(
         "--backend",
-        choices=["hw", "sim"],
-        help="Select 'hw' for real hardware or 'sim' for the simulator",
+        choices=["hw", "sim", "remote", "replay"],
+        help="Select 'hw' for real hardware, 'sim' for the in-process simulator, "
+        "'remote' for a servo-sim daemon or 'replay' for a recorded traffic log",
+        default=None,
+    )
+    parser.add_argument(
+        "--record",
+        metavar="DIR",
+        help="Capture position, velocity and status during the move to DIR",
         default=None,
     )
     args = parser.parse_args()
-    main(args.ifname, args.backend)
+    main(args.ifname, args.backend, args.record)
@@ -1,70 +1,77 @@
 import asyncio
+import functools
 import os
-import re
-import subprocess
-import sys
-from pathlib import Path
+
+import demo
+from async_servo import AsyncServo
 
 
 class DeviceController:
-    """Minimal hardware controller used by integration tests."""
+    """Minimal hardware controller used by integration tests.
+
+    Servo I/O runs on the :class:`AsyncServo` I/O thread, so several
+    controllers can connect and self-test concurrently on one event loop.
+    """
 
-    def __init__(self) -> None:
-        self.servo = None
+    def __init__(self, slave_pos: int = 0, timeout: float = 5.0,
+                 demo_timeout: float = 10.0) -> None:
+        self.slave_pos = slave_pos
+        self.timeout = timeout
+        # Seconds demo.run() may wait for the move to reach its target.
+        self.demo_timeout = demo_timeout
+        self.servo: AsyncServo | None = None
+        self.last_demo: demo.DemoResult | None = None
 
     async def connect(self) -> None:
         print("[HW] Connecting to robot…")
         if os.getenv("SIMULATION") == "1":
+            from clock import VirtualClock
             from servo_simulator import ServoSimulator
-            self.servo = ServoSimulator()
-            self.servo.open()
+            # Simulated time, like ``demo.py --backend sim``.
+            servo = ServoSimulator(slave_pos=self.slave_pos, clock=VirtualClock())
+        elif os.getenv("ECAT_REPLAY"):
+            from replay import replay_servo
+            # Answers from a recorded traffic log, like ``--backend replay``.
+            servo = replay_servo(os.environ["ECAT_REPLAY"], slave_pos=self.slave_pos)
         else:
             from ethercat_servo import EthercatServo
             from get_adapter_name import get_adapter_name
-            ifname = os.getenv("ECAT_IFNAME", get_adapter_name())
-            self.servo = EthercatServo(ifname=ifname)
-            self.servo.open()
+            ifname = os.getenv("ECAT_IFNAME") or await asyncio.to_thread(get_adapter_name)
+            servo = EthercatServo(ifname=ifname, slave_pos=self.slave_pos)
+        self.servo = AsyncServo(servo, timeout=self.timeout)
+        await self.servo.open()
 
     async def run_self_test(self) -> str:
         print("[HW] Running self-test.")
-        await asyncio.sleep(0.5)
         if self.servo:
             try:
-                self.servo.enable_operation()
+                await self.servo.enable_operation()
             except Exception:
                 pass
         return "OK"
 
     async def run_demo(self) -> int:
-        print("[HW] Executing demo.py")
-        repo_root = (
-            subprocess.check_output(["git", "rev-parse", "--show-toplevel"], text=True)
-            .strip()
-        )
-        env = os.environ.copy()
-        cmd = [sys.executable, "demo.py"]
-        if os.getenv("SIMULATION") == "1":
-            cmd.extend(["--backend", "sim"])
-        proc = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            cwd=repo_root,
-            env=env,
-        )
-        stdout, stderr = await proc.communicate()
-        output = stdout.decode()
-        error = stderr.decode()
-        print(output)
-        if error:
-            print(error, file=sys.stderr)
-        m = re.search(r"Actual position:\s*(\d+)", output)
-        return int(m.group(1)) if m else -1
+        """Run :func:`demo.run` on the connected servo and return its position.
+
+        The full :class:`demo.DemoResult`, including phase timings, is kept in
+        ``last_demo``.  The call may take ``demo_timeout`` for the move plus
+        ``timeout`` for the steps before it, so it never gives up while
+        ``demo.run`` is still driving the axis on the I/O thread.
+        """
+        print("[HW] Executing demo")
+        run = functools.partial(demo.run, timeout=self.demo_timeout)
+        result = await self.servo.call(run, self.servo.servo,
+                                       timeout=self.demo_timeout + self.timeout)
+        self.last_demo = result
+        print("Actual position:", result.final_position)
+        print("Phase timings:", ", ".join(f"{k}={v * 1000:.1f}ms" for k, v in result.timings.items()))
+        return result.final_position
 
     def close(self) -> None:
         if self.servo:
             try:
-                self.servo.close()
+                self.servo.shutdown()
             except Exception:
                 pass
+            self.servo = None
         print("[HW] Disconnected.")
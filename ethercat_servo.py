@@ -1,114 +1,227 @@
 import pysoem
-import struct
 import time
-from typing import Optional
-
-
-class EthercatServo:
+from typing import Callable, Optional
+
+import replay
+import topology
+from clock import MonotonicClock
+from instrumentation import Instruments, dump_to_env, from_env, measure, timed
+from object_dictionary import decode_int, encode_int
+from process_data import ProcessDataLoop, ProcessImage, configure_pdo_mapping
+from sdo_batch import (
+    SdoSnapshot,
+    complete_access_size,
+    group_complete_access,
+    normalize,
+    split_complete_access,
+)
+from servo_helpers import ServoHelpers
+from watchdog import LinkWatchdog
+
+
+class EthercatServo(ServoHelpers):
     """Simple EtherCAT CiA 402 servo interface."""
 
-    CONTROL_WORD = 0x6040
-    STATUS_WORD = 0x6041
-    MODE_OF_OPERATION = 0x6060
-    MODE_OF_OPERATION_DISPLAY = 0x6061
-    TARGET_POSITION = 0x607A
-    TARGET_VELOCITY = 0x60FF
-    ACTUAL_POSITION = 0x6064
-    DIGITAL_OUTPUTS = 0x60FE
-    CONTROLLER_BITS = 0x06  # Fw (bit1) and Fb (bit2)
-
-    def __init__(self, ifname: str, slave_pos: int = 0) -> None:
+    def __init__(self, ifname: str, slave_pos: int = 0, cycle_time: Optional[float] = None,
+                 instruments: Optional[Instruments] = None,
+                 topology_cache: Optional[topology.TopologyCache] = None,
+                 watchdog_period: Optional[float] = None,
+                 master_factory: Optional[Callable[[], object]] = None,
+                 clock=None) -> None:
+        """Create a servo handle.
+
+        Parameters
+        ----------
+        ifname : str
+            Network adapter the EtherCAT segment is attached to.
+        slave_pos : int
+            Position of the drive on the bus.
+        cycle_time : float, optional
+            Process-data period in seconds.  When given, the controlword,
+            setpoints, statusword and actual position are exchanged
+            cyclically through PDOs and the high-level helpers access the
+            process image instead of issuing SDO requests.
+        instruments : Instruments, optional
+            Records per-operation latency histograms; see
+            :mod:`instrumentation`.  Defaults to one created from the
+            ``ECAT_LATENCY_LOG`` environment variable, or none.
+        topology_cache : TopologyCache, optional
+            Lets a reconnect skip writing the PDO mapping when the drive
+            still holds it; see :mod:`topology`.  Defaults to the cache
+            selected by ``ECAT_TOPOLOGY_CACHE``.
+        watchdog_period : float, optional
+            Starts a :class:`watchdog.LinkWatchdog` checking the bus every
+            ``watchdog_period`` seconds once the drive is in OP and bringing
+            slaves that drop out back to OP without closing the master.
+        master_factory : callable, optional
+            Returns a ``pysoem.Master`` compatible object, for instance a
+            :class:`replay.ReplayMaster`.  Defaults to ``pysoem.Master``.
+        clock : optional
+            Time source of the waits; defaults to :class:`MonotonicClock`.
+
+        When ``ECAT_TRAFFIC_LOG`` names a file, each ``open()`` records the
+        bus traffic to it (see :mod:`replay`) and the topology cache is not used, so
+        that the recording replays the same on any machine.
+        """
         self.ifname = ifname
         self.slave_pos = slave_pos
+        self.cycle_time = cycle_time
+        self.clock = clock if clock is not None else MonotonicClock()
+        self.instruments = instruments if instruments is not None else from_env()
+        self.topology = topology_cache if topology_cache is not None else topology.from_env()
+        self.master_factory = master_factory
+        # Whether the last open() reused the PDO mapping left in the drive.
+        self.warm_start = False
         self.master: Optional[pysoem.Master] = None
         self.slave = None
-
+        self.process_image: Optional[ProcessImage] = None
+        self.pdo_loop: Optional[ProcessDataLoop] = None
+        self.watchdog_period = watchdog_period
+        self.watchdog: Optional[LinkWatchdog] = None
+        # Objects that rejected a complete-access upload.
+        self._no_complete_access = set()
+
+    @timed("open")
     def open(self) -> None:
         """Open EtherCAT master and configure slave."""
-        self.master = pysoem.Master()
+        self.master = (self.master_factory or pysoem.Master)()
+        traffic_log = replay.log_from_env()
+        if traffic_log is not None:
+            self.master = replay.RecordingMaster(self.master, traffic_log)
+            self.topology = None
+        self.warm_start = False
         self.master.open(self.ifname)
-        if self.master.config_init() <= self.slave_pos:
+        if measure(self.instruments, "config_init", self.master.config_init) <= self.slave_pos:
             raise RuntimeError("Not enough slaves found")
         self.slave = self.master.slaves[self.slave_pos]
-        self.master.config_map()
-        self.master.state = pysoem.OP_STATE
-        self.master.write_state()
+        if self.cycle_time is not None:
+            self.slave.config_func = self._setup_pdo_mapping
+        measure(self.instruments, "config_map", self.master.config_map)
+        if self.cycle_time is not None:
+            self.process_image = ProcessImage()
+            self.pdo_loop = ProcessDataLoop(self.master, self.cycle_time)
+            self.pdo_loop.instruments = self.instruments
+            self.pdo_loop.add(self.slave, self.process_image)
+            # Slaves only accept OP once valid outputs are being received.
+            self.pdo_loop.start()
+        measure(self.instruments, "state_change", self._request_op)
         if self.master.state != pysoem.OP_STATE:
+            self.close()
             raise RuntimeError("Unable to enter OP state")
+        if self.watchdog_period is not None:
+            self.watchdog = LinkWatchdog(self.master, self.pdo_loop, self.watchdog_period,
+                                         instruments=self.instruments)
+            self.watchdog.start()
+
+    def _request_op(self) -> None:
+        self.master.state = pysoem.OP_STATE
+        self.master.write_state()
+        if self.cycle_time is not None:
+            self.master.state_check(pysoem.OP_STATE, 50000)
 
     def close(self) -> None:
+        if self.watchdog:
+            self.watchdog.stop()
+            self.watchdog = None
+        dump_to_env(self.instruments, f"EthercatServo[{self.slave_pos}]")
+        if self.pdo_loop:
+            self.pdo_loop.stop()
+            self.pdo_loop = None
+        self.process_image = None
         if self.master:
             self.master.close()
             self.master = None
 
+    def _setup_pdo_mapping(self, slave_pos: int) -> None:
+        slave = self.master.slaves[slave_pos]
+        if self.topology is None:
+            configure_pdo_mapping(slave)
+            return
+        identity = topology.read_identity(slave)
+        if self.topology.matches(self.ifname, slave_pos, identity) and topology.mapping_present(slave):
+            self.warm_start = True
+            return
+        self.topology.forget(self.ifname, slave_pos)
+        configure_pdo_mapping(slave)
+        self.topology.store(self.ifname, slave_pos, identity)
+
+    def _write(self, idx: int, subidx: int, val: int, size: int = 2) -> None:
+        """Write through the process image when mapped, otherwise via SDO."""
+        if self.process_image is not None and self.process_image.has_output(idx, subidx):
+            self._check_process_data()
+            self.process_image.set_output(idx, subidx, val)
+        else:
+            self.write_sdo(idx, subidx, val, size)
+
+    def _read(self, idx: int, subidx: int, size: int = 2, signed: bool = False) -> int:
+        """Read from the process image when mapped, otherwise via SDO."""
+        if self.process_image is not None and self.process_image.has_input(idx, subidx):
+            self._check_process_data()
+            return self.process_image.get_input(idx, subidx)
+        return self.read_sdo(idx, subidx, size, signed)
+
+    def _check_process_data(self) -> None:
+        """Raise when the process image is stale because exchanges fail."""
+        error = self.pdo_loop.error if self.pdo_loop is not None else None
+        if error is not None:
+            raise RuntimeError(f"Process data exchange failed: {error}") from error
+
+    @timed("sdo_write", by_index=True)
     def write_sdo(self, idx: int, subidx: int, val: int, size: int = 2) -> None:
-        buf = val.to_bytes(size, byteorder="little", signed=False)
-        self.slave.sdo_write(idx, subidx, buf)
+        """Write ``val`` as ``size`` bytes; negative values use two's complement."""
+        self.slave.sdo_write(idx, subidx, encode_int(val, size))
 
-    def read_sdo(self, idx: int, subidx: int, size: int = 2) -> int:
+    @timed("sdo_read", by_index=True)
+    def read_sdo(self, idx: int, subidx: int, size: int = 2, signed: bool = False) -> int:
         buf = self.slave.sdo_read(idx, subidx)
-        return int.from_bytes(buf[:size], byteorder="little", signed=False)
-
-    def enable_operation(self) -> None:
-        # switch on, enable voltage, quick stop, enable operation
-        for cw in (0x06, 0x07, 0x0F):
-            self.write_sdo(self.CONTROL_WORD, 0, cw)
-            time.sleep(0.1)
-
-    def set_mode(self, mode: int) -> None:
-        self.write_sdo(self.MODE_OF_OPERATION, 0, mode, size=1)
-        time.sleep(0.05)
-
-    def set_target_position(self, pos: int) -> None:
-        self.write_sdo(self.TARGET_POSITION, 0, pos, size=4)
-
-    def set_target_position_after_gearbox(self, output_pos: int, gear_ratio: float) -> None:
-        """Set target position in terms of output position after a gearbox.
+        return decode_int(buf[:size], signed)
 
-        This helper multiplies ``output_pos`` by ``gear_ratio`` and sends the
-        resulting motor shaft position to the drive.  Use it when you want to
-        command the position at the load rather than directly at the motor.
+    @timed("read_sdo_many")
+    def read_sdo_many(self, entries) -> SdoSnapshot:
+        """Read several objects and return them as one :class:`SdoSnapshot`.
 
-        Parameters
-        ----------
-        output_pos : int
-            Desired position of the output shaft after the gearbox.
-        gear_ratio : float
-            Gear ratio (motor revolutions per output revolution).
+        ``entries`` holds ``(index, subindex, size[, signed])`` tuples.
+        Objects in the process image are served from it without mailbox
+        traffic, and subindexes ``1..n`` of one object are uploaded with a
+        single complete-access request where the drive supports it.  Failed
+        entries are reported in ``snapshot.errors`` instead of raising.
         """
-
-        motor_pos = int(output_pos * gear_ratio)
-        self.set_target_position(motor_pos)
-
-    def set_target_velocity(self, vel: int) -> None:
-        self.write_sdo(self.TARGET_VELOCITY, 0, vel, size=4)
-
-    def read_actual_position(self) -> int:
-        return self.read_sdo(self.ACTUAL_POSITION, 0, size=4)
-
-    def start_motion(self) -> None:
-        """Trigger motion in profile position mode."""
-        # Set the "new set-point" and "change set immediately" bits
-        # according to CiA 402 profile position mode.
-        self.write_sdo(self.CONTROL_WORD, 0, 0x3F)
-        time.sleep(0.05)
-
-
-    def release_brake(self) -> None:
-        """Release the motor brake using digital outputs if available."""
-        try:
-            state = self.read_sdo(self.DIGITAL_OUTPUTS, 1, size=4)
-        except Exception:
-            state = 0
-        self.write_sdo(self.DIGITAL_OUTPUTS, 1, state | 0x01, size=4)
-        time.sleep(0.05)
-
-    def enable_controller(self) -> None:
-        """Enable controller with Fw and Fb control bits."""
-        try:
-            state = self.read_sdo(self.DIGITAL_OUTPUTS, 1, size=4)
-        except Exception:
-            state = 0
-        self.write_sdo(self.DIGITAL_OUTPUTS, 1, state | self.CONTROLLER_BITS, size=4)
-        time.sleep(0.05)
-
+        values = {}
+        errors = {}
+        pending = []
+        image = self.process_image
+        for req in normalize(entries):
+            idx, sub = req[0], req[1]
+            if image is not None and image.has_input(idx, sub):
+                values[(idx, sub)] = image.get_input(idx, sub)
+            elif image is not None and image.has_output(idx, sub):
+                values[(idx, sub)] = image.get_output(idx, sub)
+            else:
+                pending.append(req)
+
+        for idx, group in group_complete_access(pending):
+            size = complete_access_size(group)
+            if size and idx not in self._no_complete_access:
+                try:
+                    buf = self.slave.sdo_read(idx, 1, ca=True)
+                    values.update(split_complete_access(buf, group))
+                    continue
+                except Exception:
+                    pass
+                self._no_complete_access.add(idx)
+            for idx, sub, size, signed in group:
+                try:
+                    values[(idx, sub)] = self.read_sdo(idx, sub, size, signed)
+                except Exception as exc:
+                    errors[(idx, sub)] = exc
+        return SdoSnapshot(self.clock.time(), values, errors)
+
+    @timed("write_sdo_many")
+    def write_sdo_many(self, entries) -> None:
+        """Write ``(index, subindex, value, size)`` entries in order.
+
+        Process-image objects are updated in place; the others are written
+        through the mailbox.  The first failing write raises.
+        """
+        for idx, sub, val, size in entries:
+            self._write(idx, sub, val, size)
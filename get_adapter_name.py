@@ -1,71 +1,253 @@
-# get_adapter_name.py
-"""
-List available network adapters detected by PySOEM and
-return one you can pass to EthercatServo(ifname=...).
-
-Works with both PySOEM ≥1.0 (str fields) and earlier versions (bytes fields).
-"""
-
+# get_adapter_name.py
+"""
+List available network adapters detected by PySOEM and
+return one you can pass to EthercatServo(ifname=...).
+
+:func:`find_adapter` probes every adapter concurrently for EtherCAT slaves,
+ranks them by the drives that answer and caches the winner together with the
+slave topology, so later starts only have to confirm the cached adapter.
+
+Works with both PySOEM ≥1.0 (str fields) and earlier versions (bytes fields).
+"""
+
 from __future__ import annotations
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from pathlib import Path
+from typing import Callable, Iterable, List, NamedTuple, Optional, Set
+
 import pysoem
 
 # Default adapter name used when no search is performed
 IFNAME = r"\Device\NPF_{99F254B6-0FBF-4B4D-B9DB-F9CA300B4CCF}"
-
-
-def _to_str(value: str | bytes) -> str:
-    """Convert bytes → str if needed (PySOEM ≤0.3) else return unchanged."""
-    return value.decode() if isinstance(value, bytes) else value
-
-
+# Environment variable naming the adapter; skips discovery when set.
+ENV_IFNAME = "ECAT_IFNAME"
+ESI_PATH = "JMC_DRIVE_V1.8.xml"
+CACHE_FILE = Path.home() / ".cache" / "ethercat" / "adapter.json"
+# Seconds to wait for all adapters to finish probing.
+PROBE_TIMEOUT = 3.0
+
+
+class SlaveIdentity(NamedTuple):
+    name: str
+    vendor: int
+    product: int
+    revision: int
+
+
+class AdapterProbe(NamedTuple):
+    """Result of scanning one adapter for slaves."""
+
+    name: str
+    desc: str
+    slaves: List[SlaveIdentity]
+    elapsed: float
+    error: Optional[str] = None
+
+
+def _to_str(value: str | bytes) -> str:
+    """Convert bytes → str if needed (PySOEM ≤0.3) else return unchanged."""
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _is_loopback(name: str) -> bool:
+    return "loopback" in name.lower() or name == "lo"
+
+
 def list_adapters() -> None:
-    """Print all adapters (name – description)."""
-    for ad in pysoem.find_adapters():
-        name = _to_str(ad.name)
-        desc = _to_str(ad.desc)
+    """Print all adapters (name – description)."""
+    for ad in pysoem.find_adapters():
+        name = _to_str(ad.name)
+        desc = _to_str(ad.desc)
         print(f"{name}  —  {desc}")
 
 
+def known_products(esi_path: str = ESI_PATH) -> Set[int]:
+    """Product codes of the drives described by ``esi_path``."""
+    from object_dictionary import load_devices
+
+    try:
+        return set(load_devices(esi_path))
+    except (OSError, RuntimeError):
+        return set()
+
+
+def probe_adapter(name: str, desc: str = "", master_factory: Callable = None) -> AdapterProbe:
+    """Open ``name``, scan the segment and return the slaves that answered.
+
+    Errors (no permission, link down, ...) are reported in ``error`` instead
+    of raising, so one bad adapter does not stop a parallel probe.
+    """
+    start = time.monotonic()
+    master = (master_factory or pysoem.Master)()
+    try:
+        master.open(name)
+        try:
+            count = master.config_init()
+            slaves = [
+                SlaveIdentity(_to_str(s.name), s.man, s.id, s.rev)
+                for s in list(master.slaves)[:max(count, 0)]
+            ]
+        finally:
+            master.close()
+    except Exception as exc:
+        return AdapterProbe(name, desc, [], time.monotonic() - start, str(exc) or type(exc).__name__)
+    return AdapterProbe(name, desc, slaves, time.monotonic() - start)
+
+
+def probe_adapters(adapters: Iterable, timeout: float = PROBE_TIMEOUT,
+                   master_factory: Callable = None) -> List[AdapterProbe]:
+    """Probe all ``adapters`` concurrently, each on its own thread.
+
+    Adapters that have not finished within ``timeout`` seconds are reported
+    with an error; their threads are left to finish in the background.
+    """
+    adapters = list(adapters)
+    if not adapters:
+        return []
+    pool = ThreadPoolExecutor(max_workers=len(adapters), thread_name_prefix="adapter-probe")
+    futures = {
+        pool.submit(probe_adapter, _to_str(ad.name), _to_str(ad.desc), master_factory): ad
+        for ad in adapters
+    }
+    done, _ = wait_futures(futures, timeout)
+    pool.shutdown(wait=False)
+    probes = []
+    for future, ad in futures.items():
+        if future in done:
+            probes.append(future.result())
+        else:
+            probes.append(AdapterProbe(_to_str(ad.name), _to_str(ad.desc), [], timeout, "timeout"))
+    return probes
+
+
+def rank(probes: Iterable[AdapterProbe], products: Set[int] = frozenset()) -> List[AdapterProbe]:
+    """Order probes best first.
+
+    Adapters with more slaves whose product code is in ``products`` win,
+    then adapters with more slaves, then the faster one.  Adapters without
+    slaves are dropped.
+    """
+    found = [p for p in probes if p.slaves]
+
+    def key(probe: AdapterProbe):
+        known = sum(s.product in products for s in probe.slaves)
+        return (-known, -len(probe.slaves), probe.elapsed, probe.name)
+
+    return sorted(found, key=key)
+
+
+def load_cache(path: Path = CACHE_FILE) -> Optional[dict]:
+    try:
+        data = json.loads(Path(path).read_text())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or "adapter" not in data or "slaves" not in data:
+        return None
+    return data
+
+
+def save_cache(probe: AdapterProbe, path: Path = CACHE_FILE) -> None:
+    path = Path(path)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({
+            "adapter": probe.name,
+            "desc": probe.desc,
+            "slaves": [s._asdict() for s in probe.slaves],
+        }, indent=2))
+        os.replace(tmp, path)
+    except OSError:
+        pass  # read-only home: discovery still works, just not cached
+
+
+def find_adapter(use_cache: bool = True, timeout: float = PROBE_TIMEOUT,
+                 esi_path: str = ESI_PATH, cache_file: Path = CACHE_FILE,
+                 master_factory: Callable = None) -> AdapterProbe:
+    """Return the probe of the adapter the drives are attached to.
+
+    A cached adapter is used when it still exists and a probe of that adapter
+    alone returns the cached slave topology.  Otherwise every adapter is
+    probed concurrently and the best one (see :func:`rank`) is cached.
+
+    Raises
+    ------
+    RuntimeError
+        If no adapter has any responding slave.
+    """
+    adapters = [ad for ad in pysoem.find_adapters() if not _is_loopback(_to_str(ad.name))]
+    if use_cache:
+        cached = load_cache(cache_file)
+        match = [ad for ad in adapters if cached and _to_str(ad.name) == cached["adapter"]]
+        if match:
+            probe = probe_adapter(cached["adapter"], _to_str(match[0].desc), master_factory)
+            if [s._asdict() for s in probe.slaves] == cached["slaves"]:
+                return probe
+
+    ranked = rank(probe_adapters(adapters, timeout, master_factory), known_products(esi_path))
+    if not ranked:
+        raise RuntimeError("No adapter with responding EtherCAT slaves found.")
+    save_cache(ranked[0], cache_file)
+    return ranked[0]
+
+
 def get_adapter_name(search: str = "default") -> str:
     """Return the adapter name.
 
     Parameters
     ----------
     search : str
-        Pass ``"search"`` to print all available adapters and return the
-        first suitable adapter.  Any other value (including ``"default"``)
-        returns :data:`IFNAME`.
+        ``"default"`` returns the configured adapter without probing: the
+        ``ECAT_IFNAME`` environment variable if set, else :data:`IFNAME`
+        when this machine has it.  Only when neither applies is the
+        adapter found by :func:`find_adapter`, trusting a still-valid
+        cache.  ``"search"`` prints all available adapters and always
+        probes them again.  Both fall back to :data:`IFNAME` when no
+        adapter has responding slaves.
     """
     if search == "search":
         list_adapters()
-        try:
-            return get_first_adapter()
-        except RuntimeError:
+    else:
+        configured = os.environ.get(ENV_IFNAME)
+        if configured:
+            return configured
+        if any(_to_str(ad.name) == IFNAME for ad in pysoem.find_adapters()):
             return IFNAME
-    return IFNAME
-
-
-def get_first_adapter(exclude_loopback: bool = True) -> str:
-    """
-    Return the first suitable adapter name.
-
-    Parameters
-    ----------
-    exclude_loopback : bool
-        Skip adapters whose name contains 'loopback' (case-insensitive).
-
-    Raises
-    ------
-    RuntimeError
-        If no suitable adapter is found.
-    """
-    for ad in pysoem.find_adapters():
-        name = _to_str(ad.name)
-        if exclude_loopback and "loopback" in name.lower():
-            continue
-        return name
-    raise RuntimeError("No suitable Ethernet adapter found.")
-
-
-if __name__ == "__main__":
-    list_adapters()
+    try:
+        return find_adapter(use_cache=search != "search").name
+    except RuntimeError:
+        return IFNAME
+
+
+def get_first_adapter(exclude_loopback: bool = True) -> str:
+    """
+    Return the first suitable adapter name.
+
+    Parameters
+    ----------
+    exclude_loopback : bool
+        Skip adapters whose name contains 'loopback' (case-insensitive)
+        and the Linux ``lo`` interface.
+
+    Raises
+    ------
+    RuntimeError
+        If no suitable adapter is found.
+    """
+    for ad in pysoem.find_adapters():
+        name = _to_str(ad.name)
+        if exclude_loopback and _is_loopback(name):
+            continue
+        return name
+    raise RuntimeError("No suitable Ethernet adapter found.")
+
+
+if __name__ == "__main__":
+    list_adapters()
+    for probe in rank(probe_adapters(pysoem.find_adapters()), known_products()):
+        print(f"{probe.name}: {len(probe.slaves)} slave(s) in {probe.elapsed * 1000:.0f} ms")
@@ -1,33 +1,187 @@
 import argparse
 import os
+import queue
 import tkinter as tk
-from tkinter import ttk
+from tkinter import filedialog, ttk
 
-if os.getenv("SIMULATION") == "1":
-    from servo_simulator import ServoSimulator as EthercatServo
-else:
-    from ethercat_servo import EthercatServo
+import numpy as np
 
-from get_adapter_name import get_adapter_name
+import scope
+from acquisition import AcquisitionWorker
+from demo import import_backend
+from telemetry import TIME_COLUMN, Recorder
 
 # Indices of registers displayed in the GUI.  Each entry contains
-# (index, subindex, name, size_in_bytes).
+# (index, subindex, name, size_in_bytes, signed).
 REGISTER_DEFS = [
-    (0x6040, 0, "controlword", 2),
-    (0x6041, 0, "statusword", 2),
-    (0x6060, 0, "op_mode", 1),
-    (0x6061, 0, "op_mode_display", 1),
-    (0x607A, 0, "target_position", 4),
-    (0x60FF, 0, "target_velocity", 4),
-    (0x6064, 0, "actual_position", 4),
-    (0x60FE, 1, "physical_outputs", 4),
+    (0x6040, 0, "controlword", 2, False),
+    (0x6041, 0, "statusword", 2, False),
+    (0x6060, 0, "op_mode", 1, True),
+    (0x6061, 0, "op_mode_display", 1, True),
+    (0x607A, 0, "target_position", 4, True),
+    (0x60FF, 0, "target_velocity", 4, True),
+    (0x6064, 0, "actual_position", 4, True),
+    (0x60FE, 1, "physical_outputs", 4, False),
 ]
 
+TRACE_COLORS = dict(zip(scope.ANALOG_TRACES, ("#4fc3f7", "#ffb74d")))
+BIT_COLOR = "#81c784"
+
+
+class ScopePanel:
+    """Scrolling plot of position, target and statusword bits.
+
+    Draws the newest ``span`` seconds held by ``recorder``.  Each trace is
+    one canvas line whose coordinates are replaced on :meth:`redraw` with
+    the min/max envelope from :func:`scope.decimate`, so a redraw costs the
+    same at 10 Hz or 1 kHz polling.  *Pause* freezes a copy of the buffer,
+    the zoom buttons or the mouse wheel change the span and *Export CSV*
+    writes the undecimated samples of the visible window.
+    """
+
+    SPANS = (0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+    MARGIN = 50
+    BIT_ROW = 18
+
+    def __init__(self, parent, recorder: Recorder, status=None, width=600, height=300, span=5.0):
+        self.recorder = recorder
+        self.status = status
+        self.span_index = min(range(len(self.SPANS)), key=lambda i: abs(self.SPANS[i] - span))
+        self.paused = False
+        self.frozen = None
+
+        self.frame = ttk.LabelFrame(parent, text="Scope")
+        self.frame.columnconfigure(4, weight=1)
+        self.frame.rowconfigure(0, weight=1)
+        self.canvas = tk.Canvas(self.frame, width=width, height=height, background="black",
+                                highlightthickness=0)
+        self.canvas.grid(row=0, column=0, columnspan=5, sticky="nsew")
+        self.pause_text = tk.StringVar(value="Pause")
+        ttk.Button(self.frame, textvariable=self.pause_text, command=self.toggle_pause).grid(row=1, column=0)
+        ttk.Button(self.frame, text="Zoom in", command=lambda: self.zoom(-1)).grid(row=1, column=1)
+        ttk.Button(self.frame, text="Zoom out", command=lambda: self.zoom(1)).grid(row=1, column=2)
+        ttk.Button(self.frame, text="Export CSV", command=self.export).grid(row=1, column=3)
+        self.span_var = tk.StringVar()
+        ttk.Label(self.frame, textvariable=self.span_var).grid(row=1, column=4, sticky="e")
+        self.canvas.bind("<MouseWheel>", lambda e: self.zoom(-1 if e.delta > 0 else 1))
+        self.canvas.bind("<Button-4>", lambda e: self.zoom(-1))
+        self.canvas.bind("<Button-5>", lambda e: self.zoom(1))
+        self.canvas.bind("<Configure>", lambda e: self.redraw())
+
+        canvas = self.canvas
+        self.lines = {name: canvas.create_line(0, 0, 0, 0, fill=TRACE_COLORS[name])
+                      for name in scope.ANALOG_TRACES}
+        self.bit_lines = {}
+        for row, (number, label) in enumerate(scope.STATUS_BITS):
+            self.bit_lines[number] = canvas.create_line(0, 0, 0, 0, fill=BIT_COLOR)
+            canvas.create_text(2, 0, anchor="w", fill="white", text=label, tags=f"bit{row}")
+        self.top_label = canvas.create_text(2, 2, anchor="nw", fill="white")
+        self.bottom_label = canvas.create_text(2, 0, anchor="sw", fill="white")
+        for i, name in enumerate(scope.ANALOG_TRACES):
+            canvas.create_text(self.MARGIN + 4 + 130 * i, 2, anchor="nw", fill=TRACE_COLORS[name],
+                               text=name.replace("_", " "))
+        self._show_span()
+
+    @property
+    def span(self) -> float:
+        return self.SPANS[self.span_index]
+
+    def _show_span(self):
+        self.span_var.set(f"{self.span * 1000:g} ms" if self.span < 1 else f"{self.span:g} s")
+
+    def _data(self):
+        return self.frozen if self.paused else self.recorder.latest()
+
+    def _visible(self):
+        data = self._data()
+        times = data[TIME_COLUMN]
+        stop = float(times[-1]) if len(times) else 0.0
+        # Half-open window; nudge the end so the newest sample is included.
+        stop = np.nextafter(stop, np.inf)
+        return data, stop - self.span, stop
+
+    def toggle_pause(self):
+        self.paused = not self.paused
+        self.frozen = self.recorder.latest() if self.paused else None
+        self.pause_text.set("Run" if self.paused else "Pause")
+        self.redraw()
+
+    def zoom(self, step: int):
+        self.span_index = min(max(self.span_index + step, 0), len(self.SPANS) - 1)
+        self._show_span()
+        self.redraw()
+
+    def export(self):
+        path = filedialog.asksaveasfilename(defaultextension=".csv",
+                                            filetypes=[("CSV files", "*.csv")])
+        if not path:
+            return
+        data, start, stop = self._visible()
+        try:
+            count = scope.write_csv(path, scope.window(data, start, stop))
+        except OSError as exc:
+            message = f"Error: {exc}"
+        else:
+            message = f"Exported {count} samples to {path}"
+        if self.status is not None:
+            self.status.set(message)
+
+    def redraw(self):
+        canvas = self.canvas
+        if not canvas.winfo_ismapped():
+            return
+        width = max(canvas.winfo_width(), 2 * self.MARGIN)
+        height = canvas.winfo_height()
+        columns = width - self.MARGIN
+        bits_top = height - self.BIT_ROW * len(scope.STATUS_BITS)
+        plot_top, plot_bottom = 16, bits_top - 6
+        data, start, stop = self._visible()
+        times = data[TIME_COLUMN]
+
+        envelopes = {name: scope.decimate(times, data[name].astype(float), start, stop, columns)
+                     for name in scope.ANALOG_TRACES}
+        known = [v for mins, maxs in envelopes.values() for v in (mins, maxs) if not np.isnan(v).all()]
+        lo = min(np.nanmin(v) for v in known) if known else 0.0
+        hi = max(np.nanmax(v) for v in known) if known else 1.0
+        if hi - lo < 1.0:
+            lo, hi = lo - 0.5, hi + 0.5
+        scale = (plot_bottom - plot_top) / (hi - lo)
+        for name, (mins, maxs) in envelopes.items():
+            coords = scope.envelope(mins, maxs, self.MARGIN, 1.0, plot_bottom + lo * scale, scale)
+            canvas.coords(self.lines[name], *(coords if len(coords) >= 4 else (0, 0, 0, 0)))
+        canvas.itemconfigure(self.top_label, text=f"{hi:.0f}")
+        canvas.coords(self.bottom_label, 2, plot_bottom)
+        canvas.itemconfigure(self.bottom_label, text=f"{lo:.0f}")
+
+        for row, (number, _) in enumerate(scope.STATUS_BITS):
+            row_bottom = bits_top + self.BIT_ROW * (row + 1) - 3
+            mins, maxs = scope.decimate(times, scope.bit(data, number), start, stop, columns)
+            coords = scope.envelope(mins, maxs, self.MARGIN, 1.0, row_bottom, self.BIT_ROW - 6)
+            canvas.coords(self.bit_lines[number], *(coords if len(coords) >= 4 else (0, 0, 0, 0)))
+            canvas.coords(f"bit{row}", 2, row_bottom - (self.BIT_ROW - 6) / 2)
+
+
 class ServoGUI:
-    def __init__(self, root, servo):
+    """Tk front end; all servo I/O happens on an :class:`AcquisitionWorker`.
+
+    The Tk loop only drains the worker's event queue every ``redraw_ms`` and
+    renders the newest snapshot, so a slow or stalled drive never freezes the
+    window.  Every snapshot is also stored in a ring buffer of
+    ``scope_samples`` entries shown by the :class:`ScopePanel`.
+    """
+
+    def __init__(self, root, servo, poll_period=0.05, redraw_ms=100, scope_samples=65536):
         self.root = root
         self.servo = servo
         self.connected = False
+        self.redraw_ms = redraw_ms
+        self.recorder = Recorder(servo, scope.SCOPE_CHANNELS, capacity=scope_samples)
+        self.worker = AcquisitionWorker(
+            servo,
+            [(idx, sub, size, signed) for idx, sub, _, size, signed in REGISTER_DEFS],
+            period=poll_period,
+            on_snapshot=self.recorder.store,
+        )
 
         self.target_var = tk.IntVar(value=0)
         self.pos_var = tk.StringVar(value="n/a")
@@ -51,81 +205,119 @@ class ServoGUI:
         reg_frame = ttk.LabelFrame(frame, text="Registers")
         reg_frame.grid(row=4, column=0, columnspan=2, sticky="nsew", pady=(10, 0))
         self.register_vars = {}
-        for r, (idx, sub, name, size) in enumerate(REGISTER_DEFS):
+        for r, (idx, sub, name, size, signed) in enumerate(REGISTER_DEFS):
             ttk.Label(reg_frame, text=f"{name} (0x{idx:04X}:{sub})").grid(row=r, column=0, sticky="w")
             var = tk.StringVar(value="n/a")
             ttk.Label(reg_frame, textvariable=var).grid(row=r, column=1, sticky="w")
-            self.register_vars[(idx, sub)] = (var, size)
+            self.register_vars[(idx, sub)] = var
+
+        self.scope = ScopePanel(frame, self.recorder, status=self.status_var)
+        self.scope.frame.grid(row=5, column=0, columnspan=2, sticky="nsew", pady=(10, 0))
+        root.columnconfigure(0, weight=1)
+        root.rowconfigure(0, weight=1)
+        frame.columnconfigure(1, weight=1)
+        frame.rowconfigure(5, weight=1)
 
         root.protocol("WM_DELETE_WINDOW", self.close)
-        self.root.after(200, self.update)
+        self.worker.start()
+        self.root.after(self.redraw_ms, self.update)
+
+    def _connect_servo(self):
+        # Runs on the worker thread.
+        self.servo.open()
+        self.servo.set_mode(1)
+        self.servo.enable_operation()
+        self.servo.release_brake()
+        self.servo.enable_controller()
+        self.connected = True
+        self.worker.polling = True
 
     def connect(self):
         if self.connected:
             return
-        try:
-            self.servo.open()
-            self.servo.set_mode(1)
-            self.servo.enable_operation()
-            self.servo.release_brake()
-            self.servo.enable_controller()
-            self.status_var.set("Connected")
-            self.connected = True
-        except Exception as exc:
-            self.status_var.set(f"Error: {exc}")
+        self.status_var.set("Connecting...")
+        self.worker.submit(self._connect_servo, done="Connected")
+
+    def _move_servo(self, pos):
+        self.servo.set_target_position(pos)
+        self.servo.start_motion()
 
     def move(self):
         if not self.connected:
             return
         try:
             pos = self.target_var.get()
-            self.servo.set_target_position(pos)
-            self.servo.start_motion()
-        except Exception as exc:
+        except tk.TclError as exc:
             self.status_var.set(f"Error: {exc}")
+            return
+        self.worker.submit(self._move_servo, pos)
+
+    def render(self, snapshot):
+        if (0x6064, 0) in snapshot:
+            self.pos_var.set(str(snapshot[(0x6064, 0)]))
+        if snapshot.get((0x6041, 0), 0) & 0x08:
+            self.status_var.set("Fault")
+        for key, var in self.register_vars.items():
+            var.set(str(snapshot[key]) if key in snapshot else "err")
 
     def update(self):
-        if self.connected:
+        snapshot = None
+        while True:
             try:
-                pos = self.servo.read_actual_position()
-                self.pos_var.set(str(pos))
-                status = self.servo.read_sdo(0x6041, 0)
-                if status & 0x08:
-                    self.status_var.set("Fault")
-                for idx, sub, name, size in REGISTER_DEFS:
-                    var, sz = self.register_vars[(idx, sub)]
-                    try:
-                        val = self.servo.read_sdo(idx, sub, size=sz)
-                        var.set(str(val))
-                    except Exception:
-                        var.set("err")
-            except Exception as exc:
-                self.status_var.set(f"Error: {exc}")
-        self.root.after(200, self.update)
+                kind, payload = self.worker.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "snapshot":
+                snapshot = payload
+            else:
+                self.status_var.set(payload)
+        # Intermediate snapshots are superseded; only draw the newest.
+        if snapshot is not None:
+            self.render(snapshot)
+            if not self.scope.paused:
+                self.scope.redraw()
+        self.root.after(self.redraw_ms, self.update)
+
+    def _close_servo(self):
+        # Runs on the worker thread, after any connect still queued.
+        self.connected = False
+        self.servo.close()
 
     def close(self):
         try:
-            if self.connected:
-                self.servo.close()
+            self.worker.polling = False
+            # Always close: ``connected`` is set on the worker thread and
+            # is still False while a connect waits in the queue or fails
+            # after open().  Wait for it, so the drive is never left open.
+            self.worker.submit(self._close_servo)
+            self.worker.stop(timeout=None)
         finally:
             self.root.destroy()
 
 
-def main(ifname=None, simulate=False):
-    simulate = simulate or os.getenv("SIMULATION") == "1"
-    if ifname is None:
+def main(ifname=None, simulate=False, poll_period=0.05, redraw_ms=100, backend=None):
+    if backend is None:
+        simulate = simulate or os.getenv("SIMULATION") == "1"
+        backend = "sim" if simulate else "hw"
+    if backend == "sim":
+        # The GUI runs on wall-clock time, unlike the demo's virtual clock.
+        from servo_simulator import ServoSimulator as EthercatServo
+
+        def get_adapter_name():
+            return "sim"
+    else:
+        EthercatServo, get_adapter_name = import_backend(backend)
+
+    if ifname is None and backend != "remote":
         ifname = os.environ.get("ECAT_IFNAME")
     if ifname is None:
         ifname = get_adapter_name()
 
-    if simulate:
-        servo = EthercatServo(ifname=ifname, slave_pos=0)
-    else:
-        servo = EthercatServo(ifname=ifname, slave_pos=0)
+    servo = EthercatServo(ifname=ifname, slave_pos=0)
 
     root = tk.Tk()
     root.title("EtherCAT Servo GUI")
-    ServoGUI(root, servo)
+    ServoGUI(root, servo, poll_period=poll_period, redraw_ms=redraw_ms)
     root.mainloop()
 
 
@@ -133,5 +325,9 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="EtherCAT servo GUI")
     parser.add_argument("--ifname", help="network interface", default=None)
     parser.add_argument("--simulate", action="store_true", help="use simulator")
+    parser.add_argument("--backend", choices=["hw", "sim", "remote"], default=None,
+                        help="servo backend; 'remote' connects to a servo-sim daemon")
+    parser.add_argument("--poll-ms", type=int, default=50, help="acquisition period")
+    parser.add_argument("--redraw-ms", type=int, default=100, help="display refresh period")
     args = parser.parse_args()
-    main(args.ifname, args.simulate)
+    main(args.ifname, args.simulate, args.poll_ms / 1000.0, args.redraw_ms, args.backend)
@@ -1,15 +1,26 @@
 import argparse
+import ast
+import datetime
+import hashlib
+import json
 import os
 import subprocess
 import sys
+import tempfile
 import time
 import shutil
+import xml.etree.ElementTree as ET
 import zipfile
 from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
 
 REMOTE = "origin"
 BRANCH = "main"
 RESULTS_PREFIX = "results/"
+HARDWARE_TESTS = "tests/hardware"
+# Non-Python inputs that can change the outcome of every hardware test.
+SHARED_INPUTS = ["JMC_DRIVE_V1.8.xml", "requirements.txt", "pytest.ini"]
+CACHE_FILE = Path.home() / ".cache" / "hardware_loop" / "results.json"
 
 
 def parse_args() -> argparse.Namespace:
@@ -25,7 +36,25 @@ def parse_args() -> argparse.Namespace:
         type=int,
         default=60,
         metavar="SECONDS",
-        help="how long to wait between polling cycles (default: 60)",
+        help="how long to wait between remote checks (default: 60)",
+    )
+    p.add_argument(
+        "--trigger",
+        type=Path,
+        metavar="FILE",
+        help="only check the remote when FILE is touched (e.g. by a push hook)",
+    )
+    p.add_argument(
+        "--cache",
+        type=Path,
+        default=CACHE_FILE,
+        metavar="FILE",
+        help=f"result cache (default: {CACHE_FILE})",
+    )
+    p.add_argument(
+        "--force",
+        action="store_true",
+        help="run every hardware test, ignoring cached results",
     )
     return p.parse_args()
 
@@ -40,8 +69,175 @@ def run(cmd, cwd=None):
     return subprocess.call(cmd, shell=True, cwd=cwd) == 0
 
 
-def run_tests(root: Path) -> bool:
-    return run("pytest -s --alluredir TestResults tests/hardware/test_device_controller.py", cwd=root)
+def remote_head(root: Path) -> Optional[str]:
+    """Return the remote branch head without fetching any objects."""
+    try:
+        out = subprocess.check_output(
+            ["git", "ls-remote", REMOTE, f"refs/heads/{BRANCH}"], cwd=root, text=True
+        )
+    except subprocess.CalledProcessError:
+        return None
+    return out.split()[0] if out.strip() else None
+
+
+def wait_for_new_commit(root: Path, known: str, interval: int, trigger: Optional[Path] = None) -> str:
+    """Block until the remote branch points at a commit other than ``known``.
+
+    Without ``trigger`` the remote is queried with ``git ls-remote`` every
+    ``interval`` seconds.  With a trigger file the remote is only queried
+    when the file's modification time changes, checked once per second.
+    """
+    last_mtime = None
+    while True:
+        if trigger is not None:
+            try:
+                mtime = trigger.stat().st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime == last_mtime:
+                time.sleep(1)
+                continue
+            last_mtime = mtime
+        sha = remote_head(root)
+        if sha and sha != known:
+            return sha
+        if trigger is None:
+            print(f"No new commit. Sleeping {interval} s.")
+            time.sleep(interval)
+
+
+def module_path(root: Path, name: str) -> Optional[Path]:
+    """Return the file of a module that lives in the repository, if any."""
+    rel = Path(*name.split("."))
+    for candidate in (root / rel.with_suffix(".py"), root / rel / "__init__.py"):
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def local_imports(root: Path, path: Path) -> Set[Path]:
+    """Repository modules imported anywhere in ``path``, including lazily."""
+    try:
+        tree = ast.parse(path.read_text(), str(path))
+    except (OSError, SyntaxError):
+        return set()
+    found = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module] + [f"{node.module}.{alias.name}" for alias in node.names]
+        else:
+            continue
+        for name in names:
+            dep = module_path(root, name)
+            if dep is not None:
+                found.add(dep)
+    return found
+
+
+def dependencies(root: Path, test_file: Path) -> Set[Path]:
+    """``test_file`` plus every repository module it transitively imports.
+
+    The ``conftest.py`` and ``__init__.py`` files of the enclosing test
+    packages are included since pytest loads them for the test file too.
+    """
+    seen = {test_file}
+    for parent in test_file.parents:
+        if parent == root.parent:
+            break
+        seen.update(p for p in (parent / "conftest.py", parent / "__init__.py") if p.is_file())
+    pending = list(seen)
+    while pending:
+        for dep in local_imports(root, pending.pop()):
+            if dep not in seen:
+                seen.add(dep)
+                pending.append(dep)
+    return seen
+
+
+def inputs_key(root: Path, files: Iterable[Path]) -> str:
+    """Hash of the paths and contents of ``files`` plus the shared inputs."""
+    digest = hashlib.sha256()
+    paths = set(files) | {root / name for name in SHARED_INPUTS}
+    for path in sorted(paths):
+        digest.update(path.relative_to(root).as_posix().encode() + b"\0")
+        try:
+            digest.update(hashlib.sha256(path.read_bytes()).digest())
+        except FileNotFoundError:
+            digest.update(b"missing")
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """JSON file mapping an inputs key to the record of a passing run."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        try:
+            self.entries: Dict[str, dict] = json.loads(path.read_text())
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, key: str) -> Optional[dict]:
+        return self.entries.get(key)
+
+    def put(self, key: str, record: dict) -> None:
+        self.entries[key] = record
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.entries, indent=2))
+        tmp.replace(self.path)
+
+
+def select_tests(root: Path, cache: ResultCache, force: bool = False):
+    """Split the hardware tests into ``(to_run, cached)``.
+
+    ``to_run`` maps each test file whose inputs have no cached pass to its
+    inputs key; ``cached`` maps the others to their cached record.  Failures
+    are always rerun: a loose cable or an unpowered drive must not stick to
+    the inputs until one of them changes.
+    """
+    to_run: Dict[Path, str] = {}
+    cached: Dict[Path, dict] = {}
+    for test_file in sorted((root / HARDWARE_TESTS).glob("test_*.py")):
+        key = inputs_key(root, dependencies(root, test_file))
+        record = None if force else cache.get(key)
+        if record is None or not record.get("passed"):
+            to_run[test_file] = key
+        else:
+            cached[test_file] = record
+    return to_run, cached
+
+
+def junit_outcomes(root: Path, report: Path, files: Iterable[Path]) -> Dict[Path, bool]:
+    """Per-file pass/fail from a pytest JUnit XML report."""
+    outcomes = {f: True for f in files}
+    modules = {".".join(f.relative_to(root).with_suffix("").parts): f for f in files}
+    try:
+        cases = ET.parse(report).getroot().iter("testcase")
+    except (OSError, ET.ParseError):
+        return {f: False for f in files}
+    for case in cases:
+        classname = case.get("classname", "")
+        for module, f in modules.items():
+            if classname == module or classname.startswith(module + "."):
+                if case.find("failure") is not None or case.find("error") is not None:
+                    outcomes[f] = False
+    return outcomes
+
+
+def run_tests(root: Path, files: List[Path]) -> Dict[Path, bool]:
+    """Run the given hardware test files; return pass/fail per file."""
+    with tempfile.TemporaryDirectory() as tmp:
+        report = Path(tmp) / "junit.xml"
+        paths = " ".join(str(f.relative_to(root)) for f in files)
+        ok = run(f"pytest -s --alluredir TestResults --junitxml {report} {paths}", cwd=root)
+        outcomes = junit_outcomes(root, report, files)
+    if not ok and all(outcomes.values()):
+        # pytest failed outside any test case (collection, fixtures, ...).
+        outcomes = {f: False for f in files}
+    return outcomes
 
 
 def generate_report(root: Path) -> bool:
@@ -74,22 +270,33 @@ def push_results(root: Path, sha: str, zip_path: Path):
 def main():
     args = parse_args()
     root = repo_root()
+    cache = ResultCache(args.cache)
+    known = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=root, text=True).strip()
     while True:
-        run(f"git fetch {REMOTE}", cwd=root)
-        local_sha = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=root, text=True).strip()
-        remote_sha = subprocess.check_output(["git", "rev-parse", f"{REMOTE}/{BRANCH}"], cwd=root, text=True).strip()
-        if local_sha == remote_sha:
-            print(f"No new commit. Sleeping {args.sleep} s.")
-            time.sleep(args.sleep)
-            continue
+        remote_sha = wait_for_new_commit(root, known, args.sleep, args.trigger)
+        run(f"git fetch {REMOTE} {BRANCH}", cwd=root)
         run(f"git reset --hard {REMOTE}/{BRANCH}", cwd=root)
+        known = remote_sha
+
+        to_run, cached = select_tests(root, cache, args.force)
+        for test_file, record in cached.items():
+            print(f"{test_file.relative_to(root)}: inputs unchanged since {record['sha'][:7]}, passed")
+        if not to_run:
+            print(f"Commit {remote_sha[:7]} does not affect the hardware tests. Skipping.")
+            continue
         if not args.yes:
-            ans = input(f"New commit {remote_sha[:7]} detected. Run integration tests now? [y/N] ")
+            ans = input(f"New commit {remote_sha[:7]} detected. Run {len(to_run)} affected test file(s) now? [y/N] ")
             if ans.lower() != 'y':
                 continue
         else:
-            print(f"New commit {remote_sha[:7]} detected. Running integration tests...")
-        if not run_tests(root):
+            print(f"New commit {remote_sha[:7]} detected. Running {len(to_run)} affected test file(s)...")
+        outcomes = run_tests(root, list(to_run))
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        for test_file, passed in outcomes.items():
+            if passed:
+                cache.put(to_run[test_file], {"sha": remote_sha, "passed": True, "time": now,
+                                              "file": str(test_file.relative_to(root))})
+        if not all(outcomes.values()):
             print("Tests failed")
             continue
         if generate_report(root):
@@ -0,0 +1,186 @@
+"""Opt-in latency instrumentation for the servo backends.
+
+Assign an :class:`Instruments` object to ``servo.instruments`` (or pass it to
+the constructor) and every SDO access, batched read, state-machine sequence
+and ``open()`` phase is timed into a log-linear histogram per operation and
+per object index.  With ``instruments`` left at ``None`` the timed methods
+only pay for one attribute check.
+
+Set ``ECAT_LATENCY_LOG`` to a file name to enable instrumentation for every
+servo created in the process; ``close()`` then appends :meth:`Instruments.dump`
+to that file.  ``run_hw_tests.py`` uses this to add latencies to its log.
+"""
+
+from __future__ import annotations
+
+import functools
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+LATENCY_LOG_ENV = "ECAT_LATENCY_LOG"
+
+# Histogram buckets keep the top SUB_BITS + 1 bits of the duration in
+# nanoseconds, i.e. 8 buckets per power of two (<= 12.5 % error).
+SUB_BITS = 3
+_LINEAR = 1 << (SUB_BITS + 1)
+_BUCKETS = 64 << SUB_BITS
+
+
+def _bucket(ns: int) -> int:
+    if ns < _LINEAR:
+        return max(ns, 0)
+    shift = ns.bit_length() - (SUB_BITS + 1)
+    return ((shift + 1) << SUB_BITS) + (ns >> shift) - (1 << SUB_BITS)
+
+
+def _bucket_upper(bucket: int) -> int:
+    if bucket < _LINEAR:
+        return bucket
+    shift = (bucket >> SUB_BITS) - 1
+    mantissa = (bucket & ((1 << SUB_BITS) - 1)) + (1 << SUB_BITS)
+    return ((mantissa + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """Counts, errors and a fixed-size latency histogram for one key."""
+
+    __slots__ = ("count", "errors", "total_ns", "max_ns", "buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.buckets = [0] * _BUCKETS
+
+    def add(self, ns: int, error: bool = False) -> None:
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+        if error:
+            self.errors += 1
+        self.buckets[_bucket(ns)] += 1
+
+    def percentile(self, q: float) -> int:
+        """Upper bound in ns of the bucket holding the ``q`` quantile."""
+        if not self.count:
+            return 0
+        rank = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for bucket, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(_bucket_upper(bucket), self.max_ns)
+        return self.max_ns
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_us": self.total_ns / self.count / 1000.0 if self.count else 0.0,
+            "p50_us": self.percentile(0.50) / 1000.0,
+            "p99_us": self.percentile(0.99) / 1000.0,
+            "max_us": self.max_ns / 1000.0,
+        }
+
+
+class Instruments:
+    """Latency histograms keyed by operation and optional object index."""
+
+    def __init__(self) -> None:
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(operation: str, index: Optional[int] = None) -> str:
+        return operation if index is None else f"{operation}[0x{index:04X}]"
+
+    def record(self, operation: str, ns: int, index: Optional[int] = None, error: bool = False) -> None:
+        """Add one sample to ``operation`` and, if given, to its ``index``."""
+        keys = [operation] if index is None else [operation, self.key(operation, index)]
+        with self._lock:
+            for key in keys:
+                hist = self._histograms.get(key)
+                if hist is None:
+                    hist = self._histograms[key] = LatencyHistogram()
+                hist.add(ns, error)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Return ``{key: summary}`` for every operation recorded so far."""
+        with self._lock:
+            return {key: hist.summary() for key, hist in sorted(self._histograms.items())}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+    def dump(self, label: str = "") -> str:
+        """Format the snapshot as ``key=value`` lines, one per operation."""
+        lines: List[str] = []
+        prefix = f"latency label={label} " if label else "latency "
+        for key, s in self.snapshot().items():
+            lines.append(
+                f"{prefix}op={key} count={s['count']} errors={s['errors']} "
+                f"p50_us={s['p50_us']:.1f} p99_us={s['p99_us']:.1f} "
+                f"max_us={s['max_us']:.1f} mean_us={s['mean_us']:.1f}"
+            )
+        return "\n".join(lines) + ("\n" if lines else "")
+
+
+def from_env() -> Optional[Instruments]:
+    """Return a fresh :class:`Instruments` if ``ECAT_LATENCY_LOG`` is set."""
+    return Instruments() if os.environ.get(LATENCY_LOG_ENV) else None
+
+
+def dump_to_env(instruments: Optional[Instruments], label: str) -> None:
+    """Append ``instruments`` to the ``ECAT_LATENCY_LOG`` file, if set."""
+    path = os.environ.get(LATENCY_LOG_ENV)
+    if instruments is None or not path:
+        return
+    with open(path, "a") as fh:
+        fh.write(instruments.dump(label))
+
+
+def measure(instruments: Optional[Instruments], operation: str, func: Callable, *args):
+    """Call ``func(*args)``, timing it into ``operation`` if instrumented."""
+    if instruments is None:
+        return func(*args)
+    start = time.perf_counter_ns()
+    try:
+        result = func(*args)
+    except Exception:
+        instruments.record(operation, time.perf_counter_ns() - start, error=True)
+        raise
+    instruments.record(operation, time.perf_counter_ns() - start)
+    return result
+
+
+def timed(operation: str, by_index: bool = False):
+    """Decorate a servo method to time it into ``self.instruments``.
+
+    With ``by_index`` the first positional argument is taken as the object
+    index and also recorded separately.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            instruments = self.instruments
+            if instruments is None:
+                return func(self, *args, **kwargs)
+            index = args[0] if by_index and args else None
+            start = time.perf_counter_ns()
+            try:
+                result = func(self, *args, **kwargs)
+            except Exception:
+                instruments.record(operation, time.perf_counter_ns() - start, index, error=True)
+                raise
+            instruments.record(operation, time.perf_counter_ns() - start, index)
+            return result
+
+        return wrapper
+
+    return decorator
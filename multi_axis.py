@@ -0,0 +1,124 @@
+"""Drive several CiA 402 axes from a single EtherCAT master."""
+
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterator, Optional, Sequence
+
+import pysoem
+
+from ethercat_servo import EthercatServo
+from process_data import ProcessDataLoop, ProcessImage, configure_pdo_mapping
+
+
+class Axis(EthercatServo):
+    """Per-slave handle owned by a :class:`MultiAxisMaster`.
+
+    Offers the same API as :class:`EthercatServo`, but the bus, PDO mapping
+    and process-data loop belong to the master, so ``open()`` and
+    ``close()`` do nothing.
+    """
+
+    def __init__(self, owner: "MultiAxisMaster", slave_pos: int, slave, image: ProcessImage) -> None:
+        super().__init__(owner.ifname, slave_pos, owner.cycle_time)
+        self.owner = owner
+        self.master = owner.master
+        self.slave = slave
+        self.process_image = image
+        self.pdo_loop = owner.pdo_loop
+
+    def open(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class MultiAxisMaster:
+    """One EtherCAT master exchanging process data with many drives.
+
+    ``config_init()`` runs once for the whole segment and every axis is
+    mapped into the same process image, so all setpoints and feedback move in
+    a single frame per cycle regardless of the number of drives.
+
+    Parameters
+    ----------
+    ifname : str
+        Network adapter the segment is attached to.
+    slave_positions : sequence of int, optional
+        Bus positions to drive.  Defaults to every slave found.
+    cycle_time : float
+        Process-data period in seconds.
+    master_factory : callable, optional
+        Returns a ``pysoem.Master`` compatible object.  Pass
+        ``lambda: SimulatedMaster(count=N)`` to run against simulators.
+    """
+
+    def __init__(
+        self,
+        ifname: str,
+        slave_positions: Optional[Sequence[int]] = None,
+        cycle_time: float = 0.001,
+        master_factory: Optional[Callable[[], object]] = None,
+    ) -> None:
+        self.ifname = ifname
+        self.slave_positions = list(slave_positions) if slave_positions is not None else None
+        self.cycle_time = cycle_time
+        self.master_factory = master_factory or pysoem.Master
+        self.master = None
+        self.pdo_loop: Optional[ProcessDataLoop] = None
+        self.axes: Dict[int, Axis] = {}
+
+    def open(self) -> None:
+        """Scan the bus once, map every axis and bring the segment to OP."""
+        self.master = self.master_factory()
+        self.master.open(self.ifname)
+        found = self.master.config_init()
+        positions = self.slave_positions
+        if positions is None:
+            positions = list(range(found))
+        if not positions or max(positions) >= found:
+            self.master.close()
+            self.master = None
+            raise RuntimeError("Not enough slaves found")
+        for pos in positions:
+            self.master.slaves[pos].config_func = self._setup_pdo_mapping
+        self.master.config_map()
+
+        self.pdo_loop = ProcessDataLoop(self.master, self.cycle_time)
+        for pos in positions:
+            slave = self.master.slaves[pos]
+            image = ProcessImage()
+            self.pdo_loop.add(slave, image)
+            self.axes[pos] = Axis(self, pos, slave, image)
+        self.pdo_loop.start()
+
+        self.master.state = pysoem.OP_STATE
+        self.master.write_state()
+        self.master.state_check(pysoem.OP_STATE, 50000)
+        if self.master.state != pysoem.OP_STATE:
+            self.close()
+            raise RuntimeError("Unable to enter OP state")
+
+    def close(self) -> None:
+        if self.pdo_loop:
+            self.pdo_loop.stop()
+            self.pdo_loop = None
+        self.axes = {}
+        if self.master:
+            self.master.close()
+            self.master = None
+
+    def _setup_pdo_mapping(self, slave_pos: int) -> None:
+        configure_pdo_mapping(self.master.slaves[slave_pos])
+
+    def axis(self, slave_pos: int) -> Axis:
+        return self.axes[slave_pos]
+
+    def __getitem__(self, slave_pos: int) -> Axis:
+        return self.axes[slave_pos]
+
+    def __iter__(self) -> Iterator[Axis]:
+        return iter(self.axes.values())
+
+    def __len__(self) -> int:
+        return len(self.axes)
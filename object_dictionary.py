@@ -0,0 +1,550 @@
+"""Typed object dictionary compiled from ESI files, plus shared SDO codecs.
+
+Parsing the full ESI description with ElementTree takes a noticeable part of
+the simulator start-up.  The first load streams the file with
+:func:`xml.etree.ElementTree.iterparse`, resolves every object of every
+device to its data type, size and access rights, and stores the result in a
+small binary cache next to the ESI file, keyed by the SHA-256 of its
+contents.  Later loads only hash the ESI and read the cache.
+
+The integer codecs at the top of the module are used by both
+:class:`ethercat_servo.EthercatServo` and the simulator so that values are
+encoded identically on hardware and in simulation.
+
+Run ``python object_dictionary.py --esi JMC_DRIVE_V1.8.xml`` to prebuild the
+cache.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import struct
+import time
+import xml.etree.ElementTree as ET
+from array import array
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Codecs -----------------------------------------------------------------
+
+# (size in bytes, signed) -> precompiled little-endian codec
+INT_CODECS: Dict[Tuple[int, bool], struct.Struct] = {
+    (1, False): struct.Struct("<B"),
+    (1, True): struct.Struct("<b"),
+    (2, False): struct.Struct("<H"),
+    (2, True): struct.Struct("<h"),
+    (4, False): struct.Struct("<I"),
+    (4, True): struct.Struct("<i"),
+    (8, False): struct.Struct("<Q"),
+    (8, True): struct.Struct("<q"),
+}
+
+# ESI data type name -> codec; types missing here are handled as raw bytes.
+TYPE_CODECS: Dict[str, struct.Struct] = {
+    "BOOL": INT_CODECS[(1, False)],
+    "BYTE": INT_CODECS[(1, False)],
+    "SINT": INT_CODECS[(1, True)],
+    "USINT": INT_CODECS[(1, False)],
+    "INT": INT_CODECS[(2, True)],
+    "UINT": INT_CODECS[(2, False)],
+    "WORD": INT_CODECS[(2, False)],
+    "DINT": INT_CODECS[(4, True)],
+    "UDINT": INT_CODECS[(4, False)],
+    "DWORD": INT_CODECS[(4, False)],
+    "LINT": INT_CODECS[(8, True)],
+    "ULINT": INT_CODECS[(8, False)],
+    "REAL": struct.Struct("<f"),
+    "LREAL": struct.Struct("<d"),
+}
+
+SIGNED_TYPES = frozenset({"SINT", "INT", "DINT", "LINT"})
+
+
+def encode_int(val: int, size: int, signed: Optional[bool] = None) -> bytes:
+    """Encode ``val`` as ``size`` little-endian bytes.
+
+    When ``signed`` is ``None`` negative values are written in two's
+    complement and non-negative values as unsigned, so the same call works
+    for signed and unsigned objects.
+    """
+    if signed is None:
+        signed = val < 0
+    codec = INT_CODECS.get((size, signed))
+    if codec is not None:
+        return codec.pack(val)
+    return val.to_bytes(size, byteorder="little", signed=signed)
+
+
+def decode_int(buf: bytes, signed: bool = False) -> int:
+    codec = INT_CODECS.get((len(buf), signed))
+    if codec is not None:
+        return codec.unpack(buf)[0]
+    return int.from_bytes(buf, byteorder="little", signed=signed)
+
+
+# SDO errors -------------------------------------------------------------
+
+ABORT_WRITE_READ_ONLY = 0x06010002
+ABORT_READ_WRITE_ONLY = 0x06010001
+ABORT_NO_OBJECT = 0x06020000
+ABORT_LENGTH_MISMATCH = 0x06070010
+ABORT_NO_SUBINDEX = 0x06090011
+ABORT_WRONG_STATE = 0x08000022
+
+
+class SdoError(RuntimeError):
+    """SDO transfer aborted by the (simulated) drive."""
+
+    def __init__(self, index: int, subindex: int, abort_code: int) -> None:
+        super().__init__(f"SDO abort 0x{abort_code:08X} on 0x{index:04X}:{subindex}")
+        self.index = index
+        self.subindex = subindex
+        self.abort_code = abort_code
+
+
+# Object dictionary ------------------------------------------------------
+
+ACCESS_READ = 0x01
+ACCESS_WRITE = 0x02
+ACCESS_WRITE_PREOP_ONLY = 0x04
+
+# EtherCAT AL state in which PreOP-restricted objects may still be written.
+PREOP_STATE = 0x02
+
+
+class Entry(NamedTuple):
+    """Metadata and default value of one ``(index, subindex)`` entry."""
+
+    index: int
+    subindex: int
+    name: str
+    data_type: str
+    bit_size: int
+    access: int
+    default: bytes
+
+    @property
+    def size(self) -> int:
+        return max(1, (self.bit_size + 7) // 8)
+
+    @property
+    def signed(self) -> bool:
+        return self.data_type in SIGNED_TYPES
+
+    @property
+    def writable(self) -> bool:
+        return bool(self.access & ACCESS_WRITE)
+
+
+class ObjectDictionary:
+    """Array-backed object dictionary holding raw little-endian bytes.
+
+    All values live in one ``bytearray``; each entry owns a fixed slice of
+    it.  :meth:`read` and :meth:`write` behave like SDO uploads and
+    downloads (access rights, sizes and abort codes), while item access
+    decodes values with the entry's codec and skips the access checks so
+    the simulated drive can update its own read-only objects.
+    """
+
+    def __init__(self, entries: Iterable[Entry]) -> None:
+        self.entries: List[Entry] = list(entries)
+        self._slots: Dict[Tuple[int, int], int] = {}
+        self._offsets = array("I")
+        self._sizes = array("H")
+        self._access = array("B")
+        self._codecs: List[Optional[struct.Struct]] = []
+        self._subindices: Dict[int, List[int]] = {}
+        offset = 0
+        for slot, entry in enumerate(self.entries):
+            self._slots[(entry.index, entry.subindex)] = slot
+            self._subindices.setdefault(entry.index, []).append(entry.subindex)
+            self._offsets.append(offset)
+            self._sizes.append(entry.size)
+            self._access.append(entry.access)
+            codec = TYPE_CODECS.get(entry.data_type)
+            self._codecs.append(codec if codec is not None and codec.size == entry.size else None)
+            offset += entry.size
+        self.data = bytearray(offset)
+        self.reset()
+
+    def reset(self) -> None:
+        """Restore every entry to its ESI default."""
+        for slot, entry in enumerate(self.entries):
+            size = self._sizes[slot]
+            start = self._offsets[slot]
+            self.data[start:start + size] = entry.default[:size].ljust(size, b"\x00")
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: Tuple[int, int]) -> bool:
+        return key in self._slots
+
+    def _slot(self, idx: int, subidx: int) -> int:
+        slot = self._slots.get((idx, subidx))
+        if slot is None:
+            if idx in self._subindices:
+                raise SdoError(idx, subidx, ABORT_NO_SUBINDEX)
+            raise SdoError(idx, subidx, ABORT_NO_OBJECT)
+        return slot
+
+    def subindices(self, idx: int) -> List[int]:
+        if idx not in self._subindices:
+            raise SdoError(idx, 0, ABORT_NO_OBJECT)
+        return sorted(self._subindices[idx])
+
+    def entry(self, idx: int, subidx: int) -> Entry:
+        return self.entries[self._slot(idx, subidx)]
+
+    def read(self, idx: int, subidx: int) -> bytes:
+        """SDO upload: return the raw bytes of an entry."""
+        slot = self._readable_slot(idx, subidx)
+        start = self._offsets[slot]
+        return bytes(self.data[start:start + self._sizes[slot]])
+
+    def read_complete(self, idx: int, subidx: int = 1) -> bytes:
+        """Complete-access upload: all entries from ``subidx`` on, packed."""
+        return b"".join(self.read(idx, sub) for sub in self.subindices(idx) if sub >= subidx)
+
+    def write(self, idx: int, subidx: int, buf: bytes, state: int = 0) -> None:
+        """SDO download: store ``buf`` after the checks a drive performs.
+
+        ``state`` is the slave's AL state, used for objects that may only be
+        written in PRE-OP (such as the PDO mapping); ``0`` skips that check.
+        """
+        slot = self._writable_slot(idx, subidx, len(buf), state)
+        start = self._offsets[slot]
+        self.data[start:start + len(buf)] = buf
+
+    def _readable_slot(self, idx: int, subidx: int) -> int:
+        slot = self._slot(idx, subidx)
+        if not self._access[slot] & ACCESS_READ:
+            raise SdoError(idx, subidx, ABORT_READ_WRITE_ONLY)
+        return slot
+
+    def _writable_slot(self, idx: int, subidx: int, size: int, state: int) -> int:
+        slot = self._slot(idx, subidx)
+        access = self._access[slot]
+        if not access & ACCESS_WRITE:
+            raise SdoError(idx, subidx, ABORT_WRITE_READ_ONLY)
+        if access & ACCESS_WRITE_PREOP_ONLY and state and state != PREOP_STATE:
+            raise SdoError(idx, subidx, ABORT_WRONG_STATE)
+        if size != self._sizes[slot]:
+            raise SdoError(idx, subidx, ABORT_LENGTH_MISMATCH)
+        return slot
+
+    def raw(self, idx: int, subidx: int) -> memoryview:
+        """Writable view of an entry's bytes, bypassing all checks."""
+        slot = self._slots[(idx, subidx)]
+        start = self._offsets[slot]
+        return memoryview(self.data)[start:start + self._sizes[slot]]
+
+    def __getitem__(self, key: Tuple[int, int]):
+        slot = self._slots[key]
+        start = self._offsets[slot]
+        codec = self._codecs[slot]
+        if codec is not None:
+            return codec.unpack_from(self.data, start)[0]
+        return bytes(self.data[start:start + self._sizes[slot]])
+
+    def __setitem__(self, key: Tuple[int, int], val) -> None:
+        slot = self._slots[key]
+        start = self._offsets[slot]
+        codec = self._codecs[slot]
+        if codec is not None:
+            if codec.format[-1] in "BHIQ":
+                val &= (1 << (8 * codec.size)) - 1
+            codec.pack_into(self.data, start, val)
+        else:
+            size = self._sizes[slot]
+            self.data[start:start + size] = bytes(val)[:size].ljust(size, b"\x00")
+
+    def get(self, key: Tuple[int, int], default=None):
+        if key not in self._slots:
+            return default
+        return self[key]
+
+
+# ESI parsing ------------------------------------------------------------
+
+CACHE_SUFFIX = ".odcache"
+CACHE_MAGIC = b"ODC3"
+
+_HEADER = struct.Struct("<4s32sI")  # magic, sha256 of the ESI, device count
+_DEVICE = struct.Struct("<IIHI")  # product code, revision, name length, entry count
+_ENTRY = struct.Struct("<HBHHHHB")  # index, subindex, type/name/default length, bits, access
+
+# product code -> (revision, device name, entries)
+Devices = Dict[int, Tuple[int, str, List[Entry]]]
+
+
+def _hex(txt: Optional[str]) -> int:
+    return int(txt.replace("#x", ""), 16) if txt else 0
+
+
+def _access(flags: Optional[ET.Element], inherited: int = ACCESS_READ | ACCESS_WRITE) -> int:
+    node = flags.find("Access") if flags is not None else None
+    if node is None or not node.text:
+        return inherited
+    access = 0
+    if "r" in node.text:
+        access |= ACCESS_READ
+    if "w" in node.text:
+        access |= ACCESS_WRITE
+    if node.get("WriteRestrictions") == "PreOP":
+        access |= ACCESS_WRITE_PREOP_ONLY
+    return access
+
+
+class _DataType(NamedTuple):
+    bit_size: int
+    base_type: Optional[str]
+    lbound: int
+    elements: int
+    sub_items: List[Tuple[Optional[int], str, str, int, Optional[ET.Element]]]
+
+
+def _parse_data_type(elem: ET.Element) -> _DataType:
+    sub_items = []
+    for sub in elem.findall("SubItem"):
+        sub_idx = sub.findtext("SubIdx")
+        sub_items.append((
+            int(sub_idx) if sub_idx is not None else None,
+            sub.findtext("Name") or "",
+            sub.findtext("Type") or "",
+            int(sub.findtext("BitSize") or 0),
+            sub.find("Flags"),
+        ))
+    return _DataType(
+        bit_size=int(elem.findtext("BitSize") or 0),
+        base_type=elem.findtext("BaseType"),
+        lbound=int(elem.findtext("ArrayInfo/LBound") or 1),
+        elements=int(elem.findtext("ArrayInfo/Elements") or 0),
+        sub_items=sub_items,
+    )
+
+
+def _flatten(data_types: Dict[str, _DataType], obj_access: int, dt: _DataType):
+    """Yield ``(subindex, name, type, bits, access)`` for a record type."""
+    for sub_idx, name, type_name, bits, flags in dt.sub_items:
+        access = _access(flags, obj_access)
+        arr = data_types.get(type_name)
+        if arr is not None and arr.base_type and arr.elements:
+            base_bits = arr.bit_size // arr.elements
+            for n in range(arr.elements):
+                yield arr.lbound + n, f"{name}[{n}]", arr.base_type, base_bits, access
+        else:
+            yield sub_idx, name, type_name, bits, access
+
+
+def _parse_object(elem: ET.Element, data_types: Dict[str, _DataType]) -> List[Entry]:
+    idx = _hex(elem.findtext("Index"))
+    name = elem.findtext("Name") or ""
+    type_name = elem.findtext("Type") or ""
+    bits = int(elem.findtext("BitSize") or 0)
+    access = _access(elem.find("Flags"))
+    info_subs = elem.findall("Info/SubItem")
+    dt = data_types.get(type_name)
+
+    if not info_subs and (dt is None or not dt.sub_items):
+        default = bytes.fromhex(elem.findtext("Info/DefaultData") or "")
+        return [Entry(idx, 0, name, type_name, bits, access, default)]
+
+    layout = list(_flatten(data_types, access, dt)) if dt is not None else []
+    entries = []
+    for pos in range(max(len(layout), len(info_subs))):
+        if pos < len(layout):
+            sub_idx, sub_name, sub_type, sub_bits, sub_access = layout[pos]
+            if sub_idx is None:
+                sub_idx = pos
+        else:
+            # Undeclared sub item: infer the width from its default data.
+            sub_idx, sub_name, sub_type, sub_access = pos, "", "", access
+            sub_bits = 0
+        default = b""
+        if pos < len(info_subs):
+            default = bytes.fromhex(info_subs[pos].findtext("Info/DefaultData") or "")
+            sub_name = info_subs[pos].findtext("Name") or sub_name
+        if not sub_bits:
+            sub_bits = 8 * len(default)
+            sub_type = {8: "USINT", 16: "UINT", 32: "UDINT"}.get(sub_bits, sub_type)
+        entries.append(Entry(idx, sub_idx, sub_name, sub_type, sub_bits, sub_access, default))
+    return entries
+
+
+def parse_esi(esi_path: str) -> Devices:
+    """Stream ``esi_path`` and return the typed dictionary of every device."""
+    devices: Devices = {}
+    data_types: Dict[str, _DataType] = {}
+    entries: List[Entry] = []
+    for _, elem in ET.iterparse(esi_path, events=("end",)):
+        tag = elem.tag
+        if tag == "DataType":
+            data_types[elem.findtext("Name") or ""] = _parse_data_type(elem)
+            elem.clear()
+        elif tag == "Object":
+            if elem.findtext("Index"):
+                entries.extend(_parse_object(elem, data_types))
+            elem.clear()
+        elif tag in ("RxPdo", "TxPdo"):
+            elem.clear()
+        elif tag == "Device":
+            type_elem = elem.find("Type")
+            if type_elem is not None:
+                devices[_hex(type_elem.get("ProductCode"))] = (
+                    _hex(type_elem.get("RevisionNo")),
+                    (type_elem.text or "").strip(),
+                    entries,
+                )
+            data_types = {}
+            entries = []
+            elem.clear()
+    return devices
+
+
+def esi_digest(esi_path: str) -> bytes:
+    with open(esi_path, "rb") as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+def cache_path(esi_path: str) -> str:
+    return esi_path + CACHE_SUFFIX
+
+
+def write_cache(path: str, digest: bytes, devices: Devices) -> None:
+    parts = [_HEADER.pack(CACHE_MAGIC, digest, len(devices))]
+    for product, (revision, dev_name, entries) in devices.items():
+        dev_name_b = dev_name.encode()
+        parts.append(_DEVICE.pack(product, revision, len(dev_name_b), len(entries)))
+        parts.append(dev_name_b)
+        for e in entries:
+            type_b = e.data_type.encode()
+            name_b = e.name.encode()
+            parts.append(_ENTRY.pack(e.index, e.subindex, len(type_b), len(name_b),
+                                     len(e.default), e.bit_size, e.access))
+            parts.append(type_b + name_b + e.default)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(b"".join(parts))
+    os.replace(tmp, path)
+
+
+def read_cache(path: str, digest: bytes) -> Optional[Devices]:
+    """Return the cached devices, or ``None`` if missing or stale."""
+    try:
+        with open(path, "rb") as f:
+            buf = f.read()
+    except OSError:
+        return None
+    if len(buf) < _HEADER.size:
+        return None
+    magic, cached_digest, count = _HEADER.unpack_from(buf)
+    if magic != CACHE_MAGIC or cached_digest != digest:
+        return None
+    devices: Devices = {}
+    offset = _HEADER.size
+    unpack_entry = _ENTRY.unpack_from
+    try:
+        for _ in range(count):
+            product, revision, name_len, n_entries = _DEVICE.unpack_from(buf, offset)
+            offset += _DEVICE.size
+            dev_name = buf[offset:offset + name_len].decode()
+            offset += name_len
+            entries = []
+            for _ in range(n_entries):
+                idx, sub, type_len, name_len, default_len, bits, access = unpack_entry(buf, offset)
+                offset += _ENTRY.size
+                type_end = offset + type_len
+                name_end = type_end + name_len
+                end = name_end + default_len
+                entries.append(Entry(idx, sub, buf[type_end:name_end].decode(),
+                                     buf[offset:type_end].decode(), bits, access,
+                                     buf[name_end:end]))
+                offset = end
+            devices[product] = (revision, dev_name, entries)
+    except (struct.error, UnicodeDecodeError):
+        return None
+    return devices
+
+
+# (path, mtime, size) -> devices already loaded by this process
+_loaded: Dict[Tuple[str, int, int], Devices] = {}
+
+
+def load_devices(esi_path: str, use_cache: bool = True) -> Devices:
+    """Return the typed dictionaries of ``esi_path``, using the cache if valid.
+
+    Results are also kept in memory, so opening many simulators in one
+    process only reads the cache once.
+    """
+    if not use_cache:
+        return parse_esi(esi_path)
+    st = os.stat(esi_path)
+    key = (os.path.abspath(esi_path), st.st_mtime_ns, st.st_size)
+    devices = _loaded.get(key)
+    if devices is None:
+        devices = _loaded[key] = load_cached_devices(esi_path)
+    return devices
+
+
+def load_cached_devices(esi_path: str) -> Devices:
+    """Read ``esi_path`` through the on-disk cache, rebuilding it if stale.
+
+    Unlike :func:`load_devices` this bypasses the in-memory copy, so each
+    call reads the cache file.
+    """
+    digest = esi_digest(esi_path)
+    path = cache_path(esi_path)
+    devices = read_cache(path, digest)
+    if devices is None:
+        devices = parse_esi(esi_path)
+        try:
+            write_cache(path, digest, devices)
+        except (OSError, struct.error):
+            pass  # read-only checkout or oversized entry: work without a cache
+    return devices
+
+
+def load_dictionary(esi_path: str, product_code: Optional[int] = None) -> ObjectDictionary:
+    """Build the :class:`ObjectDictionary` of one device in ``esi_path``.
+
+    Without ``product_code`` the last device of the file is used.
+    """
+    devices = load_devices(esi_path)
+    if not devices:
+        raise RuntimeError(f"No devices found in {esi_path}")
+    if product_code is None:
+        product_code = list(devices)[-1]
+    if product_code not in devices:
+        raise RuntimeError(f"Product code 0x{product_code:08X} not found in {esi_path}")
+    return ObjectDictionary(devices[product_code][2])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Prebuild the ESI object-dictionary cache")
+    parser.add_argument("--esi", default="JMC_DRIVE_V1.8.xml", help="ESI file to compile")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    ET.parse(args.esi)
+    dom = time.perf_counter() - start
+
+    start = time.perf_counter()
+    devices = parse_esi(args.esi)
+    stream = time.perf_counter() - start
+    write_cache(cache_path(args.esi), esi_digest(args.esi), devices)
+
+    start = time.perf_counter()
+    load_devices(args.esi)
+    cached = time.perf_counter() - start
+
+    total = sum(len(entries) for _, _, entries in devices.values())
+    print(f"Wrote {cache_path(args.esi)} ({len(devices)} devices, {total} entries)")
+    print(f"ET.parse:  {dom * 1000:8.1f} ms")
+    print(f"iterparse: {stream * 1000:8.1f} ms")
+    print(f"cached:    {cached * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""Diff-based download of drive parameter sets.
+
+A :class:`ParameterSet` holds values for writable objects of the drive's
+:class:`~object_dictionary.ObjectDictionary`, loaded from a JSON file::
+
+    {"0x6081:0": 200000, "0x6083": 1000000, "0x2001:3": -5}
+
+or taken from the ESI defaults.  :func:`download` reads the current values
+in one ``read_sdo_many`` call, compares them and writes only the entries
+that differ with one ``write_sdo_many`` call, so re-commissioning a drive
+that is already configured costs a single batched read.
+
+:class:`ObjectCache` sits in between: constant objects (identity 0x1018,
+device type, name and versions) are read once per drive, and values read
+or written through it are remembered until a failed write or
+:meth:`ObjectCache.invalidate` drops them.
+
+Run ``python parameters.py params.json --backend sim`` to download a file,
+or ``--save FILE`` to store the drive's current values.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from object_dictionary import (
+    ACCESS_WRITE_PREOP_ONLY,
+    TYPE_CODECS,
+    Entry,
+    ObjectDictionary,
+    decode_int,
+    load_dictionary,
+)
+
+Key = Tuple[int, int]
+
+IDENTITY_OBJECT = 0x1018
+PRODUCT_CODE = (IDENTITY_OBJECT, 2)
+# Setpoints and commands: writable, but never part of a parameter set.
+COMMAND_OBJECTS = frozenset({
+    0x6040, 0x6060, 0x6071, 0x607A, 0x60B0, 0x60B1, 0x60B2, 0x60B8, 0x60FE, 0x60FF,
+})
+# Read-only communication objects that change while the drive runs.
+VOLATILE_OBJECTS = frozenset({0x1001, 0x1003})
+
+
+def is_integer(entry: Entry) -> bool:
+    codec = TYPE_CODECS.get(entry.data_type)
+    return codec is not None and codec.format[-1] not in "fd" and codec.size == entry.size
+
+
+def is_constant(entry: Entry) -> bool:
+    """Read-only identity and version objects that never change at run time."""
+    return (
+        not entry.writable
+        and 0x1000 <= entry.index < 0x1C00
+        and entry.index not in VOLATILE_OBJECTS
+        and is_integer(entry)
+    )
+
+
+def parse_key(text: str) -> Key:
+    """``"0x6083:0"`` or ``"0x6083"`` -> ``(0x6083, 0)``."""
+    idx, _, sub = text.partition(":")
+    return int(idx, 16), int(sub or "0", 0)
+
+
+def format_key(key: Key) -> str:
+    return f"0x{key[0]:04X}:{key[1]}"
+
+
+class ParameterSet:
+    """Validated ``(index, subindex) -> value`` assignments for one drive type.
+
+    Raises
+    ------
+    RuntimeError
+        Listing every entry that does not exist, is not writable, is not an
+        integer or whose value does not fit the object.
+    """
+
+    def __init__(self, dictionary: ObjectDictionary, values: Dict[Key, int]) -> None:
+        problems = []
+        for key, value in values.items():
+            if key not in dictionary:
+                problems.append(f"{format_key(key)}: no such object")
+                continue
+            entry = dictionary.entry(*key)
+            if not entry.writable:
+                problems.append(f"{format_key(key)} ({entry.name}): read-only")
+            elif not is_integer(entry):
+                problems.append(f"{format_key(key)} ({entry.name}): unsupported type {entry.data_type}")
+            else:
+                bits = entry.size * 8
+                lo, hi = (-(1 << bits - 1), (1 << bits - 1) - 1) if entry.signed else (0, (1 << bits) - 1)
+                if not isinstance(value, int) or not lo <= value <= hi:
+                    problems.append(f"{format_key(key)} ({entry.name}): {value!r} outside {lo}..{hi}")
+        if problems:
+            raise RuntimeError("Invalid parameter set:\n  " + "\n  ".join(problems))
+        self.dictionary = dictionary
+        self.values = dict(values)
+
+    @classmethod
+    def from_file(cls, path: str, dictionary: ObjectDictionary) -> "ParameterSet":
+        with open(path) as f:
+            raw = json.load(f)
+        return cls(dictionary, {parse_key(k): v for k, v in raw.items()})
+
+    @classmethod
+    def from_defaults(cls, dictionary: ObjectDictionary) -> "ParameterSet":
+        """ESI defaults of every writable integer parameter.
+
+        The communication area (PDO mapping, sync managers), subindex 0 of
+        arrays and records, and :data:`COMMAND_OBJECTS` are left out.
+        """
+        values = {}
+        for entry in dictionary.entries:
+            if (entry.index < 0x2000 or entry.index in COMMAND_OBJECTS or not entry.writable
+                    or not is_integer(entry) or entry.access & ACCESS_WRITE_PREOP_ONLY):
+                continue
+            if entry.subindex == 0 and len(dictionary.subindices(entry.index)) > 1:
+                continue
+            default = entry.default[:entry.size].ljust(entry.size, b"\x00")
+            values[(entry.index, entry.subindex)] = decode_int(default, entry.signed)
+        return cls(dictionary, values)
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump({format_key(k): v for k, v in sorted(self.values.items())}, f, indent=2)
+            f.write("\n")
+
+    def request(self, key: Key) -> Tuple[int, int, int, bool]:
+        entry = self.dictionary.entry(*key)
+        return (key[0], key[1], entry.size, entry.signed)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class ObjectCache:
+    """Read-through cache of one drive's objects.
+
+    Constant objects are kept for the lifetime of the cache.  Other values
+    are kept once read or written but can be refreshed with ``fresh=True``.
+    A failed batched write invalidates every entry of the batch, since the
+    drive may have accepted part of it.
+    """
+
+    def __init__(self, servo, dictionary: Optional[ObjectDictionary] = None) -> None:
+        self.servo = servo
+        self.dictionary = dictionary
+        self.values: Dict[Key, int] = {}
+        self.reads = 0
+
+    def _constant(self, key: Key) -> bool:
+        return self.dictionary is not None and key in self.dictionary and \
+            is_constant(self.dictionary.entry(*key))
+
+    def read_many(self, requests: Iterable[Tuple[int, int, int, bool]], fresh: bool = False) -> Dict[Key, int]:
+        """Values of ``requests``; missing or non-constant (with ``fresh``) ones are read in one batch."""
+        requests = list(requests)
+        missing = [
+            req for req in requests
+            if (req[0], req[1]) not in self.values or (fresh and not self._constant((req[0], req[1])))
+        ]
+        if missing:
+            self.reads += 1
+            snapshot = self.servo.read_sdo_many(missing)
+            for req in missing:
+                self.values.pop((req[0], req[1]), None)
+            self.values.update(snapshot)
+            if snapshot.errors:
+                key, exc = next(iter(snapshot.errors.items()))
+                raise RuntimeError(f"Reading {format_key(key)} failed: {exc}") from exc
+        return {(req[0], req[1]): self.values[(req[0], req[1])] for req in requests}
+
+    def read(self, idx: int, subidx: int, size: int = 4, signed: bool = False) -> int:
+        return self.read_many([(idx, subidx, size, signed)])[(idx, subidx)]
+
+    def write_many(self, entries: List[Tuple[int, int, int, int]]) -> None:
+        """Write ``(index, subindex, value, size)`` entries in one batch."""
+        try:
+            self.servo.write_sdo_many(entries)
+        except Exception:
+            self.invalidate(entry[:2] for entry in entries)
+            raise
+        for idx, sub, val, _ in entries:
+            self.values[(idx, sub)] = val
+
+    def invalidate(self, keys: Optional[Iterable[Key]] = None) -> None:
+        """Forget ``keys``, or every cached value including constants."""
+        if keys is None:
+            self.values.clear()
+            return
+        for key in keys:
+            self.values.pop(tuple(key), None)
+
+
+class DownloadResult(NamedTuple):
+    written: List[Key]
+    unchanged: List[Key]
+
+
+def download(servo, params: ParameterSet, cache: Optional[ObjectCache] = None,
+             fresh: bool = True, dry_run: bool = False) -> DownloadResult:
+    """Write the entries of ``params`` that differ from the drive.
+
+    ``fresh=False`` trusts values already in ``cache`` (for instance from a
+    download earlier in the same session) instead of reading them again.
+    """
+    cache = cache if cache is not None else ObjectCache(servo, params.dictionary)
+    current = cache.read_many((params.request(k) for k in params.values), fresh=fresh)
+    written = [k for k, v in params.values.items() if current[k] != v]
+    unchanged = [k for k in params.values if k not in written]
+    if written and not dry_run:
+        cache.write_many([(k[0], k[1], params.values[k], params.request(k)[2]) for k in written])
+    return DownloadResult(written, unchanged)
+
+
+def drive_dictionary(cache: ObjectCache, esi_path: str) -> ObjectDictionary:
+    """Object dictionary of the connected drive, chosen by its product code."""
+    product = cache.read(*PRODUCT_CODE, size=4)
+    cache.dictionary = load_dictionary(esi_path, product)
+    return cache.dictionary
+
+
+def main(argv=None) -> int:
+    from demo import ENV_IFNAME, import_backend
+
+    parser = argparse.ArgumentParser(description="Download a parameter set to a drive")
+    parser.add_argument("file", nargs="?", help="JSON parameter file (default: ESI defaults)")
+    parser.add_argument("--esi", default="JMC_DRIVE_V1.8.xml")
+    parser.add_argument("--backend", choices=["hw", "sim", "remote"], default="hw")
+    parser.add_argument("--ifname", default=None)
+    parser.add_argument("--slave", type=int, default=0)
+    parser.add_argument("--dry-run", action="store_true", help="only list the entries that differ")
+    parser.add_argument("--save", metavar="FILE", help="write the drive's current values of the set to FILE")
+    args = parser.parse_args(argv)
+
+    servo_cls, get_adapter_name = import_backend(args.backend)
+    ifname = args.ifname or (os.environ.get(ENV_IFNAME) if args.backend != "remote" else None)
+    servo = servo_cls(ifname=ifname or get_adapter_name(), slave_pos=args.slave)
+    servo.open()
+    try:
+        cache = ObjectCache(servo)
+        dictionary = drive_dictionary(cache, args.esi)
+        params = (ParameterSet.from_file(args.file, dictionary) if args.file
+                  else ParameterSet.from_defaults(dictionary))
+        if args.save:
+            current = cache.read_many(params.request(k) for k in params.values)
+            ParameterSet(dictionary, current).save(args.save)
+            print(f"Saved {len(current)} values to {args.save}")
+            return 0
+        result = download(servo, params, cache, dry_run=args.dry_run)
+    finally:
+        servo.close()
+    for key in result.written:
+        entry = dictionary.entry(*key)
+        print(f"{'differs' if args.dry_run else 'wrote'} {format_key(key)} {entry.name} = {params.values[key]}")
+    print(f"{len(result.written)} written, {len(result.unchanged)} unchanged")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
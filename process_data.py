@@ -0,0 +1,207 @@
+"""Cyclic process-data exchange for CiA 402 drives.
+
+The layout below is written into the drive's PDO assignment objects before
+``config_map()`` so that the controlword, setpoints, statusword and feedback
+travel in every EtherCAT frame instead of through the SDO mailbox.
+"""
+
+from __future__ import annotations
+
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# (index, subindex, struct format) in the order they appear in the PDO.
+RXPDO_ENTRIES: Tuple[Tuple[int, int, str], ...] = (
+    (0x6040, 0, "H"),  # controlword
+    (0x6060, 0, "b"),  # mode of operation
+    (0x607A, 0, "i"),  # target position
+    (0x60FF, 0, "i"),  # target velocity
+)
+TXPDO_ENTRIES: Tuple[Tuple[int, int, str], ...] = (
+    (0x6041, 0, "H"),  # statusword
+    (0x6061, 0, "b"),  # mode of operation display
+    (0x6064, 0, "i"),  # actual position
+    (0x606C, 0, "i"),  # actual velocity
+)
+
+RXPDO_INDEX = 0x1600
+TXPDO_INDEX = 0x1A00
+SM_OUTPUT_ASSIGN = 0x1C12
+SM_INPUT_ASSIGN = 0x1C13
+
+
+def _layout(entries: Sequence[Tuple[int, int, str]]) -> struct.Struct:
+    return struct.Struct("<" + "".join(fmt for _, _, fmt in entries))
+
+
+RX_STRUCT = _layout(RXPDO_ENTRIES)
+TX_STRUCT = _layout(TXPDO_ENTRIES)
+
+
+def mapping_words(entries: Sequence[Tuple[int, int, str]]) -> List[int]:
+    """Return the 32-bit PDO mapping words (index, subindex, bit length)."""
+    return [
+        (idx << 16) | (sub << 8) | (struct.calcsize(fmt) * 8)
+        for idx, sub, fmt in entries
+    ]
+
+
+def configure_pdo_mapping(slave) -> None:
+    """Write :data:`RXPDO_ENTRIES`/:data:`TXPDO_ENTRIES` into ``slave``.
+
+    Must run in PRE-OP, i.e. from the slave's ``config_func`` hook which
+    ``config_map()`` calls before the process image is laid out.
+    """
+    for assign, pdo, entries in (
+        (SM_OUTPUT_ASSIGN, RXPDO_INDEX, RXPDO_ENTRIES),
+        (SM_INPUT_ASSIGN, TXPDO_INDEX, TXPDO_ENTRIES),
+    ):
+        slave.sdo_write(assign, 0, b"\x00")
+        slave.sdo_write(pdo, 0, b"\x00")
+        words = mapping_words(entries)
+        for sub, word in enumerate(words, start=1):
+            slave.sdo_write(pdo, sub, word.to_bytes(4, "little"))
+        slave.sdo_write(pdo, 0, bytes([len(words)]))
+        slave.sdo_write(assign, 1, pdo.to_bytes(2, "little"))
+        slave.sdo_write(assign, 0, b"\x01")
+
+
+class ProcessImage:
+    """Outputs and inputs of one slave, keyed by ``(index, subindex)``."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._rx_keys = [(idx, sub) for idx, sub, _ in RXPDO_ENTRIES]
+        self._tx_keys = [(idx, sub) for idx, sub, _ in TXPDO_ENTRIES]
+        self._outputs: Dict[Tuple[int, int], int] = dict.fromkeys(self._rx_keys, 0)
+        self._inputs: Dict[Tuple[int, int], int] = dict.fromkeys(self._tx_keys, 0)
+
+    def has_output(self, idx: int, subidx: int) -> bool:
+        return (idx, subidx) in self._outputs
+
+    def has_input(self, idx: int, subidx: int) -> bool:
+        return (idx, subidx) in self._inputs
+
+    def set_output(self, idx: int, subidx: int, val: int) -> None:
+        with self._lock:
+            self._outputs[(idx, subidx)] = val
+
+    def get_output(self, idx: int, subidx: int) -> int:
+        with self._lock:
+            return self._outputs[(idx, subidx)]
+
+    def get_input(self, idx: int, subidx: int) -> int:
+        with self._lock:
+            return self._inputs[(idx, subidx)]
+
+    def pack_outputs(self) -> bytes:
+        with self._lock:
+            return RX_STRUCT.pack(*(self._outputs[k] for k in self._rx_keys))
+
+    def unpack_inputs(self, buf: bytes) -> None:
+        if len(buf) < TX_STRUCT.size:
+            return
+        values = TX_STRUCT.unpack_from(buf)
+        with self._lock:
+            self._inputs.update(zip(self._tx_keys, values))
+
+
+class ProcessDataLoop:
+    """Background thread exchanging process data with a master every period.
+
+    Each registered ``(slave, image)`` pair has its outputs copied into the
+    frame before ``send_processdata()`` and its inputs refreshed after
+    ``receive_processdata()``, so all slaves share one frame per cycle.
+
+    An exception raised by an exchange does not stop the thread: it is
+    counted in ``errors`` and kept in ``error`` until the next exchange
+    succeeds, and ``wkc`` drops to 0 so a watchdog sees the link as down.
+    """
+
+    def __init__(self, master, period: float = 0.001, timeout_us: int = 2000) -> None:
+        self.master = master
+        self.period = period
+        self.timeout_us = timeout_us
+        self.images: List[Tuple[object, ProcessImage]] = []
+        self.cycles = 0
+        self.overruns = 0
+        self.wkc = 0
+        self.errors = 0
+        # Exception of the last exchange, None once one succeeds again.
+        self.error: Optional[Exception] = None
+        # Optional instrumentation.Instruments timing each exchange.
+        self.instruments = None
+        self._stop = threading.Event()
+        self._cycle_done = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, slave, image: ProcessImage) -> None:
+        self.images.append((slave, image))
+
+    def exchange(self) -> int:
+        """Run a single send/receive cycle and return the working counter."""
+        for slave, image in self.images:
+            slave.output = image.pack_outputs()
+        self.master.send_processdata()
+        self.wkc = self.master.receive_processdata(self.timeout_us)
+        for slave, image in self.images:
+            image.unpack_inputs(slave.input)
+        with self._cycle_done:
+            self.cycles += 1
+            self.error = None
+            self._cycle_done.notify_all()
+        return self.wkc
+
+    def wait_cycles(self, count: int = 1, timeout: float = 1.0) -> bool:
+        """Block until ``count`` more cycles have completed.
+
+        Returns ``False`` on timeout and as soon as an exchange fails.
+        """
+        with self._cycle_done:
+            target = self.cycles + count
+            errors = self.errors
+            self._cycle_done.wait_for(lambda: self.cycles >= target or self.errors > errors,
+                                      timeout)
+            return self.cycles >= target
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ecat-pdo", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        deadline = time.perf_counter()
+        while not self._stop.is_set():
+            instruments = self.instruments
+            try:
+                if instruments is None:
+                    self.exchange()
+                else:
+                    start = time.perf_counter_ns()
+                    self.exchange()
+                    instruments.record("pdo_exchange", time.perf_counter_ns() - start)
+            except Exception as exc:
+                # Keep cycling: the link may come back (see watchdog.py).
+                with self._cycle_done:
+                    self.wkc = 0
+                    self.errors += 1
+                    self.error = exc
+                    self._cycle_done.notify_all()
+            deadline += self.period
+            remaining = deadline - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+            else:
+                # Missed the slot; resynchronise instead of bursting.
+                self.overruns += 1
+                deadline = time.perf_counter()
@@ -0,0 +1,403 @@
+"""Record and replay the bus traffic of :class:`ethercat_servo.EthercatServo`.
+
+:class:`RecordingMaster` wraps a ``pysoem.Master`` (or any look-alike) and
+appends every SDO upload/download, every process-data frame and the bus
+scan to a binary log, together with the bytes exchanged, the result and a
+timestamp.  Set ``ECAT_TRAFFIC_LOG=FILE`` to record every ``EthercatServo``
+opened by a process (``demo.py``, ``DeviceController``, the hardware tests).
+
+:class:`ReplayMaster` serves such a log back to an unmodified
+``EthercatServo``: reads return the recorded bytes, recorded aborts are
+raised again, and writes and process-data outputs are compared with the
+recorded command stream.  Differences are collected in ``divergences`` (or
+raise :class:`ReplayDivergence` with ``strict=True``).  Time follows the
+recorded timestamps on a :class:`clock.VirtualClock`, so a replay runs as
+fast as the Python code allows.  Use ``--backend replay --ifname FILE``
+with ``demo.py`` or ``ECAT_REPLAY=FILE`` with ``DeviceController``.
+
+Log layout: an 8-byte magic followed by records of :data:`RECORD` (kind,
+slave, time, index, subindex, status, length) and ``length`` data bytes.
+Records are only ever appended, and a truncated last record is ignored, so
+the log of a run that crashed can still be replayed up to the crash.
+"""
+
+from __future__ import annotations
+
+import os
+import struct
+import threading
+import time
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Tuple
+
+from clock import VirtualClock
+from object_dictionary import SdoError
+
+TRAFFIC_LOG_ENV = "ECAT_TRAFFIC_LOG"
+REPLAY_ENV = "ECAT_REPLAY"
+MAGIC = b"ECTRAF\x01\x00"
+# kind, slave, seconds since the log was opened, index, subindex, status, length
+RECORD = struct.Struct("<BHdHBBH")
+
+SDO_READ = 1
+SDO_WRITE = 2
+PDO_OUT = 3
+PDO_IN = 4  # ``index`` holds the working counter
+SCAN = 5  # ``index`` holds the slave count
+COMPLETE_ACCESS = 0x80  # flag on SDO kinds
+
+STATUS_OK = 0
+STATUS_ABORT = 1  # data: abort code, u32
+STATUS_ERROR = 2  # data: message
+ABORT_CODE = struct.Struct("<I")
+
+
+class Transaction(NamedTuple):
+    kind: int
+    slave: int
+    time: float
+    index: int
+    subindex: int
+    status: int
+    data: bytes
+
+    def describe(self) -> str:
+        names = {SDO_READ: "read", SDO_WRITE: "write", PDO_OUT: "pdo out", PDO_IN: "pdo in", SCAN: "scan"}
+        name = names.get(self.kind & ~COMPLETE_ACCESS, str(self.kind))
+        return f"{name} slave {self.slave} 0x{self.index:04X}:{self.subindex} {self.data.hex()}"
+
+
+class Divergence(NamedTuple):
+    """A replayed request that differs from the recorded one."""
+
+    sequence: int  # position of ``expected`` in the log, -1 past its end
+    expected: Optional[Transaction]
+    actual: str
+
+
+class ReplayDivergence(RuntimeError):
+    """Raised by a strict replay on the first divergence."""
+
+
+class TrafficLog:
+    """Writer of a new log at ``path``, shared by the SDO and PDO threads."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file: BinaryIO = open(path, "wb")
+        self._file.write(MAGIC)
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.records = 0
+
+    def append(self, kind: int, slave: int, index: int = 0, subindex: int = 0,
+               status: int = STATUS_OK, data: bytes = b"") -> None:
+        header = RECORD.pack(kind, slave, time.perf_counter() - self._start, index, subindex,
+                             status, len(data))
+        with self._lock:
+            self._file.write(header + data)
+            self.records += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def read_log(path: str) -> List[Transaction]:
+    with open(path, "rb") as f:
+        buf = f.read()
+    if not buf.startswith(MAGIC):
+        raise RuntimeError(f"{path} is not a traffic log")
+    records = []
+    offset = len(MAGIC)
+    while offset + RECORD.size <= len(buf):
+        kind, slave, t, index, sub, status, length = RECORD.unpack_from(buf, offset)
+        start = offset + RECORD.size
+        if start + length > len(buf):
+            break  # interrupted while writing the last record
+        records.append(Transaction(kind, slave, t, index, sub, status, buf[start:start + length]))
+        offset = start + length
+    return records
+
+
+def log_from_env() -> Optional[TrafficLog]:
+    path = os.environ.get(TRAFFIC_LOG_ENV)
+    return TrafficLog(path) if path else None
+
+
+def _error_record(exc: Exception) -> Tuple[int, bytes]:
+    # pysoem.SdoError and object_dictionary.SdoError both carry the code.
+    abort_code = getattr(exc, "abort_code", None)
+    if isinstance(abort_code, int):
+        return STATUS_ABORT, ABORT_CODE.pack(abort_code)
+    return STATUS_ERROR, str(exc).encode()[:1024]
+
+
+# Recording ------------------------------------------------------------------
+
+class RecordingSlave:
+    """Forwards to a ``pysoem`` slave and logs its SDO traffic."""
+
+    def __init__(self, slave, position: int, log: TrafficLog) -> None:
+        object.__setattr__(self, "_slave", slave)
+        object.__setattr__(self, "_position", position)
+        object.__setattr__(self, "_log", log)
+
+    def __getattr__(self, name):
+        return getattr(self._slave, name)
+
+    def __setattr__(self, name, value) -> None:
+        # config_func, output, state, ... belong to the real slave.
+        setattr(self._slave, name, value)
+
+    def sdo_read(self, idx: int, subidx: int, size: int = 0, ca: bool = False) -> bytes:
+        kind = SDO_READ | (COMPLETE_ACCESS if ca else 0)
+        try:
+            data = self._slave.sdo_read(idx, subidx, ca=True) if ca else self._slave.sdo_read(idx, subidx)
+        except Exception as exc:
+            self._log.append(kind, self._position, idx, subidx, *_error_record(exc))
+            raise
+        self._log.append(kind, self._position, idx, subidx, STATUS_OK, bytes(data))
+        return data
+
+    def sdo_write(self, idx: int, subidx: int, buf: bytes, ca: bool = False) -> None:
+        kind = SDO_WRITE | (COMPLETE_ACCESS if ca else 0)
+        try:
+            if ca:
+                self._slave.sdo_write(idx, subidx, buf, ca=True)
+            else:
+                self._slave.sdo_write(idx, subidx, buf)
+        except Exception as exc:
+            status, detail = _error_record(exc)
+            self._log.append(kind, self._position, idx, subidx, status, bytes(buf) + detail)
+            raise
+        self._log.append(kind, self._position, idx, subidx, STATUS_OK, bytes(buf))
+
+
+class RecordingMaster:
+    """``pysoem.Master`` proxy logging the scan, SDOs and process data."""
+
+    def __init__(self, master, log: TrafficLog) -> None:
+        object.__setattr__(self, "_master", master)
+        object.__setattr__(self, "log", log)
+        object.__setattr__(self, "slaves", [])
+
+    def __getattr__(self, name):
+        return getattr(self._master, name)
+
+    def __setattr__(self, name, value) -> None:
+        setattr(self._master, name, value)
+
+    def config_init(self, *args) -> int:
+        count = self._master.config_init(*args)
+        object.__setattr__(self, "slaves", [
+            RecordingSlave(slave, pos, self.log) for pos, slave in enumerate(self._master.slaves)
+        ])
+        self.log.append(SCAN, 0, max(count, 0))
+        return count
+
+    def send_processdata(self) -> None:
+        for pos, slave in enumerate(self._master.slaves):
+            self.log.append(PDO_OUT, pos, data=bytes(slave.output))
+        self._master.send_processdata()
+
+    def receive_processdata(self, timeout: int = 2000) -> int:
+        wkc = self._master.receive_processdata(timeout)
+        for pos, slave in enumerate(self._master.slaves):
+            self.log.append(PDO_IN, pos, max(wkc, 0) & 0xFFFF, data=bytes(slave.input))
+        return wkc
+
+    def close(self) -> None:
+        try:
+            self._master.close()
+        finally:
+            self.log.close()
+
+
+# Replay ---------------------------------------------------------------------
+
+class _Cycle(NamedTuple):
+    outputs: Dict[int, bytes]
+    wkc: int
+    inputs: Dict[int, bytes]
+
+
+class ReplaySlave:
+    def __init__(self, master: "ReplayMaster", position: int) -> None:
+        self.master = master
+        self.position = position
+        self.config_func = None
+        self.output = b""
+        self.input = b""
+        self.state = 0
+
+    def sdo_read(self, idx: int, subidx: int, size: int = 0, ca: bool = False) -> bytes:
+        kind = SDO_READ | (COMPLETE_ACCESS if ca else 0)
+        return self.master._serve(kind, self.position, idx, subidx, None)
+
+    def sdo_write(self, idx: int, subidx: int, buf: bytes, ca: bool = False) -> None:
+        kind = SDO_WRITE | (COMPLETE_ACCESS if ca else 0)
+        self.master._serve(kind, self.position, idx, subidx, bytes(buf))
+
+
+class ReplayMaster:
+    """``pysoem.Master`` look-alike answering from a traffic log.
+
+    SDO requests are matched in log order.  On a mismatch the next recorded
+    request for the same object within ``resync_window`` records is used,
+    so one extra or missing poll does not derail the rest of the replay.
+
+    Process data is served cycle by cycle, but a recorded cycle is only
+    entered once the replayed outputs equal its outputs: the inputs wait
+    for the servo's commands instead of following the cycle count.  These
+    divergences are collected even with ``strict``, since raising would stop
+    the process-data thread rather than the code under test.
+    """
+
+    def __init__(self, path: str, strict: bool = False, resync_window: int = 64,
+                 pdo_window: int = 1000) -> None:
+        self.path = path
+        self.strict = strict
+        self.resync_window = resync_window
+        self.pdo_window = pdo_window
+        records = read_log(path)
+        self.clock = VirtualClock()
+        self.divergences: List[Divergence] = []
+        self.state = 0
+        self.slaves: List[ReplaySlave] = []
+        self._lock = threading.Lock()
+        self._sdo = [(n, r) for n, r in enumerate(records) if r.kind not in (PDO_OUT, PDO_IN)]
+        self._cursor = 0
+        # Recorded process data, one entry per cycle.
+        self._cycles: List[_Cycle] = []
+        for r in records:
+            if r.kind == PDO_OUT:
+                if not self._cycles or self._cycles[-1].inputs or r.slave in self._cycles[-1].outputs:
+                    self._cycles.append(_Cycle({}, 0, {}))
+                self._cycles[-1].outputs[r.slave] = r.data
+            elif r.kind == PDO_IN and self._cycles:
+                self._cycles[-1].inputs[r.slave] = r.data
+                self._cycles[-1] = self._cycles[-1]._replace(wkc=r.index)
+        self._cycle = 0
+
+    @property
+    def finished(self) -> bool:
+        """Whether every recorded SDO request has been replayed."""
+        return self._cursor >= len(self._sdo)
+
+    def _diverged(self, sequence: int, expected: Optional[Transaction], actual: str,
+                  raise_: bool = True) -> None:
+        divergence = Divergence(sequence, expected, actual)
+        self.divergences.append(divergence)
+        if self.strict and raise_:
+            where = expected.describe() if expected else "end of log"
+            raise ReplayDivergence(f"Replay diverged at record {sequence}: expected {where}, got {actual}")
+
+    def _advance_clock(self, recorded: float) -> None:
+        now = self.clock.time()
+        if recorded > now:
+            self.clock.advance(recorded - now)
+
+    def _serve(self, kind: int, slave: int, index: int, subindex: int, data: Optional[bytes]) -> bytes:
+        with self._lock:
+            actual = Transaction(kind, slave, 0.0, index, subindex, STATUS_OK, data or b"").describe()
+            match = None
+            for offset, (seq, rec) in enumerate(self._sdo[self._cursor:self._cursor + self.resync_window]):
+                if (rec.kind, rec.slave, rec.index, rec.subindex) == (kind, slave, index, subindex):
+                    match = self._cursor + offset
+                    break
+            expected = self._sdo[self._cursor] if self._cursor < len(self._sdo) else None
+            if match is None or match != self._cursor:
+                self._diverged(expected[0] if expected else -1, expected[1] if expected else None, actual)
+            if match is None:
+                raise ReplayDivergence(f"No recorded answer for {actual}")
+            seq, rec = self._sdo[match]
+            self._cursor = match + 1
+        self._advance_clock(rec.time)
+        if kind & ~COMPLETE_ACCESS == SDO_WRITE:
+            written = rec.data if rec.status == STATUS_OK else rec.data[:len(data)]
+            if written != data:
+                self._diverged(seq, rec, actual)
+        if rec.status == STATUS_ABORT:
+            raise SdoError(index, subindex, ABORT_CODE.unpack(rec.data[-ABORT_CODE.size:])[0])
+        if rec.status == STATUS_ERROR:
+            raise RuntimeError(rec.data.decode(errors="replace"))
+        return rec.data
+
+    # Bus management --------------------------------------------------------
+    def open(self, ifname: str = "") -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def config_init(self, *args) -> int:
+        with self._lock:
+            seq, rec = self._sdo[self._cursor] if self._cursor < len(self._sdo) else (-1, None)
+            if rec is None or rec.kind != SCAN:
+                self._diverged(seq, rec, "scan")
+                return 0
+            self._cursor += 1
+        self.slaves = [ReplaySlave(self, pos) for pos in range(rec.index)]
+        return rec.index
+
+    def config_map(self) -> int:
+        for pos, slave in enumerate(self.slaves):
+            if slave.config_func is not None:
+                slave.config_func(pos)
+        return 0
+
+    def write_state(self) -> None:
+        for slave in self.slaves:
+            slave.state = self.state
+
+    def read_state(self) -> int:
+        return self.state
+
+    def state_check(self, expected_state: int, timeout: int = 50000) -> int:
+        return self.state
+
+    # Process data ----------------------------------------------------------
+    def send_processdata(self) -> None:
+        if not self._cycles:
+            return
+        outputs = {pos: bytes(slave.output) for pos, slave in enumerate(self.slaves)}
+        ahead = self._cycles[self._cycle + 1:self._cycle + 1 + self.pdo_window]
+        if ahead and ahead[0].outputs == outputs:
+            self._cycle += 1
+            return
+        if self._cycles[self._cycle].outputs == outputs:
+            return  # the command of the next recorded cycle is not issued yet
+        for offset, cycle in enumerate(ahead):
+            if cycle.outputs == outputs:
+                # Reacted sooner than the recorded run; skip the cycles between.
+                self._cycle += offset + 1
+                return
+        actual = " ".join(data.hex() for _, data in sorted(outputs.items()))
+        self._diverged(-1, None, f"pdo out {actual}", raise_=False)
+
+    def receive_processdata(self, timeout: int = 2000) -> int:
+        if not self._cycles:
+            return 0
+        cycle = self._cycles[self._cycle]
+        for pos, slave in enumerate(self.slaves):
+            if pos in cycle.inputs:
+                slave.input = cycle.inputs[pos]
+        return cycle.wkc
+
+
+def replay_servo(ifname: str, slave_pos: int = 0, strict: bool = False, **kwargs):
+    """``EthercatServo`` answering from the traffic log ``ifname``.
+
+    Without ``cycle_time`` the servo runs on the replay's virtual clock.
+    """
+    from ethercat_servo import EthercatServo
+
+    master = ReplayMaster(ifname, strict=strict)
+    if kwargs.get("cycle_time") is None:
+        kwargs.setdefault("clock", master.clock)
+    servo = EthercatServo(ifname, slave_pos, master_factory=lambda: master, **kwargs)
+    # Recordings never use the topology cache either.
+    servo.topology = None
+    servo.replay = master
+    return servo
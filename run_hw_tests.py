@@ -1,11 +1,34 @@
+"""Run the hardware integration tests once and commit the log.
+
+The pytest output is streamed line by line into
+``outputs/test_<timestamp>.log.gz`` (plain ``.log`` with ``--no-compress``)
+while the run is in progress, so long soak runs never hold their output in
+memory and can be followed with ``zcat -f``/``tail -f``.  Next to it,
+``test_<timestamp>.jsonl`` receives one JSON record per test as soon as the
+test has finished; this module doubles as the pytest plugin writing it.
+"""
+
+import argparse
 import configparser
 import datetime
+import gzip
+import json
 import os
 import subprocess
+import sys
+import threading
 from pathlib import Path
 
-CONFIG_FILE = Path(__file__).resolve().parent / "config"
-OUTPUT_DIR = Path(__file__).resolve().parent / "outputs"
+from instrumentation import LATENCY_LOG_ENV
+
+ROOT = Path(__file__).resolve().parent
+CONFIG_FILE = ROOT / "config"
+OUTPUT_DIR = ROOT / "outputs"
+HARDWARE_TESTS = ["tests/hardware/test_device_controller.py"]
+# Where the plugin part of this module writes per-test records.
+EVENTS_ENV = "HW_TEST_EVENTS"
+# Compressed logs are flushed at most this often so they stay readable live.
+FLUSH_INTERVAL = 1.0
 
 
 def load_config():
@@ -15,44 +38,159 @@ def load_config():
     return cfg
 
 
-def run_tests():
-    OUTPUT_DIR.mkdir(exist_ok=True)
+class LogWriter:
+    """Line-oriented log file, optionally gzip-compressed on the fly.
+
+    A compressed stream is sync-flushed at most ``flush_interval`` seconds
+    after a write, by a timer thread so that quiet stretches (a soak test, a
+    hung drive) are flushed too: everything written up to then can be
+    decompressed while the file is still being written.
+    """
+
+    def __init__(self, path: Path, compress: bool = True, flush_interval: float = FLUSH_INTERVAL) -> None:
+        self.path = path
+        self.compress = compress
+        self.flush_interval = flush_interval
+        if compress:
+            self._file = gzip.open(path, "wt", encoding="utf-8")
+        else:
+            self._file = open(path, "w", encoding="utf-8", buffering=1)
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def write(self, text: str) -> None:
+        with self._lock:
+            self._file.write(text)
+            if self.compress and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush(self) -> None:
+        with self._lock:
+            self._timer = None
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._file.close()
+
+    def __enter__(self) -> "LogWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def run_tests(tests=None, output_dir: Path = OUTPUT_DIR, compress: bool = True, echo: bool = True):
+    """Run ``tests`` and return the paths of the log and the JSONL records."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(exist_ok=True)
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_path = OUTPUT_DIR / f"test_{timestamp}.log"
+    output_path = output_dir / (f"test_{timestamp}.log" + (".gz" if compress else ""))
+    events_path = output_dir / f"test_{timestamp}.jsonl"
 
     env = os.environ.copy()
     backend = env.get("BACKEND", "hw")
+    # The servo backends append their latency histograms here on close().
+    latency_path = output_dir / f"latency_{timestamp}.txt"
+    env[LATENCY_LOG_ENV] = str(latency_path)
+    env[EVENTS_ENV] = str(events_path)
+    env["PYTHONUNBUFFERED"] = "1"
+    cmd = [sys.executable, "-m", "pytest", "-s", "-p", "run_hw_tests"] + list(tests or HARDWARE_TESTS)
+
     start = datetime.datetime.now()
-    proc = subprocess.run(
-        ["pytest", "-s", "tests/hardware/test_device_controller.py"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        env=env,
-    )
-    end = datetime.datetime.now()
+    with LogWriter(output_path, compress) as log:
+        log.write(f"test_name=DeviceController\n")
+        log.write(f"start={start.isoformat()}\n")
+        log.write(f"backend={backend}\n")
+        log.write(f"events={events_path.name}\n\n")
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            env=env,
+            cwd=ROOT,
+        )
+        for line in proc.stdout:
+            log.write(line)
+            if echo:
+                sys.stdout.write(line)
+        returncode = proc.wait()
+        end = datetime.datetime.now()
+
+        if latency_path.exists():
+            log.write("\n")
+            log.write(latency_path.read_text())
+        log.write(f"\nend={end.isoformat()}\n")
+        log.write(f"duration={(end-start).total_seconds():.2f}s\n")
+        log.write(f"returncode={returncode}\n")
+
+    if latency_path.exists():
+        latency_path.unlink()
+    return output_path, events_path
+
+
+# -- pytest plugin (loaded in the test process with ``-p run_hw_tests``) --
+
+_reports = {}
+
+
+def _write_event(record) -> None:
+    path = os.environ.get(EVENTS_ENV)
+    if path:
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def pytest_runtest_logstart(nodeid, location):
+    _reports[nodeid] = []
+
+
+def pytest_runtest_logreport(report):
+    _reports.setdefault(report.nodeid, []).append(report)
 
-    with open(output_path, "w") as f:
-        f.write(f"test_name=DeviceController\n")
-        f.write(f"start={start.isoformat()}\n")
-        f.write(f"end={end.isoformat()}\n")
-        f.write(f"duration={(end-start).total_seconds():.2f}s\n")
-        f.write(f"backend={backend}\n")
-        f.write(f"returncode={proc.returncode}\n\n")
-        f.write(proc.stdout)
 
-    return output_path
+def pytest_runtest_logfinish(nodeid, location):
+    reports = _reports.pop(nodeid, [])
+    if not reports:
+        return
+    outcome = "passed"
+    for report in reports:
+        if report.failed:
+            outcome = "error" if report.when != "call" else "failed"
+            break
+        if report.skipped:
+            outcome = "skipped"
+    start = min(r.start for r in reports)
+    stop = max(r.stop for r in reports)
+    _write_event({
+        "test": nodeid,
+        "outcome": outcome,
+        "start": datetime.datetime.fromtimestamp(start).isoformat(),
+        "end": datetime.datetime.fromtimestamp(stop).isoformat(),
+        "duration": round(stop - start, 6),
+    })
 
 
-def git_commit(path: Path):
-    subprocess.run(["git", "add", str(path)])
-    subprocess.run(["git", "commit", "-m", f"Add test output {path.name}"])
+def git_commit(*paths: Path):
+    subprocess.run(["git", "add"] + [str(p) for p in paths if p.exists()])
+    subprocess.run(["git", "commit", "-m", f"Add test output {paths[0].name}"])
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Run the hardware tests and commit the log")
+    parser.add_argument("--no-compress", action="store_true", help="write a plain-text log")
+    parser.add_argument("tests", nargs="*", help=f"test paths (default: {' '.join(HARDWARE_TESTS)})")
+    args = parser.parse_args()
     load_config()  # placeholder for credentials usage
-    log_file = run_tests()
-    git_commit(log_file)
+    log_file, events_file = run_tests(args.tests, compress=not args.no_compress)
+    git_commit(log_file, events_file)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,93 @@
+"""Data side of the GUI oscilloscope: channels, decimation and CSV export.
+
+Samples are kept in a :class:`telemetry.Recorder` ring buffer of fixed
+size, filled by the acquisition thread at the full polling rate.  A redraw
+never draws the samples themselves: :func:`decimate` reduces the visible
+window to the minimum and maximum of each pixel column, so every trace is a
+polyline of at most two points per column.  The work per redraw is bounded
+by the ring size and the plot width, whatever the sample rate; a peak one
+sample wide still shows up in its column.
+"""
+
+from __future__ import annotations
+
+import csv
+from typing import Dict, Tuple
+
+import numpy as np
+
+from telemetry import TIME_COLUMN
+
+# (index, subindex, name, size_in_bytes, signed), as in gui.REGISTER_DEFS.
+SCOPE_CHANNELS = [
+    (0x6064, 0, "actual_position", 4, True),
+    (0x607A, 0, "target_position", 4, True),
+    (0x6041, 0, "statusword", 2, False),
+]
+ANALOG_TRACES = ("actual_position", "target_position")
+# Statusword bits drawn as logic traces: (bit, label).
+STATUS_BITS = [
+    (3, "fault"),
+    (7, "warning"),
+    (10, "target reached"),
+    (12, "set-point ack"),
+]
+
+
+def window(data: Dict[str, np.ndarray], start: float, stop: float) -> Dict[str, np.ndarray]:
+    """Samples of ``data`` (as from ``Recorder.latest``) with ``start <= t < stop``."""
+    lo, hi = np.searchsorted(data[TIME_COLUMN], [start, stop])
+    return {name: values[lo:hi] for name, values in data.items()}
+
+
+def decimate(times: np.ndarray, values: np.ndarray, start: float, stop: float,
+             columns: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Minimum and maximum of ``values`` in each of ``columns`` time buckets.
+
+    ``times`` must be sorted.  The buckets split ``[start, stop)`` evenly;
+    empty ones are NaN.
+    """
+    mins = np.full(columns, np.nan)
+    maxs = np.full(columns, np.nan)
+    lo, hi = np.searchsorted(times, [start, stop])
+    if hi <= lo or stop <= start:
+        return mins, maxs
+    buckets = ((times[lo:hi] - start) * (columns / (stop - start))).astype(np.intp)
+    np.clip(buckets, 0, columns - 1, out=buckets)
+    # Sorted times give sorted buckets: reduce each run of equal ones.
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    used = buckets[starts]
+    values = values[lo:hi]
+    mins[used] = np.minimum.reduceat(values, starts)
+    maxs[used] = np.maximum.reduceat(values, starts)
+    return mins, maxs
+
+
+def envelope(mins: np.ndarray, maxs: np.ndarray, x0: float, dx: float, y0: float,
+             scale: float) -> list:
+    """Flat ``x, y`` canvas coordinates drawing a min/max envelope.
+
+    Each non-empty column becomes a vertical stroke from its minimum to its
+    maximum; ``y = y0 - value * scale``.
+    """
+    used = np.flatnonzero(~np.isnan(mins))
+    coords = np.empty((len(used), 4))
+    coords[:, 0] = coords[:, 2] = x0 + used * dx
+    coords[:, 1] = y0 - mins[used] * scale
+    coords[:, 3] = y0 - maxs[used] * scale
+    return coords.ravel().tolist()
+
+
+def bit(data: Dict[str, np.ndarray], number: int) -> np.ndarray:
+    return (data["statusword"] >> number) & 1
+
+
+def write_csv(path: str, data: Dict[str, np.ndarray]) -> int:
+    """Write every sample of ``data`` (not the decimated view); return the count."""
+    names = list(data)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        columns = [data[name].tolist() for name in names]
+        writer.writerows(zip(*columns))
+    return len(data[TIME_COLUMN])
@@ -0,0 +1,96 @@
+"""Helpers for batched SDO access shared by both servo backends.
+
+``read_sdo_many`` takes ``(index, subindex, size)`` or
+``(index, subindex, size, signed)`` entries and returns one
+:class:`SdoSnapshot`.  Consecutive subindexes ``1..n`` of the same object are
+fetched with a single CoE complete-access upload where the drive allows it.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from object_dictionary import decode_int
+
+# (index, subindex, size, signed)
+Request = Tuple[int, int, int, bool]
+Key = Tuple[int, int]
+
+
+class SdoSnapshot(Mapping):
+    """Immutable ``(index, subindex) -> value`` mapping taken at ``timestamp``.
+
+    Entries that could not be read are absent from the mapping and listed in
+    ``errors`` with the exception that was raised.
+    """
+
+    __slots__ = ("timestamp", "_values", "errors")
+
+    def __init__(self, timestamp: float, values: Dict[Key, int], errors: Dict[Key, Exception]) -> None:
+        self.timestamp = timestamp
+        self._values = dict(values)
+        self.errors = dict(errors)
+
+    def __getitem__(self, key: Key) -> int:
+        return self._values[key]
+
+    def __iter__(self) -> Iterator[Key]:
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __repr__(self) -> str:
+        items = ", ".join(f"0x{i:04X}:{s}={v}" for (i, s), v in self._values.items())
+        return f"SdoSnapshot({items}, errors={len(self.errors)})"
+
+
+def normalize(entries: Sequence[Sequence]) -> List[Request]:
+    requests = []
+    for entry in entries:
+        idx, sub, size = entry[0], entry[1], entry[2]
+        signed = bool(entry[3]) if len(entry) > 3 else False
+        requests.append((idx, sub, size, signed))
+    return requests
+
+
+def group_complete_access(requests: Sequence[Request]) -> List[Tuple[int, List[Request]]]:
+    """Group requests by object, keeping the caller's order of objects.
+
+    A group with more than one request is eligible for complete access only
+    if its subindexes are exactly ``1..n``; see :func:`complete_access_size`.
+    """
+    groups: Dict[int, List[Request]] = {}
+    for req in requests:
+        groups.setdefault(req[0], []).append(req)
+    return list(groups.items())
+
+
+def complete_access_size(group: Sequence[Request]) -> int:
+    """Bytes to upload for ``group`` via complete access, or 0 if not possible."""
+    if len(group) < 2:
+        return 0
+    subs = sorted(req[1] for req in group)
+    if subs != list(range(1, len(group) + 1)):
+        return 0
+    return sum(req[2] for req in group)
+
+
+def split_complete_access(buf: bytes, group: Sequence[Request]) -> Dict[Key, int]:
+    """Decode a complete-access upload starting at subindex 1.
+
+    Raises ``RuntimeError`` when ``buf`` is not exactly as long as the sizes
+    of ``group`` add up to, since every later value would be misaligned.
+    """
+    expected = sum(req[2] for req in group)
+    if len(buf) != expected:
+        raise RuntimeError(
+            f"Complete access of 0x{group[0][0]:04X} returned {len(buf)} bytes, expected {expected}"
+        )
+    values = {}
+    offset = 0
+    for idx, sub, size, signed in sorted(group, key=lambda r: r[1]):
+        values[(idx, sub)] = decode_int(bytes(buf[offset:offset + size]), signed)
+        offset += size
+    return values
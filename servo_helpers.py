@@ -0,0 +1,126 @@
+"""High-level CiA 402 helpers shared by every servo backend.
+
+:class:`ServoHelpers` implements ``set_mode()``, ``enable_operation()``,
+``start_motion()`` and the other helpers once, on top of the backend's
+``read_sdo()``/``write_sdo()``, so :class:`ethercat_servo.EthercatServo`,
+:class:`servo_simulator.ServoSimulator` and :class:`sim_client.RemoteServo`
+cannot drift apart.  A backend with a process image overrides
+:meth:`ServoHelpers._read`/:meth:`ServoHelpers._write` to serve mapped objects
+from it.  The backend must also provide ``clock`` and ``instruments``.
+"""
+
+from __future__ import annotations
+
+import cia402
+from instrumentation import timed
+
+
+class ServoHelpers:
+    """Mixin with the CiA 402 helper methods of the servo API."""
+
+    CONTROL_WORD = 0x6040
+    STATUS_WORD = 0x6041
+    MODE_OF_OPERATION = 0x6060
+    MODE_OF_OPERATION_DISPLAY = 0x6061
+    TARGET_POSITION = 0x607A
+    TARGET_VELOCITY = 0x60FF
+    ACTUAL_POSITION = 0x6064
+    DIGITAL_OUTPUTS = 0x60FE
+    CONTROLLER_BITS = 0x06  # Fw (bit1) and Fb (bit2)
+    BRAKE_BIT = 0x01
+
+    def _write(self, idx: int, subidx: int, val: int, size: int = 2) -> None:
+        self.write_sdo(idx, subidx, val, size)
+
+    def _read(self, idx: int, subidx: int, size: int = 2, signed: bool = False) -> int:
+        return self.read_sdo(idx, subidx, size, signed)
+
+    def read_statusword(self) -> int:
+        return self._read(self.STATUS_WORD, 0)
+
+    def write_controlword(self, cw: int) -> None:
+        self._write(self.CONTROL_WORD, 0, cw)
+
+    def read_mode_display(self) -> int:
+        return self._read(self.MODE_OF_OPERATION_DISPLAY, 0, size=1, signed=True)
+
+    @timed("enable_operation")
+    def enable_operation(self, timeout: float = 1.0) -> None:
+        """Walk the CiA 402 state machine to *Operation enabled*.
+
+        Each transition is confirmed through the statusword and must finish
+        within ``timeout`` seconds; a pending fault is reset once.
+        """
+        cia402.enable_operation(self, step_timeout=timeout)
+
+    @timed("set_mode")
+    def set_mode(self, mode: int, timeout: float = 1.0) -> None:
+        """Select the mode of operation and wait until 0x6061 confirms it."""
+        self._write(self.MODE_OF_OPERATION, 0, mode, size=1)
+        cia402.wait_for_mode(self, mode, timeout)
+
+    def set_target_position(self, pos: int) -> None:
+        self._write(self.TARGET_POSITION, 0, pos, size=4)
+
+    def set_target_position_after_gearbox(self, output_pos: int, gear_ratio: float) -> None:
+        """Set target position in terms of output position after a gearbox.
+
+        This helper multiplies ``output_pos`` by ``gear_ratio`` and sends the
+        resulting motor shaft position to the drive.  Use it when you want to
+        command the position at the load rather than directly at the motor.
+
+        Parameters
+        ----------
+        output_pos : int
+            Desired position of the output shaft after the gearbox.
+        gear_ratio : float
+            Gear ratio (motor revolutions per output revolution).
+        """
+
+        motor_pos = int(output_pos * gear_ratio)
+        self.set_target_position(motor_pos)
+
+    def set_target_velocity(self, vel: int) -> None:
+        self._write(self.TARGET_VELOCITY, 0, vel, size=4)
+
+    def read_actual_position(self) -> int:
+        return self._read(self.ACTUAL_POSITION, 0, size=4, signed=True)
+
+    def start_motion(self) -> None:
+        """Trigger motion in profile position mode."""
+        # Set the "new set-point" and "change set immediately" bits
+        # according to CiA 402 profile position mode.
+        self._write(self.CONTROL_WORD, 0, 0x3F)
+
+    def wait_until(self, predicate, timeout: float = 1.0) -> float:
+        """Wait until ``predicate()`` is true and return the seconds it took.
+
+        The predicate is re-checked after every process-data cycle when the
+        backend exchanges process data, otherwise with a growing polling
+        interval; see :func:`cia402.wait_until`.
+        """
+        return cia402.wait_until(self, predicate, timeout)
+
+    def wait_for_target_reached(self, timeout: float = 10.0) -> cia402.MotionResult:
+        """Wait for the move started by :meth:`start_motion` to finish.
+
+        Completes the set-point handshake (statusword bit 12, controlword
+        bit 4) and returns as soon as statusword bit 10 reports the target
+        as reached, with the acknowledge and settle times.
+        """
+        return cia402.wait_for_target_reached(self, timeout)
+
+    def release_brake(self) -> None:
+        """Release the motor brake using digital outputs if available."""
+        self._set_digital_outputs(self.BRAKE_BIT)
+
+    def enable_controller(self) -> None:
+        """Enable controller with Fw and Fb control bits."""
+        self._set_digital_outputs(self.CONTROLLER_BITS)
+
+    def _set_digital_outputs(self, bits: int) -> None:
+        try:
+            state = self.read_sdo(self.DIGITAL_OUTPUTS, 1, size=4)
+        except Exception:
+            state = 0
+        self.write_sdo(self.DIGITAL_OUTPUTS, 1, state | bits, size=4)
@@ -1,96 +1,421 @@
-import xml.etree.ElementTree as ET
-import time
-from typing import Dict, Tuple
-
-
-class ServoSimulator:
-    """In-memory CiA-402 servo simulator using values from an ESI file."""
-
-    DEFAULT_INDICES = {
-        0x6040,  # control word
-        0x6041,  # status word
-        0x6060,  # mode of operation
-        0x6061,  # mode display
-        0x607A,  # target position
-        0x60FF,  # target velocity
-        0x6064,  # actual position
-        0x60FE,  # digital outputs
-    }
-
-    def __init__(self, ifname: str = "", slave_pos: int = 0, esi_path: str = "JMC_DRIVE_V1.8.xml") -> None:
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cia402
+from clock import MonotonicClock
+from instrumentation import Instruments, dump_to_env, from_env, timed
+from object_dictionary import ObjectDictionary, SdoError, decode_int, encode_int, load_dictionary
+from process_data import RXPDO_ENTRIES, RX_STRUCT, TXPDO_ENTRIES, TX_STRUCT
+from sdo_batch import SdoSnapshot, normalize
+from servo_helpers import ServoHelpers
+
+# EtherCAT application-layer states, numerically identical to pysoem's.
+INIT_STATE = 0x01
+PREOP_STATE = 0x02
+SAFEOP_STATE = 0x04
+OP_STATE = 0x08
+
+
+class TrapezoidProfile:
+    """Closed-form trapezoidal point-to-point move starting at rest.
+
+    Falls back to a triangular profile when the distance is too short to
+    reach ``v_max``.  ``position(t)``/``velocity(t)`` are evaluated
+    analytically, so any simulated time step costs the same.
+    """
+
+    def __init__(self, start: float, target: float, v_max: float, accel: float, decel: float) -> None:
+        self.start = start
+        self.target = target
+        self.direction = 1.0 if target >= start else -1.0
+        distance = abs(target - start)
+        self.accel = accel
+        self.decel = decel
+        # Peak velocity of a triangular profile covering the distance.
+        v_peak = (2.0 * distance * accel * decel / (accel + decel)) ** 0.5
+        self.v_peak = min(v_max, v_peak)
+        self.t_accel = self.v_peak / accel
+        self.t_decel = self.v_peak / decel
+        d_accel = 0.5 * accel * self.t_accel ** 2
+        d_decel = 0.5 * decel * self.t_decel ** 2
+        self.t_cruise = (distance - d_accel - d_decel) / self.v_peak if self.v_peak else 0.0
+        self.t_cruise = max(0.0, self.t_cruise)
+        self.duration = self.t_accel + self.t_cruise + self.t_decel
+
+    def _travel(self, t: float) -> Tuple[float, float]:
+        if t <= 0.0:
+            return 0.0, 0.0
+        if t >= self.duration:
+            return abs(self.target - self.start), 0.0
+        if t < self.t_accel:
+            return 0.5 * self.accel * t * t, self.accel * t
+        d = 0.5 * self.accel * self.t_accel ** 2
+        t -= self.t_accel
+        if t < self.t_cruise:
+            return d + self.v_peak * t, self.v_peak
+        d += self.v_peak * self.t_cruise
+        t -= self.t_cruise
+        return d + self.v_peak * t - 0.5 * self.decel * t * t, self.v_peak - self.decel * t
+
+    def position(self, t: float) -> float:
+        return self.start + self.direction * self._travel(t)[0]
+
+    def velocity(self, t: float) -> float:
+        return self.direction * self._travel(t)[1]
+
+
+class ServoSimulator(ServoHelpers):
+    """In-memory CiA-402 servo simulator using values from an ESI file.
+
+    The complete object dictionary of the selected device is loaded with its
+    data types and access rights, so SDO accesses are encoded, size-checked
+    and aborted exactly like on the drive.
+
+    Motion follows a time-based drive model: profile position mode (1) runs
+    trapezoidal moves, cyclic synchronous position mode (8) follows the
+    target position and profile velocity mode (3) ramps towards the target
+    velocity, using the profile velocity/acceleration/deceleration objects
+    (0x6081/0x6083/0x6084) or the ``DEFAULT_PROFILE_*`` values when those
+    are zero.  Time comes from ``clock``; pass a :class:`clock.VirtualClock`
+    to advance simulated time without waiting.
+    """
+
+    PRODUCT_CODE = 0x2019A301  # IHSV-EC in JMC_DRIVE_V1.8.xml
+
+    # Used when the ESI leaves the profile objects at zero (counts, seconds).
+    DEFAULT_PROFILE_VELOCITY = 500_000
+    DEFAULT_PROFILE_ACCELERATION = 1_000_000
+    DEFAULT_PROFILE_DECELERATION = 1_000_000
+
+    def __init__(self, ifname: str = "", slave_pos: int = 0, esi_path: str = "JMC_DRIVE_V1.8.xml",
+                 product_code: int = PRODUCT_CODE, clock=None,
+                 instruments: Optional[Instruments] = None) -> None:
         self.esi_path = esi_path
-        # map of (index, subindex) -> value
-        self.objects: Dict[Tuple[int, int], int] = {}
+        self.product_code = product_code
+        self.clock = clock if clock is not None else MonotonicClock()
+        self.instruments = instruments if instruments is not None else from_env()
+        self.objects: Optional[ObjectDictionary] = None
+        self.al_state = INIT_STATE
         self.opened = False
+        self._position = 0.0
+        self._velocity = 0.0
+        self._move: Optional[TrapezoidProfile] = None
+        self._move_start = 0.0
+        self._last_update = 0.0
+        self.state = cia402.NOT_READY_TO_SWITCH_ON
 
     def _parse_esi(self) -> None:
-        tree = ET.parse(self.esi_path)
-        root = tree.getroot()
-        for obj in root.iter("Object"):
-            index_txt = obj.findtext("Index")
-            if not index_txt:
-                continue
-            idx = int(index_txt.replace("#x", ""), 16)
-            if idx not in self.DEFAULT_INDICES:
-                continue
-            sub_items = obj.findall("Info/SubItem")
-            if sub_items:
-                for sub_idx, sub in enumerate(sub_items):
-                    val_txt = sub.findtext("Info/DefaultData")
-                    val = int(val_txt, 16) if val_txt else 0
-                    self.objects[(idx, sub_idx)] = val
-            else:
-                val_txt = obj.findtext("Info/DefaultData")
-                val = int(val_txt, 16) if val_txt else 0
-                self.objects[(idx, 0)] = val
+        self.objects = load_dictionary(self.esi_path, self.product_code)
 
     # Basic API -------------------------------------------------------------
+    @timed("open")
     def open(self) -> None:
         self._parse_esi()
+        self._power_on()
+
+    def _power_on(self) -> None:
+        """Reset the drive model to its state right after power-up."""
+        self._position = float(self.objects[(0x6064, 0)])
+        self._velocity = 0.0
+        self._move = None
+        self._last_update = self.clock.time()
+        self.al_state = OP_STATE
+        self._set_state(cia402.SWITCH_ON_DISABLED)
+        # At rest the drive reports the (initial) target as reached.
+        self._set_status_bits(cia402.SW_TARGET_REACHED, True)
         self.opened = True
 
     def close(self) -> None:
+        dump_to_env(self.instruments, "ServoSimulator")
+        self.al_state = INIT_STATE
         self.opened = False
 
+    @timed("sdo_write", by_index=True)
     def write_sdo(self, idx: int, subidx: int, val: int, size: int = 2) -> None:
-        self.objects[(idx, subidx)] = val
+        self.download(idx, subidx, encode_int(val, size))
+
+    @timed("sdo_read", by_index=True)
+    def read_sdo(self, idx: int, subidx: int, size: int = 2, signed: bool = False) -> int:
+        return decode_int(self.upload(idx, subidx)[:size], signed)
+
+    def upload(self, idx: int, subidx: int, complete: bool = False) -> bytes:
+        """Return the raw bytes of an object as an SDO upload would.
+
+        With ``complete`` the entries from ``subidx`` on are returned packed,
+        like a CoE complete-access upload.
+        """
+        self.update()
+        if complete:
+            return self.objects.read_complete(idx, subidx)
+        return self.objects.read(idx, subidx)
+
+    @timed("read_sdo_many")
+    def read_sdo_many(self, entries) -> SdoSnapshot:
+        """Read several objects at one instant of simulated time."""
+        self.update()
+        values = {}
+        errors = {}
+        for idx, sub, size, signed in normalize(entries):
+            try:
+                values[(idx, sub)] = decode_int(self.objects.read(idx, sub)[:size], signed)
+            except SdoError as exc:
+                errors[(idx, sub)] = exc
+        return SdoSnapshot(self.clock.time(), values, errors)
+
+    @timed("write_sdo_many")
+    def write_sdo_many(self, entries) -> None:
+        for idx, sub, val, size in entries:
+            self.write_sdo(idx, sub, val, size)
+
+    def download(self, idx: int, subidx: int, buf: bytes, check: bool = True) -> None:
+        """Store raw bytes as an SDO download (``check``) or PDO write would."""
+        self.update()
+        previous_cw = self.objects[(0x6040, 0)]
+        if check:
+            self.objects.write(idx, subidx, buf, self.al_state)
+        else:
+            self.objects.raw(idx, subidx)[:] = buf
+        if idx == 0x6040 and subidx == 0:
+            self._on_controlword(self.objects[(0x6040, 0)], previous_cw)
+        elif idx == 0x6060 and subidx == 0:
+            # The drive switches modes immediately.
+            self.objects[(0x6061, 0)] = self.objects[(0x6060, 0)]
+
+    # CiA 402 state machine ------------------------------------------------
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        status = self.objects[(0x6041, 0)] & ~0x6F & 0xFFFF
+        status |= cia402.STATUS_BITS[state] | cia402.SW_REMOTE
+        if state in (cia402.READY_TO_SWITCH_ON, cia402.SWITCHED_ON,
+                     cia402.OPERATION_ENABLED, cia402.QUICK_STOP_ACTIVE):
+            status |= cia402.SW_VOLTAGE_ENABLED
+        else:
+            status &= ~cia402.SW_VOLTAGE_ENABLED
+        self.objects[(0x6041, 0)] = status
 
-    def read_sdo(self, idx: int, subidx: int, size: int = 2) -> int:
-        return self.objects.get((idx, subidx), 0)
+    def _set_status_bits(self, bits: int, on: bool) -> None:
+        status = self.objects[(0x6041, 0)]
+        self.objects[(0x6041, 0)] = status | bits if on else status & ~bits & 0xFFFF
 
-    # High-level helpers ---------------------------------------------------
-    def enable_operation(self) -> None:
-        for cw in (0x06, 0x07, 0x0F):
-            self.write_sdo(0x6040, 0, cw)
-            time.sleep(0.01)
+    def inject_fault(self, error_code: int = 0x5530) -> None:
+        """Put the drive into *Fault* with ``error_code`` in 0x603F."""
+        self.update()
+        self._move = None
+        self._velocity = 0.0
+        self.objects[(0x603F, 0)] = error_code
+        self._set_state(cia402.FAULT)
+
+    # Drive model ----------------------------------------------------------
+    def _profile(self, idx: int, default: int) -> float:
+        return float(self.objects[(idx, 0)] or default)
+
+    def _enabled(self) -> bool:
+        return self.state == cia402.OPERATION_ENABLED
+
+    def update(self) -> None:
+        """Advance the drive model to the current clock time."""
+        now = self.clock.time()
+        dt = now - self._last_update
+        if dt <= 0.0:
+            return
+        self._last_update = now
+        mode = self.objects[(0x6060, 0)]
+        if self._move is not None:
+            t = now - self._move_start
+            self._position = self._move.position(t)
+            self._velocity = self._move.velocity(t)
+            if t >= self._move.duration:
+                self._move = None
+                self._set_status_bits(cia402.SW_TARGET_REACHED, True)
+        elif mode == 8 and self._enabled():
+            # Cyclic synchronous position: the drive follows each setpoint.
+            target = float(self.objects[(0x607A, 0)])
+            self._velocity = (target - self._position) / dt
+            self._position = target
+        elif mode == 3 and self._enabled():
+            target = float(self.objects[(0x60FF, 0)])
+            accel = self._profile(0x6083, self.DEFAULT_PROFILE_ACCELERATION)
+            if target < self._velocity:
+                accel = -self._profile(0x6084, self.DEFAULT_PROFILE_DECELERATION)
+            t_ramp = min(dt, (target - self._velocity) / accel)
+            self._position += self._velocity * t_ramp + 0.5 * accel * t_ramp ** 2
+            self._velocity += accel * t_ramp
+            if t_ramp < dt:
+                self._velocity = target
+                self._position += target * (dt - t_ramp)
+        else:
+            self._velocity = 0.0
+        if not self._enabled():
+            self._move = None
+            self._velocity = 0.0
+        self.objects[(0x6064, 0)] = round(self._position)
+        self.objects[(0x606C, 0)] = round(self._velocity)
+
+    def _on_controlword(self, cw: int, previous: int) -> None:
+        state = cia402.next_state(self.state, cw, previous)
+        if state != self.state:
+            if state == cia402.SWITCH_ON_DISABLED and self.state == cia402.FAULT:
+                self.objects[(0x603F, 0)] = 0
+            self._set_state(state)
+        # A rising "new set-point" bit (bit 4) starts a profile-position move;
+        # bit 6 makes the target relative to the current position.  The drive
+        # acknowledges it with statusword bit 12 until bit 4 is cleared again.
+        if not cw & cia402.CW_NEW_SETPOINT:
+            self._set_status_bits(cia402.SW_SETPOINT_ACK, False)
+        if not (cw & 0x10 and not previous & 0x10):
+            return
+        if self.objects[(0x6060, 0)] != 1 or not self._enabled():
+            return
+        self._set_status_bits(cia402.SW_SETPOINT_ACK, True)
+        self._set_status_bits(cia402.SW_TARGET_REACHED, False)
+        target = float(self.objects[(0x607A, 0)])
+        if cw & 0x40:
+            target += self._position
+        self._move = TrapezoidProfile(
+            self._position,
+            target,
+            self._profile(0x6081, self.DEFAULT_PROFILE_VELOCITY),
+            self._profile(0x6083, self.DEFAULT_PROFILE_ACCELERATION),
+            self._profile(0x6084, self.DEFAULT_PROFILE_DECELERATION),
+        )
+        self._move_start = self._last_update
+
+
+def _offsets(entries: Sequence[Tuple[int, int, str]]) -> List[Tuple[int, int, int, int]]:
+    """Return ``(index, subindex, start, end)`` byte ranges of a PDO layout."""
+    ranges = []
+    offset = 0
+    for idx, sub, fmt in entries:
+        size = struct.calcsize(fmt)
+        ranges.append((idx, sub, offset, offset + size))
+        offset += size
+    return ranges
+
+
+_RX_RANGES = _offsets(RXPDO_ENTRIES)
+_TX_KEYS = [(idx, sub) for idx, sub, _ in TXPDO_ENTRIES]
+
+
+class SimulatedSlave:
+    """``pysoem`` slave look-alike backed by a :class:`ServoSimulator`.
+
+    Exposes ``sdo_read``/``sdo_write`` with byte buffers and the ``output``
+    and ``input`` process-data buffers laid out as in :mod:`process_data`.
+    """
+
+    def __init__(self, sim: ServoSimulator) -> None:
+        self.sim = sim
+        # Identity as pysoem reports it after config_init().
+        identity = sim.objects.read
+        self.name = "ServoSimulator"
+        self.man = decode_int(identity(0x1018, 1))
+        self.id = decode_int(identity(0x1018, 2))
+        self.rev = decode_int(identity(0x1018, 3))
+        self.config_func = None
+        self.output = bytes(RX_STRUCT.size)
+        self.input = bytes(TX_STRUCT.size)
+
+    def sdo_write(self, idx: int, subidx: int, buf: bytes, ca: bool = False) -> None:
+        if ca:
+            offset = 0
+            for sub in self.sim.objects.subindices(idx):
+                if sub < subidx:
+                    continue
+                if offset >= len(buf):
+                    break
+                size = self.sim.objects.entry(idx, sub).size
+                self.sim.download(idx, sub, bytes(buf[offset:offset + size]))
+                offset += size
+            return
+        self.sim.download(idx, subidx, bytes(buf))
+
+    def sdo_read(self, idx: int, subidx: int, size: int = 0, ca: bool = False) -> bytes:
+        return self.sim.upload(idx, subidx, complete=ca)
+
+    def exchange(self, output: bytes) -> bytes:
+        """Apply RxPDO ``output`` and return the refreshed TxPDO data."""
+        self.output = output
+        self._apply_outputs()
+        self._refresh_inputs()
+        return self.input
+
+    def _apply_outputs(self) -> None:
+        out = self.output
+        controlword = None
+        for idx, sub, start, end in _RX_RANGES:
+            if (idx, sub) == (0x6040, 0):
+                controlword = out[start:end]
+            else:
+                self.sim.download(idx, sub, out[start:end], check=False)
+        # Setpoints must be in place before the controlword edge is seen.
+        if controlword is not None:
+            self.sim.download(0x6040, 0, controlword, check=False)
+
+    def _refresh_inputs(self) -> None:
+        self.sim.update()
+        raw = self.sim.objects.raw
+        self.input = b"".join([raw(idx, sub) for idx, sub in _TX_KEYS])
+
+
+class SimulatedMaster:
+    """Minimal ``pysoem.Master`` stand-in driving a list of simulators.
+
+    All slaves are updated in one ``send_processdata``/``receive_processdata``
+    pair, mirroring a single EtherCAT frame per cycle.
+    """
+
+    def __init__(self, sims: Optional[Sequence[ServoSimulator]] = None, count: int = 1,
+                 esi_path: str = "JMC_DRIVE_V1.8.xml") -> None:
+        if sims is None:
+            sims = [ServoSimulator(esi_path=esi_path) for _ in range(count)]
+        self.sims = list(sims)
+        self.slaves: List[SimulatedSlave] = []
+        self.state = INIT_STATE
+
+    def open(self, ifname: str = "") -> None:
+        for sim in self.sims:
+            if not sim.opened:
+                sim.open()
+
+    def close(self) -> None:
+        for sim in self.sims:
+            sim.close()
+        self.state = INIT_STATE
 
-    def set_mode(self, mode: int) -> None:
-        self.write_sdo(0x6060, 0, mode)
-        time.sleep(0.01)
+    def _set_slave_states(self, state: int) -> None:
+        self.state = state
+        for sim in self.sims:
+            sim.al_state = state
 
-    def set_target_position(self, pos: int) -> None:
-        self.write_sdo(0x607A, 0, pos)
+    def config_init(self) -> int:
+        self.slaves = [SimulatedSlave(sim) for sim in self.sims]
+        self._set_slave_states(PREOP_STATE)
+        return len(self.slaves)
 
-    def set_target_position_after_gearbox(self, output_pos: int, gear_ratio: float) -> None:
-        self.set_target_position(int(output_pos * gear_ratio))
+    def config_map(self) -> int:
+        for pos, slave in enumerate(self.slaves):
+            if slave.config_func is not None:
+                slave.config_func(pos)
+        self._set_slave_states(SAFEOP_STATE)
+        return RX_STRUCT.size * len(self.slaves)
 
-    def set_target_velocity(self, vel: int) -> None:
-        self.write_sdo(0x60FF, 0, vel)
+    def write_state(self) -> None:
+        # Like pysoem, assigning ``state`` records the request; the simulated
+        # slaves follow it immediately.
+        self._set_slave_states(self.state)
 
-    def read_actual_position(self) -> int:
-        return self.read_sdo(0x6064, 0)
+    def read_state(self) -> int:
+        return self.state
 
-    def start_motion(self) -> None:
-        # When starting motion we simply copy target position to actual position
-        self.write_sdo(0x6040, 0, 0x3F)
-        target = self.read_sdo(0x607A, 0)
-        self.write_sdo(0x6064, 0, target)
+    def state_check(self, expected_state: int, timeout: int = 50000) -> int:
+        return self.state
 
-    def release_brake(self) -> None:
-        state = self.read_sdo(0x60FE, 1)
-        self.write_sdo(0x60FE, 1, state | 0x01)
+    def send_processdata(self) -> None:
+        for slave in self.slaves:
+            slave._apply_outputs()
 
-    def enable_controller(self) -> None:
-        state = self.read_sdo(0x60FE, 1)
-        self.write_sdo(0x60FE, 1, state | 0x06)
-        time.sleep(0.01)
+    def receive_processdata(self, timeout: int = 2000) -> int:
+        for slave in self.slaves:
+            slave._refresh_inputs()
+        # Each slave with outputs and inputs increments the LRW counter by 3.
+        return 3 * len(self.slaves)
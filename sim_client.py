@@ -0,0 +1,243 @@
+"""Client backend for the ``servo-sim`` daemon (:mod:`sim_server`).
+
+:class:`RemoteServo` offers the ``EthercatServo`` API for a drive simulated by
+a daemon, so several processes (GUI, demo, parallel test workers) can share
+one simulated drive.  :class:`RemoteMaster` is a ``pysoem.Master`` look-alike
+for process-data users such as :class:`multi_axis.MultiAxisMaster`.
+
+``read_sdo_many``/``write_sdo_many`` and every process-data cycle travel in a
+single frame, whatever the number of objects or drives.
+"""
+
+from __future__ import annotations
+
+import itertools
+import os
+import socket
+import struct
+import threading
+from typing import List, Optional
+
+import sim_protocol as proto
+from clock import MonotonicClock
+from instrumentation import Instruments, dump_to_env, from_env, timed
+from object_dictionary import SdoError, decode_int, encode_int
+from process_data import RX_STRUCT, TX_STRUCT
+from sdo_batch import SdoSnapshot, normalize
+from servo_helpers import ServoHelpers
+from servo_simulator import INIT_STATE, PREOP_STATE, SAFEOP_STATE
+
+
+def socket_path(path: Optional[str] = None) -> str:
+    """Return ``path`` or the ``SERVO_SIM_SOCKET``/default socket path."""
+    return path or os.environ.get(proto.SOCKET_ENV, proto.DEFAULT_SOCKET)
+
+
+def check(result: proto.Result, op: proto.Operation) -> bytes:
+    """Return the data of ``result`` or raise the error it reports."""
+    if result.status == proto.STATUS_OK:
+        return result.data
+    if result.status == proto.STATUS_ABORT:
+        raise SdoError(op.index, op.subindex, result.abort_code)
+    raise RuntimeError(result.data.decode(errors="replace"))
+
+
+class SimClient:
+    """One connection to the daemon; safe to share between threads."""
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = socket_path(path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._sock.connect(self.path)
+        except OSError as exc:
+            self._sock.close()
+            raise RuntimeError(f"servo-sim not reachable at {self.path}: {exc}") from exc
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+
+    def request(self, operations: List[proto.Operation]) -> List[proto.Result]:
+        """Send one batch and return one result per operation."""
+        with self._lock:
+            sequence = next(self._sequence) & 0xFFFFFFFF
+            try:
+                self._sock.sendall(proto.encode_request(sequence, operations))
+                length = proto.FRAME.unpack(self._recv(proto.FRAME.size))[0]
+                reply, results = proto.decode_response(self._recv(length))
+            except OSError as exc:
+                raise RuntimeError(f"servo-sim connection lost: {exc}") from exc
+        if reply != sequence or len(results) != len(operations):
+            if len(results) == 1 and results[0].status == proto.STATUS_ERROR:
+                # The daemon rejected the whole request.
+                raise RuntimeError(results[0].data.decode(errors="replace"))
+            raise RuntimeError("servo-sim reply does not match the request")
+        return results
+
+    def call(self, operation: proto.Operation) -> bytes:
+        return check(self.request([operation])[0], operation)
+
+    def _recv(self, size: int) -> bytes:
+        buf = bytearray(size)
+        view = memoryview(buf)
+        while view:
+            n = self._sock.recv_into(view)
+            if not n:
+                raise RuntimeError("servo-sim closed the connection")
+            view = view[n:]
+        return bytes(buf)
+
+    def close(self) -> None:
+        self._sock.close()
+
+
+class RemoteSlave:
+    """``pysoem`` slave look-alike forwarding to one simulated drive."""
+
+    def __init__(self, client: SimClient, position: int) -> None:
+        self.client = client
+        self.position = position
+        self.config_func = None
+        self.output = bytes(RX_STRUCT.size)
+        self.input = bytes(TX_STRUCT.size)
+
+    def sdo_read(self, idx: int, subidx: int, size: int = 0, ca: bool = False) -> bytes:
+        op = proto.OP_READ_COMPLETE if ca else proto.OP_READ
+        return self.client.call(proto.Operation(op, self.position, idx, subidx))
+
+    def sdo_write(self, idx: int, subidx: int, buf: bytes, ca: bool = False) -> None:
+        op = proto.OP_WRITE_COMPLETE if ca else proto.OP_WRITE
+        self.client.call(proto.Operation(op, self.position, idx, subidx, bytes(buf)))
+
+
+class RemoteMaster:
+    """Minimal ``pysoem.Master`` stand-in talking to the daemon.
+
+    ``send_processdata()`` exchanges the process data of all slaves in one
+    frame; ``receive_processdata()`` makes the new inputs visible.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self.client: Optional[SimClient] = None
+        self.slaves: List[RemoteSlave] = []
+        self.state = INIT_STATE
+        self._inputs: List[bytes] = []
+
+    def open(self, ifname: str = "") -> None:
+        self.client = SimClient(self.path or ifname or None)
+
+    def close(self) -> None:
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+    def _all_slaves_state(self, state: Optional[int] = None) -> int:
+        data = bytes([state]) if state is not None else b""
+        return self.client.call(proto.Operation(proto.OP_STATE, proto.ALL_SLAVES, data=data))[0]
+
+    def config_init(self) -> int:
+        count = struct.unpack("<H", self.client.call(proto.Operation(proto.OP_SLAVE_COUNT, 0)))[0]
+        self.slaves = [RemoteSlave(self.client, pos) for pos in range(count)]
+        self.state = self._all_slaves_state(PREOP_STATE)
+        return count
+
+    def config_map(self) -> int:
+        for pos, slave in enumerate(self.slaves):
+            if slave.config_func is not None:
+                slave.config_func(pos)
+        self.state = self._all_slaves_state(SAFEOP_STATE)
+        return RX_STRUCT.size * len(self.slaves)
+
+    def write_state(self) -> None:
+        self._all_slaves_state(self.state)
+
+    def read_state(self) -> int:
+        self.state = self._all_slaves_state()
+        return self.state
+
+    def state_check(self, expected_state: int, timeout: int = 50000) -> int:
+        return self.read_state()
+
+    def send_processdata(self) -> None:
+        ops = [proto.Operation(proto.OP_PDO, s.position, data=bytes(s.output)) for s in self.slaves]
+        self._inputs = [check(res, op) for res, op in zip(self.client.request(ops), ops)]
+
+    def receive_processdata(self, timeout: int = 2000) -> int:
+        for slave, data in zip(self.slaves, self._inputs):
+            slave.input = data
+        return 3 * len(self._inputs)
+
+
+class RemoteServo(ServoHelpers):
+    """``EthercatServo`` API for a drive served by the ``servo-sim`` daemon.
+
+    Parameters
+    ----------
+    ifname : str
+        Socket path of the daemon; empty selects ``SERVO_SIM_SOCKET`` or
+        ``/tmp/servo-sim.sock``.
+    slave_pos : int
+        Position of the simulated drive.
+    """
+
+    def __init__(self, ifname: str = "", slave_pos: int = 0,
+                 instruments: Optional[Instruments] = None) -> None:
+        self.ifname = socket_path(ifname)
+        self.slave_pos = slave_pos
+        # The daemon's drives run on wall-clock time.
+        self.clock = MonotonicClock()
+        self.instruments = instruments if instruments is not None else from_env()
+        self.client: Optional[SimClient] = None
+        self.slave: Optional[RemoteSlave] = None
+
+    @timed("open")
+    def open(self) -> None:
+        """Connect to the daemon; the shared drive keeps its current state."""
+        self.client = SimClient(self.ifname)
+        count = struct.unpack("<H", self.client.call(proto.Operation(proto.OP_SLAVE_COUNT, 0)))[0]
+        if count <= self.slave_pos:
+            self.close()
+            raise RuntimeError("Not enough slaves found")
+        self.slave = RemoteSlave(self.client, self.slave_pos)
+
+    def close(self) -> None:
+        dump_to_env(self.instruments, f"RemoteServo[{self.slave_pos}]")
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+            self.slave = None
+
+    @timed("sdo_write", by_index=True)
+    def write_sdo(self, idx: int, subidx: int, val: int, size: int = 2) -> None:
+        self.slave.sdo_write(idx, subidx, encode_int(val, size))
+
+    @timed("sdo_read", by_index=True)
+    def read_sdo(self, idx: int, subidx: int, size: int = 2, signed: bool = False) -> int:
+        return decode_int(self.slave.sdo_read(idx, subidx)[:size], signed)
+
+    @timed("read_sdo_many")
+    def read_sdo_many(self, entries) -> SdoSnapshot:
+        """Read all ``entries`` in one request frame."""
+        requests = normalize(entries)
+        ops = [proto.Operation(proto.OP_READ, self.slave_pos, idx, sub) for idx, sub, _, _ in requests]
+        values = {}
+        errors = {}
+        for (idx, sub, size, signed), op, res in zip(requests, ops, self.client.request(ops)):
+            try:
+                values[(idx, sub)] = decode_int(check(res, op)[:size], signed)
+            except RuntimeError as exc:
+                errors[(idx, sub)] = exc
+        return SdoSnapshot(self.clock.time(), values, errors)
+
+    @timed("write_sdo_many")
+    def write_sdo_many(self, entries) -> None:
+        """Write all entries in one request frame; the first failure raises.
+
+        As with the other backends, the entries after a failed one are not
+        written: the daemon stops the batch there.
+        """
+        op = proto.OP_WRITE | proto.STOP_ON_ERROR
+        ops = [proto.Operation(op, self.slave_pos, idx, sub, encode_int(val, size))
+               for idx, sub, val, size in entries]
+        for op, res in zip(ops, self.client.request(ops)):
+            check(res, op)
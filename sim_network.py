@@ -0,0 +1,508 @@
+"""Array-backed simulator of a whole EtherCAT segment.
+
+:class:`ServoSimulator` keeps one object dictionary and one drive model per
+axis and advances each of them in Python, which limits a simulated line to
+a few dozen drives.  :class:`SimulatedNetwork` stores every object of all
+``count`` slaves as structure-of-arrays NumPy columns (one row of a 2-D
+block per object, one element per slave) and advances the drive models of
+all slaves in vectorized steps: profile-position moves, cyclic synchronous
+position and profile velocity are evaluated for every slave at once.
+
+Each slave is still reachable as a :class:`NetworkServo`, a
+:class:`ServoSimulator` whose dictionary and motion state live in the
+network's arrays, so SDO access, the CiA 402 state machine and the helper
+methods behave exactly as with a single simulator.  State machine
+transitions and new set-points are events and stay per slave; only slaves
+whose controlword changed are visited in a cycle.
+
+:class:`NetworkMaster` is a ``pysoem.Master`` stand-in that exchanges the
+process data of all slaves as one structured array per cycle::
+
+    network = SimulatedNetwork(500)
+    master = MultiAxisMaster("sim", master_factory=lambda: NetworkMaster(network))
+
+``python sim_network.py`` measures the cycle time from 1 to 1000 slaves.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import cia402
+from clock import MonotonicClock, VirtualClock
+from object_dictionary import ObjectDictionary, load_dictionary
+from process_data import RXPDO_ENTRIES, TXPDO_ENTRIES
+from servo_simulator import OP_STATE, ServoSimulator, SimulatedMaster, TrapezoidProfile
+
+_STATES = tuple(cia402.STATUS_BITS)
+_STATE_CODES = {state: code for code, state in enumerate(_STATES)}
+_OPERATION_ENABLED = _STATE_CODES[cia402.OPERATION_ENABLED]
+
+# TrapezoidProfile attributes kept per slave while a move runs.
+_MOVE_FIELDS = ("start", "direction", "accel", "decel", "v_peak",
+                "t_accel", "t_cruise", "t_decel", "duration")
+
+
+def _pdo_dtype(entries: Sequence[Tuple[int, int, str]]) -> np.dtype:
+    """Packed record with the layout of :data:`process_data.RX_STRUCT` or ``TX_STRUCT``."""
+    return np.dtype([(_field(idx, sub), "<" + fmt) for idx, sub, fmt in entries])
+
+
+def _field(idx: int, sub: int) -> str:
+    return f"{idx:04X}:{sub}"
+
+
+RX_DTYPE = _pdo_dtype(RXPDO_ENTRIES)
+TX_DTYPE = _pdo_dtype(TXPDO_ENTRIES)
+
+
+def _travel(t: np.ndarray, move: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized ``TrapezoidProfile._travel``: distance and speed at ``t``."""
+    accel, decel, v_peak = move["accel"], move["decel"], move["v_peak"]
+    t_accel, t_cruise = move["t_accel"], move["t_cruise"]
+    t = np.clip(t, 0.0, move["duration"])
+    ta = np.minimum(t, t_accel)
+    tc = np.clip(t - t_accel, 0.0, t_cruise)
+    td = np.clip(t - t_accel - t_cruise, 0.0, move["t_decel"])
+    distance = 0.5 * accel * ta * ta + v_peak * tc + v_peak * td - 0.5 * decel * td * td
+    speed = np.where(t < t_accel, accel * t, np.where(tc < t_cruise, v_peak, v_peak - decel * td))
+    done = t >= move["duration"]
+    return np.where(done, move["distance"], distance), np.where(done, 0.0, speed)
+
+
+class _SlaveDictionary(ObjectDictionary):
+    """One slave's object dictionary, stored in the network's columns.
+
+    Shares the entry tables of the network's template dictionary, so
+    access rights, sizes and abort codes are those of a single simulator.
+    """
+
+    def __init__(self, network: "SimulatedNetwork", position: int) -> None:
+        # The layout comes from the template; only the storage differs.
+        template = network.template
+        self.entries = template.entries
+        self._slots = template._slots
+        self._sizes = template._sizes
+        self._access = template._access
+        self._codecs = template._codecs
+        self._subindices = template._subindices
+        self.network = network
+        self.position = position
+
+    def _bytes(self, slot: int) -> np.ndarray:
+        return self.network._bytes[slot][self.position]
+
+    def reset(self) -> None:
+        self.network._reset(self.position)
+
+    def read(self, idx: int, subidx: int) -> bytes:
+        return self._bytes(self._readable_slot(idx, subidx)).tobytes()
+
+    def write(self, idx: int, subidx: int, buf: bytes, state: int = 0) -> None:
+        slot = self._writable_slot(idx, subidx, len(buf), state)
+        self._bytes(slot)[:] = np.frombuffer(buf, dtype=np.uint8)
+
+    def raw(self, idx: int, subidx: int) -> memoryview:
+        return memoryview(self._bytes(self._slots[(idx, subidx)]))
+
+    def __getitem__(self, key: Tuple[int, int]):
+        slot = self._slots[key]
+        if self._codecs[slot] is not None:
+            return self.network._columns[slot][self.position].item()
+        return self._bytes(slot).tobytes()
+
+    def __setitem__(self, key: Tuple[int, int], val) -> None:
+        slot = self._slots[key]
+        codec = self._codecs[slot]
+        if codec is not None:
+            if codec.format[-1] in "BHIQ":
+                val &= (1 << (8 * codec.size)) - 1
+            codec.pack_into(self._bytes(slot), 0, val)
+        else:
+            size = self._sizes[slot]
+            self._bytes(slot)[:] = np.frombuffer(bytes(val)[:size].ljust(size, b"\x00"), dtype=np.uint8)
+
+
+class NetworkServo(ServoSimulator):
+    """:class:`ServoSimulator` API for slave ``slave_pos`` of a network."""
+
+    def __init__(self, network: "SimulatedNetwork", slave_pos: int) -> None:
+        self.network = network
+        self.position = slave_pos
+        super().__init__(slave_pos=slave_pos, esi_path=network.esi_path,
+                         product_code=network.product_code, clock=network.clock)
+        self.objects = _SlaveDictionary(network, slave_pos)
+
+    def _parse_esi(self) -> None:
+        self.objects.reset()
+
+    def update(self) -> None:
+        self.network.update()
+
+    # Motion state lives in the network's arrays.
+    @property
+    def state(self) -> str:
+        return _STATES[self.network.state[self.position]]
+
+    @state.setter
+    def state(self, state: str) -> None:
+        self.network.state[self.position] = _STATE_CODES[state]
+
+    @property
+    def _position(self) -> float:
+        return float(self.network.position[self.position])
+
+    @_position.setter
+    def _position(self, value: float) -> None:
+        self.network.position[self.position] = value
+
+    @property
+    def _velocity(self) -> float:
+        return float(self.network.velocity[self.position])
+
+    @_velocity.setter
+    def _velocity(self, value: float) -> None:
+        self.network.velocity[self.position] = value
+
+    @property
+    def _move(self) -> Optional[TrapezoidProfile]:
+        return self.network._profiles[self.position] if self.network.moving[self.position] else None
+
+    @_move.setter
+    def _move(self, profile: Optional[TrapezoidProfile]) -> None:
+        self.network._set_move(self.position, profile)
+
+    @property
+    def _move_start(self) -> float:
+        return float(self.network.move["start_time"][self.position])
+
+    @_move_start.setter
+    def _move_start(self, value: float) -> None:
+        self.network.move["start_time"][self.position] = value
+
+    @property
+    def _last_update(self) -> float:
+        return self.network.last_update
+
+    @_last_update.setter
+    def _last_update(self, value: float) -> None:
+        # All slaves advance together; see SimulatedNetwork.update().
+        pass
+
+
+class SimulatedNetwork:
+    """``count`` simulated drives with their state in NumPy arrays.
+
+    Parameters
+    ----------
+    count : int
+        Number of slaves.
+    esi_path : str
+        ESI file describing the drive.
+    product_code : int
+        Device of the ESI to simulate.
+    clock : optional
+        Time source shared by all slaves; defaults to
+        :class:`clock.MonotonicClock`.  Pass a :class:`clock.VirtualClock` to
+        step the network from the caller.
+    """
+
+    def __init__(self, count: int, esi_path: str = "JMC_DRIVE_V1.8.xml",
+                 product_code: int = ServoSimulator.PRODUCT_CODE, clock=None) -> None:
+        self.count = count
+        self.esi_path = esi_path
+        self.product_code = product_code
+        self.clock = clock if clock is not None else MonotonicClock()
+        self.template = load_dictionary(esi_path, product_code)
+        self._build_columns()
+        self.last_update = self.clock.time()
+        self.position = np.zeros(count)
+        self.velocity = np.zeros(count)
+        self.state = np.full(count, _STATE_CODES[cia402.NOT_READY_TO_SWITCH_ON], dtype=np.uint8)
+        self.moving = np.zeros(count, dtype=bool)
+        self.move = {name: np.zeros(count) for name in _MOVE_FIELDS + ("distance", "start_time")}
+        self._profiles: List[Optional[TrapezoidProfile]] = [None] * count
+        self._controlword = self.column(0x6040, 0)
+        self._statusword = self.column(0x6041, 0)
+        self._mode = self.column(0x6060, 0)
+        self._mode_display = self.column(0x6061, 0)
+        self._target_position = self.column(0x607A, 0)
+        self._target_velocity = self.column(0x60FF, 0)
+        self._actual_position = self.column(0x6064, 0)
+        self._actual_velocity = self.column(0x606C, 0)
+        self.slaves = [NetworkServo(self, pos) for pos in range(count)]
+
+    def _build_columns(self) -> None:
+        """Group the objects by type into ``(objects, count)`` blocks."""
+        template = self.template
+        groups: Dict[str, List[int]] = {}
+        self._columns: List[np.ndarray] = [None] * len(template)
+        self._bytes: List[np.ndarray] = [None] * len(template)
+        self._blocks: List[Tuple[np.ndarray, np.ndarray]] = []
+        for slot, entry in enumerate(template.entries):
+            codec = template._codecs[slot]
+            if codec is None:
+                # Strings and domains: one (count, size) byte array each.
+                column = np.zeros((self.count, entry.size), dtype=np.uint8)
+                column[:] = np.frombuffer(template[entry.index, entry.subindex], dtype=np.uint8)
+                self._columns[slot] = self._bytes[slot] = column
+                continue
+            groups.setdefault("<" + codec.format[-1], []).append(slot)
+        for dtype, slots in groups.items():
+            defaults = np.array([template[template.entries[s].index, template.entries[s].subindex]
+                                 for s in slots], dtype=dtype)
+            block = np.repeat(defaults[:, None], self.count, axis=1)
+            self._blocks.append((block, defaults))
+            for row, slot in enumerate(slots):
+                column = block[row]
+                self._columns[slot] = column
+                self._bytes[slot] = column.view(np.uint8).reshape(self.count, column.itemsize)
+        self._byte_defaults = [(col, col[0].copy()) for col in self._columns if col.ndim == 2]
+
+    def _reset(self, position=slice(None)) -> None:
+        """Restore the ESI defaults of slave ``position`` (default: all)."""
+        for block, defaults in self._blocks:
+            if isinstance(position, slice):
+                block[:, position] = defaults[:, None]
+            else:
+                block[:, position] = defaults
+        for column, default in self._byte_defaults:
+            column[position] = default
+
+    def column(self, idx: int, subidx: int) -> np.ndarray:
+        """Values of one object for all slaves, writable and indexed by slave."""
+        return self._columns[self.template._slots[(idx, subidx)]]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, pos: int) -> NetworkServo:
+        return self.slaves[pos]
+
+    def open(self) -> None:
+        """Power up every slave; like opening each of them, but vectorized."""
+        self._reset()
+        for servo in self.slaves:
+            servo._power_on()
+
+    def close(self) -> None:
+        for servo in self.slaves:
+            servo.close()
+
+    def _set_move(self, pos: int, profile: Optional[TrapezoidProfile]) -> None:
+        self._profiles[pos] = profile
+        self.moving[pos] = profile is not None
+        if profile is not None:
+            for name in _MOVE_FIELDS:
+                self.move[name][pos] = getattr(profile, name)
+            self.move["distance"][pos] = abs(profile.target - profile.start)
+
+    def _profile(self, idx: int, default: float, where: np.ndarray) -> np.ndarray:
+        values = self.column(idx, 0)[where].astype(float)
+        values[values == 0] = default
+        return values
+
+    def update(self) -> None:
+        """Advance the drive models of all slaves to the current clock time."""
+        now = self.clock.time()
+        dt = now - self.last_update
+        if dt <= 0.0:
+            return
+        self.last_update = now
+        position, velocity = self.position, self.velocity
+        enabled = self.state == _OPERATION_ENABLED
+        idle = ~self.moving
+        csp = idle & enabled & (self._mode == 8)
+        pv = idle & enabled & (self._mode == 3)
+
+        moving = np.flatnonzero(self.moving)
+        if moving.size:
+            move = {name: values[moving] for name, values in self.move.items()}
+            t = now - move["start_time"]
+            travel, speed = _travel(t, move)
+            position[moving] = move["start"] + move["direction"] * travel
+            velocity[moving] = move["direction"] * speed
+            done = moving[t >= move["duration"]]
+            if done.size:
+                self.moving[done] = False
+                self._statusword[done] |= cia402.SW_TARGET_REACHED
+                for pos in done.tolist():
+                    self._profiles[pos] = None
+
+        index = np.flatnonzero(csp)
+        if index.size:
+            # Cyclic synchronous position: every drive follows its setpoint.
+            target = self._target_position[index].astype(float)
+            velocity[index] = (target - position[index]) / dt
+            position[index] = target
+
+        index = np.flatnonzero(pv)
+        if index.size:
+            target = self._target_velocity[index].astype(float)
+            vel = velocity[index]
+            accel = np.where(
+                target < vel,
+                -self._profile(0x6084, ServoSimulator.DEFAULT_PROFILE_DECELERATION, index),
+                self._profile(0x6083, ServoSimulator.DEFAULT_PROFILE_ACCELERATION, index),
+            )
+            t_ramp = np.minimum(dt, (target - vel) / accel)
+            pos = position[index] + vel * t_ramp + 0.5 * accel * t_ramp ** 2
+            vel = vel + accel * t_ramp
+            ramped = t_ramp < dt
+            position[index] = np.where(ramped, pos + target * (dt - t_ramp), pos)
+            velocity[index] = np.where(ramped, target, vel)
+
+        velocity[idle & ~csp & ~pv] = 0.0
+        if not enabled.all():
+            stopped = ~enabled
+            velocity[stopped] = 0.0
+            if (self.moving & stopped).any():
+                for pos in np.flatnonzero(self.moving & stopped).tolist():
+                    self._profiles[pos] = None
+                self.moving[stopped] = False
+        self._actual_position[:] = np.round(position)
+        self._actual_velocity[:] = np.round(velocity)
+
+    # Process data ----------------------------------------------------------
+    def apply_outputs(self, outputs: np.ndarray) -> None:
+        """Store one :data:`RX_DTYPE` record per slave as a PDO write would."""
+        self.update()
+        for idx, sub, _ in RXPDO_ENTRIES:
+            if (idx, sub) != (0x6040, 0):
+                self.column(idx, sub)[:] = outputs[_field(idx, sub)]
+        # The drive switches modes immediately.
+        self._mode_display[:] = self._mode
+        # Setpoints must be in place before the controlword edge is seen.
+        controlword = outputs[_field(0x6040, 0)]
+        changed = np.flatnonzero(self._controlword != controlword)
+        previous = self._controlword[changed].tolist()
+        self._controlword[:] = controlword
+        for pos, prev in zip(changed.tolist(), previous):
+            self.slaves[pos]._on_controlword(int(controlword[pos]), prev)
+
+    def read_inputs(self) -> np.ndarray:
+        """Current :data:`TX_DTYPE` record of every slave."""
+        self.update()
+        inputs = np.empty(self.count, dtype=TX_DTYPE)
+        for idx, sub, _ in TXPDO_ENTRIES:
+            inputs[_field(idx, sub)] = self.column(idx, sub)
+        return inputs
+
+
+class NetworkMaster(SimulatedMaster):
+    """``pysoem.Master`` stand-in for a :class:`SimulatedNetwork`.
+
+    Each cycle packs the outputs of all slaves into one :data:`RX_DTYPE`
+    array and hands it to :meth:`SimulatedNetwork.apply_outputs`, instead of
+    decoding every slave's outputs separately.
+    """
+
+    def __init__(self, network: SimulatedNetwork) -> None:
+        super().__init__(network.slaves)
+        self.network = network
+
+    def open(self, ifname: str = "") -> None:
+        if not all(servo.opened for servo in self.network.slaves):
+            self.network.open()
+
+    def send_processdata(self) -> None:
+        frame = b"".join(slave.output for slave in self.slaves)
+        self.network.apply_outputs(np.frombuffer(frame, dtype=RX_DTYPE))
+
+    def receive_processdata(self, timeout: int = 2000) -> int:
+        frame = self.network.read_inputs().tobytes()
+        size = TX_DTYPE.itemsize
+        for pos, slave in enumerate(self.slaves):
+            slave.input = frame[pos * size:(pos + 1) * size]
+        return 3 * len(self.slaves)
+
+
+# Benchmark ------------------------------------------------------------------
+
+BENCH_COUNTS = (1, 10, 100, 1000)
+
+
+def _enable_frames(count: int, velocity: int) -> List[np.ndarray]:
+    """Outputs taking every slave to profile velocity mode at ``velocity``."""
+    frames = []
+    for cw in (cia402.CW_SHUTDOWN, cia402.CW_SWITCH_ON, cia402.CW_ENABLE_OPERATION):
+        frame = np.zeros(count, dtype=RX_DTYPE)
+        frame[_field(0x6040, 0)] = cw
+        frame[_field(0x6060, 0)] = 3
+        frame[_field(0x60FF, 0)] = velocity
+        frames.append(frame)
+    return frames
+
+
+def benchmark(count: int, cycles: int = 1000, period: float = 0.001) -> float:
+    """Mean seconds per process-data cycle of ``count`` moving slaves.
+
+    Each cycle advances a virtual clock by ``period``, writes the outputs of
+    all slaves and reads back their inputs through a :class:`NetworkMaster`.
+    """
+    network = SimulatedNetwork(count, clock=VirtualClock())
+    master = NetworkMaster(network)
+    master.open()
+    master.config_init()
+    master.config_map()
+    master.state = OP_STATE
+    master.write_state()
+    frames = _enable_frames(count, 100_000)
+    for frame in frames:
+        for pos, slave in enumerate(master.slaves):
+            slave.output = frame[pos:pos + 1].tobytes()
+        master.send_processdata()
+        master.receive_processdata()
+    assert (network.state == _OPERATION_ENABLED).all()
+    start = time.perf_counter()
+    for _ in range(cycles):
+        network.clock.advance(period)
+        master.send_processdata()
+        master.receive_processdata()
+    return (time.perf_counter() - start) / cycles
+
+
+def benchmark_single(count: int, cycles: int = 200, period: float = 0.001) -> float:
+    """The same cycle with one :class:`ServoSimulator` per slave, for comparison."""
+    clock = VirtualClock()
+    master = SimulatedMaster([ServoSimulator(clock=clock) for _ in range(count)])
+    master.open()
+    master.config_init()
+    master.config_map()
+    for frame in _enable_frames(count, 100_000):
+        for pos, slave in enumerate(master.slaves):
+            slave.output = frame[pos:pos + 1].tobytes()
+        master.send_processdata()
+        master.receive_processdata()
+    start = time.perf_counter()
+    for _ in range(cycles):
+        clock.advance(period)
+        master.send_processdata()
+        master.receive_processdata()
+    return (time.perf_counter() - start) / cycles
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the array-backed network simulator")
+    parser.add_argument("--counts", type=int, nargs="+", default=list(BENCH_COUNTS),
+                        help="slave counts to measure")
+    parser.add_argument("--cycles", type=int, default=1000, help="cycles per measurement")
+    parser.add_argument("--compare-max", type=int, default=100,
+                        help="largest count also run with one ServoSimulator per slave")
+    args = parser.parse_args(argv)
+
+    print(f"{'slaves':>7} {'cycle':>11} {'per slave':>11} {'ServoSimulator':>15}")
+    for count in args.counts:
+        cycle = benchmark(count, args.cycles)
+        single = ""
+        if count <= args.compare_max:
+            single = f"{benchmark_single(count, max(1, args.cycles // 5)) * 1e6:12.1f} us"
+        print(f"{count:7d} {cycle * 1e6:8.1f} us {cycle / count * 1e6:8.2f} us {single:>15}")
+
+
+if __name__ == "__main__":
+    main()
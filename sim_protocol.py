@@ -0,0 +1,112 @@
+"""Binary framing shared by :mod:`sim_server` and :mod:`sim_client`.
+
+Every message is a little-endian ``uint32`` payload length followed by the
+payload.  A request payload is a header and a batch of operations; the
+response carries one result per operation, in the same order::
+
+    request   <I sequence> <H count> count * (<B op> <H slave> <H index>
+                                               <B subindex> <H length> data)
+    response  <I sequence> <H count> count * (<B status> <I abort code>
+                                               <H length> data)
+
+Data is the raw little-endian object value as in an SDO transfer.  An
+aborted SDO returns ``STATUS_ABORT`` with the CoE abort code; any other
+failure returns ``STATUS_ERROR`` with a UTF-8 message as data.  An
+operation whose code carries ``STOP_ON_ERROR`` ends the batch when it fails:
+the operations after it are not executed and return ``STATUS_SKIPPED``.  A request
+that cannot be decoded is answered with a single ``STATUS_ERROR`` result,
+after which the server closes the connection.
+"""
+
+from __future__ import annotations
+
+import struct
+from typing import List, NamedTuple, Tuple
+
+DEFAULT_SOCKET = "/tmp/servo-sim.sock"
+SOCKET_ENV = "SERVO_SIM_SOCKET"
+
+FRAME = struct.Struct("<I")
+HEADER = struct.Struct("<IH")
+OP = struct.Struct("<BHHBH")
+RESULT = struct.Struct("<BIH")
+
+MAX_BATCH = 0xFFFF
+
+# Operations.
+OP_READ = 1             # SDO upload of index:subindex
+OP_WRITE = 2            # SDO download of index:subindex
+OP_READ_COMPLETE = 3    # complete-access upload from subindex on
+OP_WRITE_COMPLETE = 4   # complete-access download from subindex on
+OP_PDO = 5              # apply RxPDO data, return TxPDO data
+OP_SLAVE_COUNT = 6      # number of simulated drives as <H
+OP_STATE = 7            # set the AL state if data is given, return it as <B
+STOP_ON_ERROR = 0x80    # flag: skip the rest of the batch if this operation fails
+
+ALL_SLAVES = 0xFFFF
+
+STATUS_OK = 0
+STATUS_ABORT = 1
+STATUS_ERROR = 2
+STATUS_SKIPPED = 3      # not executed after a failed STOP_ON_ERROR operation
+
+
+class Operation(NamedTuple):
+    op: int
+    slave: int
+    index: int = 0
+    subindex: int = 0
+    data: bytes = b""
+
+
+class Result(NamedTuple):
+    status: int
+    abort_code: int = 0
+    data: bytes = b""
+
+
+def _frame(payload: bytes) -> bytes:
+    return FRAME.pack(len(payload)) + payload
+
+
+def encode_request(sequence: int, operations: List[Operation]) -> bytes:
+    parts = [HEADER.pack(sequence, len(operations))]
+    for op in operations:
+        parts.append(OP.pack(op.op, op.slave, op.index, op.subindex, len(op.data)))
+        parts.append(op.data)
+    return _frame(b"".join(parts))
+
+
+def decode_request(payload: bytes) -> Tuple[int, List[Operation]]:
+    """Raise ``struct.error`` or ``ValueError`` when ``payload`` is malformed."""
+    sequence, count = HEADER.unpack_from(payload)
+    offset = HEADER.size
+    operations = []
+    for _ in range(count):
+        op, slave, index, subindex, length = OP.unpack_from(payload, offset)
+        offset += OP.size
+        if offset + length > len(payload):
+            raise ValueError(f"operation data truncated at byte {offset}")
+        operations.append(Operation(op, slave, index, subindex, bytes(payload[offset:offset + length])))
+        offset += length
+    return sequence, operations
+
+
+def encode_response(sequence: int, results: List[Result]) -> bytes:
+    parts = [HEADER.pack(sequence, len(results))]
+    for res in results:
+        parts.append(RESULT.pack(res.status, res.abort_code, len(res.data)))
+        parts.append(res.data)
+    return _frame(b"".join(parts))
+
+
+def decode_response(payload: bytes) -> Tuple[int, List[Result]]:
+    sequence, count = HEADER.unpack_from(payload)
+    offset = HEADER.size
+    results = []
+    for _ in range(count):
+        status, abort_code, length = RESULT.unpack_from(payload, offset)
+        offset += RESULT.size
+        results.append(Result(status, abort_code, bytes(payload[offset:offset + length])))
+        offset += length
+    return sequence, results
@@ -0,0 +1,178 @@
+"""``servo-sim`` daemon serving simulated drives over a Unix-domain socket.
+
+Run ``python sim_server.py --esi JMC_DRIVE_V1.8.xml --count 2`` and point
+clients at the socket (``--socket``, default ``/tmp/servo-sim.sock``).  Every
+client connection may send batches of SDO and process-data operations framed
+as described in :mod:`sim_protocol`; all connections share the same drives.
+
+The drives are only touched from the event loop thread, so requests from
+different clients are applied one batch at a time and never interleave
+within a batch.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import signal
+import struct
+from typing import List, Optional, Sequence, Set
+
+import sim_protocol as proto
+from object_dictionary import SdoError
+from servo_simulator import OP_STATE, ServoSimulator, SimulatedMaster
+
+
+class SimServer:
+    """Serve ``sims`` on the Unix socket ``path``.
+
+    Parameters
+    ----------
+    sims : sequence of ServoSimulator
+        Drives addressed by slave position.  They are opened on start.
+    path : str
+        Socket path; an existing socket file is replaced.
+    """
+
+    def __init__(self, sims: Sequence[ServoSimulator], path: str = proto.DEFAULT_SOCKET) -> None:
+        self.master = SimulatedMaster(sims)
+        self.path = path
+        self.requests = 0
+        self.operations = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+
+    async def start(self) -> None:
+        self.master.open()
+        self.master.config_init()
+        # Drives start operational so SDO-only clients can use them at once;
+        # clients may change the AL state with OP_STATE.
+        self.master.state = OP_STATE
+        self.master.write_state()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._serve, path=self.path)
+
+    async def run(self) -> None:
+        """Serve until SIGINT or SIGTERM, then remove the socket."""
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await self.start()
+        try:
+            await stop.wait()
+        finally:
+            await self.stop()
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # wait_closed() also waits for connected clients to go away.
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(proto.FRAME.size)
+                    payload = await reader.readexactly(proto.FRAME.unpack(header)[0])
+                except asyncio.IncompleteReadError:
+                    break
+                try:
+                    sequence, operations = proto.decode_request(payload)
+                except (struct.error, ValueError) as exc:
+                    # Bad client input, not a server fault: report and hang up.
+                    writer.write(self._malformed(payload, exc))
+                    await writer.drain()
+                    break
+                writer.write(proto.encode_response(sequence, self.handle(operations)))
+                await writer.drain()
+        except ConnectionResetError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    @staticmethod
+    def _malformed(payload: bytes, exc: Exception) -> bytes:
+        sequence = proto.HEADER.unpack_from(payload)[0] if len(payload) >= proto.HEADER.size else 0
+        message = f"Malformed request: {exc}".encode()
+        return proto.encode_response(sequence, [proto.Result(proto.STATUS_ERROR, 0, message)])
+
+    def handle(self, operations: List[proto.Operation]) -> List[proto.Result]:
+        """Apply a batch of operations in order and return their results."""
+        self.requests += 1
+        self.operations += len(operations)
+        results = []
+        for op in operations:
+            stop_on_error = op.op & proto.STOP_ON_ERROR
+            op = op._replace(op=op.op & ~proto.STOP_ON_ERROR)
+            try:
+                results.append(proto.Result(proto.STATUS_OK, 0, self._apply(op)))
+                continue
+            except SdoError as exc:
+                results.append(proto.Result(proto.STATUS_ABORT, exc.abort_code))
+            except Exception as exc:
+                results.append(proto.Result(proto.STATUS_ERROR, 0, str(exc).encode()))
+            if stop_on_error:
+                # Leave the drive as a backend stopping at this write would.
+                skipped = proto.Result(proto.STATUS_SKIPPED, 0, b"not executed")
+                results.extend([skipped] * (len(operations) - len(results)))
+                break
+        return results
+
+    def _apply(self, op: proto.Operation) -> bytes:
+        slaves = self.master.slaves
+        if op.op == proto.OP_SLAVE_COUNT:
+            return struct.pack("<H", len(slaves))
+        if op.op == proto.OP_STATE and op.slave == proto.ALL_SLAVES:
+            if op.data:
+                self.master.state = op.data[0]
+                self.master.write_state()
+            return bytes([self.master.state])
+        if op.slave >= len(slaves):
+            raise RuntimeError(f"No simulated slave at position {op.slave}")
+        slave = slaves[op.slave]
+        if op.op == proto.OP_READ:
+            return slave.sdo_read(op.index, op.subindex)
+        if op.op == proto.OP_READ_COMPLETE:
+            return slave.sdo_read(op.index, op.subindex, ca=True)
+        if op.op == proto.OP_WRITE:
+            slave.sdo_write(op.index, op.subindex, op.data)
+            return b""
+        if op.op == proto.OP_WRITE_COMPLETE:
+            slave.sdo_write(op.index, op.subindex, op.data, ca=True)
+            return b""
+        if op.op == proto.OP_PDO:
+            return slave.exchange(op.data)
+        if op.op == proto.OP_STATE:
+            if op.data:
+                slave.sim.al_state = op.data[0]
+            return bytes([slave.sim.al_state])
+        raise RuntimeError(f"Unknown operation {op.op}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Simulated EtherCAT servo daemon")
+    parser.add_argument("--esi", default="JMC_DRIVE_V1.8.xml", help="ESI file describing the drive")
+    parser.add_argument("--count", type=int, default=1, help="number of simulated drives")
+    parser.add_argument("--socket", default=os.environ.get(proto.SOCKET_ENV, proto.DEFAULT_SOCKET),
+                        help="Unix socket path")
+    args = parser.parse_args(argv)
+
+    sims = [ServoSimulator(esi_path=args.esi, slave_pos=n) for n in range(args.count)]
+    server = SimServer(sims, args.socket)
+    print(f"servo-sim: {args.count} drive(s) on {args.socket}", flush=True)
+    asyncio.run(server.run())
+
+
+if __name__ == "__main__":
+    main()
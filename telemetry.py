@@ -0,0 +1,255 @@
+"""Telemetry recorder and capture files.
+
+:class:`Recorder` samples a set of objects from an ``EthercatServo`` or
+``ServoSimulator`` into a preallocated NumPy ring buffer.  Every ``chunk``
+samples the completed block is appended to a capture directory with one raw
+file per column::
+
+    capture/
+        meta.json           channel names, objects and dtypes
+        timestamp.f8        float64 seconds from the servo clock
+        actual_position.i4  one file per channel, native little-endian
+
+:class:`Capture` opens such a directory with :func:`numpy.memmap`, so hours of
+1 kHz data can be sliced without reading it all into memory.  The sample count
+is derived from the file sizes, which keeps a capture readable even if the
+recorder was never closed.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+TIME_COLUMN = "timestamp"
+
+# (index, subindex, name, size_in_bytes, signed), same layout as gui.REGISTER_DEFS.
+DEFAULT_CHANNELS = [
+    (0x6064, 0, "actual_position", 4, True),
+    (0x606C, 0, "actual_velocity", 4, True),
+    (0x6041, 0, "statusword", 2, False),
+    (0x60FE, 1, "physical_outputs", 4, False),
+]
+
+
+def channel_dtype(size: int, signed: bool) -> np.dtype:
+    return np.dtype(f"<{'i' if signed else 'u'}{size}")
+
+
+def _column_file(name: str, dtype: np.dtype) -> str:
+    return f"{name}.{dtype.kind}{dtype.itemsize}"
+
+
+class CaptureWriter:
+    """Append column chunks to a capture directory."""
+
+    def __init__(self, path: str, channels: Sequence[Tuple]) -> None:
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        columns = [(TIME_COLUMN, np.dtype("<f8"))]
+        columns += [(name, channel_dtype(size, signed)) for _, _, name, size, signed in channels]
+        meta = {
+            "version": FORMAT_VERSION,
+            "columns": [
+                {"name": name, "dtype": dtype.str, "file": _column_file(name, dtype)}
+                for name, dtype in columns
+            ],
+            "objects": {name: [idx, sub] for idx, sub, name, _, _ in channels},
+        }
+        with open(os.path.join(path, META_FILE), "w") as fh:
+            json.dump(meta, fh, indent=2)
+        self._files = [
+            open(os.path.join(path, _column_file(name, dtype)), "wb") for name, dtype in columns
+        ]
+        self.samples = 0
+
+    def append(self, columns: Sequence[np.ndarray]) -> None:
+        """Append one chunk; ``columns[0]`` holds the timestamps."""
+        for fh, data in zip(self._files, columns):
+            fh.write(memoryview(np.ascontiguousarray(data)))
+        self.samples += len(columns[0])
+
+    def flush(self) -> None:
+        for fh in self._files:
+            fh.flush()
+
+    def close(self) -> None:
+        for fh in self._files:
+            fh.close()
+        self._files = []
+
+
+class Recorder:
+    """Sample ``channels`` from ``servo`` into a ring buffer of ``capacity``.
+
+    Parameters
+    ----------
+    servo
+        Backend providing ``read_sdo_many()`` and ``clock``.
+    channels : sequence
+        ``(index, subindex, name, size, signed)`` tuples.
+    capacity : int
+        Number of samples kept in memory; older samples are overwritten.
+    path : str, optional
+        Capture directory.  When given, every ``chunk`` samples are appended
+        to it, so ``capacity`` must be a multiple of ``chunk``.
+    chunk : int
+        Samples per write to ``path``.
+
+    :meth:`store` and :meth:`latest` may be called from different threads,
+    e.g. an acquisition thread filling the buffer for a GUI.
+    """
+
+    def __init__(self, servo, channels: Sequence[Tuple] = DEFAULT_CHANNELS,
+                 capacity: int = 65536, path: Optional[str] = None, chunk: int = 4096) -> None:
+        if path is not None and capacity % chunk:
+            raise ValueError("capacity must be a multiple of chunk")
+        self.servo = servo
+        self.channels = list(channels)
+        self.names = [name for _, _, name, _, _ in self.channels]
+        self._requests = [(idx, sub, size, signed) for idx, sub, _, size, signed in self.channels]
+        self._keys = [(idx, sub) for idx, sub, _, _, _ in self.channels]
+        self.capacity = capacity
+        self.chunk = chunk
+        self.timestamps = np.zeros(capacity, dtype="<f8")
+        self.columns = [np.zeros(capacity, dtype=channel_dtype(size, signed))
+                        for _, _, _, size, signed in self.channels]
+        self.count = 0
+        self.errors = 0
+        self._flushed = 0
+        self._lock = threading.Lock()
+        self.writer = CaptureWriter(path, self.channels) if path is not None else None
+
+    def sample(self) -> None:
+        """Read all channels once and store them in the next ring slot."""
+        self.store(self.servo.read_sdo_many(self._requests))
+
+    def store(self, snapshot) -> None:
+        """Store an ``SdoSnapshot`` that contains the channels, however it was read."""
+        with self._lock:
+            slot = self.count % self.capacity
+            self.timestamps[slot] = snapshot.timestamp
+            for column, key in zip(self.columns, self._keys):
+                try:
+                    column[slot] = snapshot[key]
+                except KeyError:
+                    column[slot] = 0
+                    self.errors += 1
+            self.count += 1
+        if self.writer is not None and self.count - self._flushed >= self.chunk:
+            self._write(self.chunk)
+
+    def record(self, duration: float, period: float = 0.001,
+               until: Optional[Callable[[], bool]] = None) -> int:
+        """Sample every ``period`` seconds of the servo clock for ``duration``.
+
+        With ``until``, recording stops early after the first sample for
+        which ``until()`` is true.  Returns the number of samples taken.
+        """
+        clock = self.servo.clock
+        start = clock.time()
+        slots = int(round(duration / period))
+        slot = 0
+        taken = 0
+        while slot < slots:
+            self.sample()
+            taken += 1
+            slot += 1
+            if until is not None and until():
+                break
+            now = clock.time()
+            behind = int((now - start) / period) + 1
+            if behind > slot:
+                # Overran; skip the missed slots rather than bursting.
+                slot = behind
+            if slot < slots:
+                clock.sleep(start + slot * period - now)
+        return taken
+
+    def _write(self, n: int) -> None:
+        start = self._flushed % self.capacity
+        stop = start + n
+        self.writer.append([self.timestamps[start:stop]] + [c[start:stop] for c in self.columns])
+        self._flushed += n
+
+    def latest(self, n: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Return copies of the newest ``n`` samples in chronological order."""
+        with self._lock:
+            available = min(self.count, self.capacity)
+            n = available if n is None else min(n, available)
+            idx = np.arange(self.count - n, self.count) % self.capacity
+            data = {TIME_COLUMN: self.timestamps[idx]}
+            for name, column in zip(self.names, self.columns):
+                data[name] = column[idx]
+        return data
+
+    def close(self) -> None:
+        """Write any partial chunk and close the capture."""
+        if self.writer is None:
+            return
+        # Chunks are flushed as soon as they fill and capacity is a multiple
+        # of chunk, so the tail never wraps around the ring.
+        pending = self.count - self._flushed
+        if pending:
+            self._write(pending)
+        self.writer.close()
+        self.writer = None
+
+
+class Capture:
+    """Read-only view of a capture directory backed by memory maps."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as fh:
+            meta = json.load(fh)
+        if meta.get("version") != FORMAT_VERSION:
+            raise RuntimeError(f"Unsupported capture version {meta.get('version')}")
+        self.objects = {name: tuple(obj) for name, obj in meta["objects"].items()}
+        self._columns: Dict[str, np.ndarray] = {}
+        lengths = []
+        for col in meta["columns"]:
+            dtype = np.dtype(col["dtype"])
+            filename = os.path.join(path, col["file"])
+            lengths.append(os.path.getsize(filename) // dtype.itemsize)
+            self._columns[col["name"]] = (filename, dtype)
+        # A capture cut short may have ragged column files; use what all share.
+        self._length = min(lengths)
+        self.names = [col["name"] for col in meta["columns"] if col["name"] != TIME_COLUMN]
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        entry = self._columns[name]
+        if isinstance(entry, tuple):
+            filename, dtype = entry
+            if self._length == 0:
+                entry = np.zeros(0, dtype=dtype)
+            else:
+                entry = np.memmap(filename, dtype=dtype, mode="r", shape=(self._length,))
+            self._columns[name] = entry
+        return entry
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self[TIME_COLUMN]
+
+    def window(self, start: float, stop: float) -> Dict[str, np.ndarray]:
+        """Return the samples with ``start <= timestamp < stop``.
+
+        Timestamps are monotonic, so the bounds are found by binary search and
+        only the selected pages are read from disk.
+        """
+        times = self.timestamps
+        lo, hi = np.searchsorted(times, [start, stop])
+        data = {TIME_COLUMN: times[lo:hi]}
+        for name in self.names:
+            data[name] = self[name][lo:hi]
+        return data
@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _no_home_topology_cache(monkeypatch):
+    """Keep EthercatServo from writing fake drives to ~/.cache/ethercat.
+
+    Tests that exercise the topology cache pass a ``tmp_path`` cache.
+    """
+    monkeypatch.setenv("ECAT_TOPOLOGY_CACHE", "")
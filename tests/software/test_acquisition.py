@@ -0,0 +1,119 @@
+import queue
+import threading
+
+from acquisition import AcquisitionWorker
+from clock import VirtualClock
+from servo_simulator import ServoSimulator
+
+ENTRIES = [(0x6041, 0, 2), (0x6064, 0, 4, True)]
+
+
+def next_event(worker, kind, timeout=2.0):
+    while True:
+        event = worker.events.get(timeout=timeout)
+        if event[0] == kind:
+            return event[1]
+
+
+def test_worker_runs_commands_and_publishes_snapshots():
+    clock = VirtualClock()
+    sim = ServoSimulator(clock=clock)
+    worker = AcquisitionWorker(sim, ENTRIES, period=0.001)
+    worker.start()
+
+    def connect():
+        sim.open()
+        sim.set_mode(1)
+        sim.enable_operation()
+        worker.polling = True
+
+    def move():
+        sim.set_target_position(-2000)
+        sim.start_motion()
+        clock.advance(1.0)
+
+    try:
+        worker.submit(connect, done="Connected")
+        assert next_event(worker, "status") == "Connected"
+        worker.submit(move)
+        while True:
+            snapshot = next_event(worker, "snapshot")
+            if snapshot[(0x6064, 0)] == -2000:
+                break
+        assert snapshot[(0x6041, 0)] & 0x6F == 0x27
+    finally:
+        worker.submit(sim.close)
+        worker.stop()
+
+
+def test_slow_servo_does_not_block_consumer():
+    release = threading.Event()
+
+    class SlowServo:
+        def read_sdo_many(self, entries):
+            release.wait(2.0)
+            return {}
+
+    worker = AcquisitionWorker(SlowServo(), ENTRIES, period=0.001)
+    worker.polling = True
+    worker.start()
+    try:
+        worker.submit(lambda: None, done="queued")
+        # The consumer side never blocks on the drive.
+        try:
+            worker.events.get_nowait()
+        except queue.Empty:
+            pass
+    finally:
+        release.set()
+        worker.stop()
+
+
+def test_errors_are_reported_and_queue_drops_oldest():
+    worker = AcquisitionWorker(None, ENTRIES, max_events=2)
+    worker.start()
+    try:
+        def fail():
+            raise RuntimeError("boom")
+
+        worker.submit(fail)
+        assert next_event(worker, "status") == "Error: boom"
+    finally:
+        worker.stop()
+    for n in range(5):
+        worker.publish("status", str(n))
+    assert [worker.events.get_nowait()[1] for _ in range(2)] == ["3", "4"]
+
+
+def test_gui_close_closes_servo_while_connect_is_queued():
+    import gui
+
+    opened = threading.Event()
+    release = threading.Event()
+
+    class SlowServo(ServoSimulator):
+        closed = False
+
+        def open(self):
+            super().open()
+            opened.set()
+            release.wait(2)
+
+        def close(self):
+            super().close()
+            self.closed = True
+
+    servo = SlowServo(clock=VirtualClock())
+    window = gui.ServoGUI.__new__(gui.ServoGUI)  # no Tk display needed
+    window.servo = servo
+    window.connected = False
+    window.root = type("Root", (), {"destroy": lambda self: None})()
+    window.status_var = type("Var", (), {"set": lambda self, value: None})()
+    window.worker = AcquisitionWorker(servo, ENTRIES)
+    window.worker.start()
+    window.connect()
+    assert opened.wait(2)
+    assert not window.connected
+    threading.Timer(0.1, release.set).start()
+    window.close()
+    assert servo.closed and not window.connected
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+import pytest
+
+from async_servo import AsyncServo
+from clock import VirtualClock
+from servo_simulator import ServoSimulator
+
+
+def test_methods_run_on_io_thread():
+    sim = ServoSimulator(clock=VirtualClock())
+    servo = AsyncServo(sim)
+
+    async def scenario():
+        await servo.open()
+        await servo.set_mode(1)
+        await servo.enable_operation()
+        await servo.set_target_position(-1500)
+        await servo.start_motion()
+        sim.clock.advance(1.0)
+        thread = await servo.call(threading.current_thread)
+        snapshots = []
+        async for snapshot in servo.poll([(0x6064, 0, 4, True)], 0.001):
+            snapshots.append(snapshot)
+            if len(snapshots) == 2:
+                break
+        position = await servo.read_actual_position()
+        await servo.aclose()
+        return thread, snapshots, position
+
+    thread, snapshots, position = asyncio.run(scenario())
+    assert thread is not threading.main_thread()
+    assert thread.name.startswith("servo-io")
+    assert position == -1500
+    assert [s[(0x6064, 0)] for s in snapshots] == [-1500, -1500]
+    assert not sim.opened
+
+
+def test_timeout_and_serialised_calls():
+    release = threading.Event()
+    order = []
+
+    class SlowServo:
+        def block(self):
+            release.wait(2.0)
+            order.append("block")
+
+        def quick(self):
+            order.append("quick")
+            return 42
+
+        def close(self):
+            pass
+
+    servo = AsyncServo(SlowServo())
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await servo.block(timeout=0.01)
+        pending = asyncio.create_task(servo.quick())
+        await asyncio.sleep(0.01)
+        assert not pending.done()
+        release.set()
+        return await pending
+
+    assert asyncio.run(scenario()) == 42
+    assert order == ["block", "quick"]
+    servo.shutdown()
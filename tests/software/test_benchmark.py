@@ -0,0 +1,38 @@
+import json
+
+import benchmark
+
+
+def record(**values):
+    return {
+        "commit": "abc",
+        "results": {
+            name: {"value": value, "unit": "", "better": "higher" if name.endswith("_per_s") else "lower"}
+            for name, value in values.items()
+        },
+    }
+
+
+def test_compare_accounts_for_direction():
+    base = record(open_ms=10.0, sdo_read_per_s=1000.0, gone_ms=1.0)
+    cur = record(open_ms=14.0, sdo_read_per_s=900.0, new_ms=1.0)
+    rows = {name: (change, regressed) for name, _, _, change, regressed in benchmark.compare(cur, base, 0.25)}
+    assert set(rows) == {"open_ms", "sdo_read_per_s"}
+    assert rows["open_ms"][1] and abs(rows["open_ms"][0] - 0.4) < 1e-9
+    assert not rows["sdo_read_per_s"][1]
+
+
+def test_sim_run_is_saved_by_commit_and_checked(tmp_path, capsys):
+    baseline = tmp_path / "baseline.json"
+    assert benchmark.main(["--quick", "--output", str(tmp_path), "--save-baseline", str(baseline)]) == 0
+    saved = json.loads(baseline.read_text())
+    assert (tmp_path / "sim" / f"{saved['commit']}.json").exists()
+    assert {"esi_parse_ms", "sdo_read_per_s", "snapshot_read_per_s",
+            "connect_enable_ms", "demo_main_ms", "network_cycle_1000_us"} <= set(saved["results"])
+
+    # A baseline ten times faster than anything measured must fail the check.
+    for metric in saved["results"].values():
+        metric["value"] *= 10 if metric["better"] == "higher" else 0.1
+    baseline.write_text(json.dumps(saved))
+    assert benchmark.main(["--quick", "--output", str(tmp_path), "--baseline", str(baseline)]) == 1
+    assert "REGRESSION" in capsys.readouterr().out
@@ -27,3 +27,53 @@ def test_self_test_should_pass(device):
 def test_demo_script_reports_position(device):
     pos = asyncio.run(device.run_demo())
     assert pos >= 0
+    # The demo ran in-process on the servo opened by connect().
+    assert device.last_demo.final_position == pos == 10000 * 30
+    assert set(device.last_demo.timings) >= {"enable_operation", "settle"}
+
+
+def test_controllers_connect_concurrently():
+    async def scenario():
+        controllers = [DeviceController(slave_pos=n) for n in range(3)]
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        task = asyncio.create_task(ticker())
+        await asyncio.gather(*(dc.connect() for dc in controllers))
+        results = await asyncio.gather(*(dc.run_self_test() for dc in controllers))
+        statuswords = await asyncio.gather(*(dc.servo.read_statusword() for dc in controllers))
+        task.cancel()
+        for dc in controllers:
+            dc.close()
+        return ticks, results, statuswords
+
+    ticks, results, statuswords = asyncio.run(scenario())
+    assert results == ["OK"] * 3
+    assert all(sw & 0x6F == 0x27 for sw in statuswords)
+    # The event loop kept running while the servos were opened and enabled.
+    assert ticks > 1
+
+
+def test_demo_may_outlast_the_call_timeout(monkeypatch):
+    import time
+
+    import demo
+
+    run = demo.run
+
+    def slow_run(servo, **kwargs):
+        time.sleep(0.2)  # a long move on hardware
+        return run(servo, **kwargs)
+
+    monkeypatch.setattr(demo, "run", slow_run)
+    dc = DeviceController(timeout=0.1)
+    asyncio.run(dc.connect())
+    try:
+        assert asyncio.run(dc.run_demo()) == 10000 * 30
+    finally:
+        dc.close()
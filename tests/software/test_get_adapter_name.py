@@ -0,0 +1,101 @@
+import importlib
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+
+# name -> list of (product code) answering on that adapter; "hang" never returns.
+SEGMENTS = {
+    "eth0": [],
+    "eth1": [0x12345678],
+    "eth2": [0x20190301, 0x20190302],
+    "eth3": "hang",
+    "lo": [0x20190301],
+}
+
+
+def make_master(opened):
+    release = threading.Event()
+
+    class Master:
+        def open(self, name):
+            opened.append(name)
+            self.name = name
+            if SEGMENTS[name] == "hang":
+                release.wait(5)
+                raise RuntimeError("no link")
+
+        def config_init(self):
+            self.slaves = [types.SimpleNamespace(name=b"2DM880-EC", man=0x66668888, id=p, rev=1)
+                           for p in SEGMENTS[self.name]]
+            return len(self.slaves)
+
+        def close(self):
+            pass
+
+    return Master, release
+
+
+def load(monkeypatch, opened):
+    master, release = make_master(opened)
+    adapters = [types.SimpleNamespace(name=n, desc=f"{n} desc") for n in SEGMENTS]
+    stub = types.SimpleNamespace(Master=master, OP_STATE=8, find_adapters=lambda: adapters)
+    monkeypatch.setitem(sys.modules, "pysoem", stub)
+    sys.modules.pop("get_adapter_name", None)
+    return importlib.import_module("get_adapter_name"), release
+
+
+def test_parallel_probe_ranks_known_drives_first(monkeypatch, tmp_path):
+    opened = []
+    mod, release = load(monkeypatch, opened)
+    cache = tmp_path / "adapter.json"
+    start = time.monotonic()
+    probe = mod.find_adapter(timeout=0.3, cache_file=cache)
+    release.set()
+    # One probe window, not one timeout per adapter.
+    assert time.monotonic() - start < 1.0
+    assert probe.name == "eth2"
+    assert [s.product for s in probe.slaves] == [0x20190301, 0x20190302]
+    assert "lo" not in opened
+
+    opened.clear()
+    assert mod.find_adapter(cache_file=cache).name == "eth2"
+    assert opened == ["eth2"]
+
+
+def test_stale_cache_triggers_new_discovery(monkeypatch, tmp_path):
+    opened = []
+    mod, release = load(monkeypatch, opened)
+    release.set()
+    cache = tmp_path / "adapter.json"
+    cache.write_text('{"adapter": "eth1", "slaves": []}')
+    assert mod.find_adapter(timeout=0.3, cache_file=cache).name == "eth2"
+    assert "eth0" in opened
+
+    monkeypatch.setitem(SEGMENTS, "eth2", [])
+    monkeypatch.setitem(SEGMENTS, "eth1", [])
+    with pytest.raises(RuntimeError, match="No adapter"):
+        mod.find_adapter(timeout=0.3, cache_file=cache)
+
+
+def test_configured_adapter_is_returned_without_probing(monkeypatch, tmp_path):
+    opened = []
+    mod, release = load(monkeypatch, opened)
+    release.set()
+    find_adapter = mod.find_adapter
+    monkeypatch.setattr(mod, "find_adapter", lambda use_cache: find_adapter(
+        use_cache, timeout=0.3, cache_file=tmp_path / "adapter.json"))
+    monkeypatch.setenv("ECAT_IFNAME", "eth1")
+    assert mod.get_adapter_name() == "eth1"
+    monkeypatch.delenv("ECAT_IFNAME")
+    monkeypatch.setattr(mod, "IFNAME", "eth0")
+    assert mod.get_adapter_name() == "eth0"
+    assert opened == []
+
+    # Not on this machine: discover the adapter instead.
+    monkeypatch.setattr(mod, "IFNAME", "missing")
+    assert mod.get_adapter_name() == "eth2"
+    assert (tmp_path / "adapter.json").exists()
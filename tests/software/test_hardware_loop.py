@@ -0,0 +1,69 @@
+import hardware_loop as hl
+
+
+def make_tree(root):
+    (root / "tests" / "hardware").mkdir(parents=True)
+    (root / "tests" / "__init__.py").write_text("")
+    (root / "tests" / "hardware" / "__init__.py").write_text("")
+    (root / "pkg").mkdir()
+    (root / "pkg" / "__init__.py").write_text("")
+    (root / "pkg" / "helper.py").write_text("X = 1\n")
+    (root / "servo.py").write_text("import os\nfrom pkg import helper\n")
+    (root / "other.py").write_text("")
+    (root / "tests" / "hardware" / "test_servo.py").write_text(
+        "def test_it():\n    import servo\n")
+    (root / "tests" / "hardware" / "test_other.py").write_text("import other\n")
+    (root / "requirements.txt").write_text("numpy\n")
+
+
+def test_dependencies_follow_lazy_and_transitive_imports(tmp_path):
+    make_tree(tmp_path)
+    deps = hl.dependencies(tmp_path, tmp_path / "tests" / "hardware" / "test_servo.py")
+    rel = {p.relative_to(tmp_path).as_posix() for p in deps}
+    assert rel == {"tests/hardware/test_servo.py", "tests/hardware/__init__.py", "tests/__init__.py",
+                   "servo.py", "pkg/__init__.py", "pkg/helper.py"}
+
+
+def test_only_affected_tests_are_selected(tmp_path):
+    make_tree(tmp_path)
+    cache = hl.ResultCache(tmp_path / "cache" / "results.json")
+    to_run, cached = hl.select_tests(tmp_path, cache)
+    assert len(to_run) == 2 and not cached
+    for test_file, key in to_run.items():
+        cache.put(key, {"sha": "abc", "passed": True})
+
+    cache = hl.ResultCache(tmp_path / "cache" / "results.json")
+    assert hl.select_tests(tmp_path, cache)[0] == {}
+    assert len(hl.select_tests(tmp_path, cache, force=True)[0]) == 2
+
+    (tmp_path / "pkg" / "helper.py").write_text("X = 2\n")
+    to_run, cached = hl.select_tests(tmp_path, cache)
+    assert [p.name for p in to_run] == ["test_servo.py"]
+    assert [p.name for p in cached] == ["test_other.py"]
+
+    (tmp_path / "requirements.txt").write_text("numpy>=2\n")
+    assert len(hl.select_tests(tmp_path, cache)[0]) == 2
+
+
+def test_failed_results_are_rerun(tmp_path):
+    make_tree(tmp_path)
+    cache = hl.ResultCache(tmp_path / "cache" / "results.json")
+    to_run, _ = hl.select_tests(tmp_path, cache)
+    for test_file, key in to_run.items():
+        cache.put(key, {"sha": "abc", "passed": test_file.name == "test_other.py"})
+    to_run, cached = hl.select_tests(tmp_path, cache)
+    assert [p.name for p in to_run] == ["test_servo.py"]
+    assert [p.name for p in cached] == ["test_other.py"]
+
+
+def test_junit_outcomes_per_file(tmp_path):
+    make_tree(tmp_path)
+    files = sorted((tmp_path / "tests" / "hardware").glob("test_*.py"))
+    report = tmp_path / "junit.xml"
+    report.write_text(
+        '<testsuites><testsuite>'
+        '<testcase classname="tests.hardware.test_servo" name="test_it"><failure/></testcase>'
+        '<testcase classname="tests.hardware.test_other.TestX" name="test_ok"/>'
+        '</testsuite></testsuites>')
+    outcomes = hl.junit_outcomes(tmp_path, report, files)
+    assert {p.name: ok for p, ok in outcomes.items()} == {"test_other.py": True, "test_servo.py": False}
@@ -0,0 +1,60 @@
+import pytest
+
+from clock import VirtualClock
+from instrumentation import LATENCY_LOG_ENV, Instruments, LatencyHistogram
+from object_dictionary import SdoError
+from servo_simulator import ServoSimulator
+
+
+def test_histogram_percentiles():
+    hist = LatencyHistogram()
+    for ns in range(1, 1001):
+        hist.add(ns * 1000)
+    hist.add(5_000_000, error=True)
+    summary = hist.summary()
+    assert summary["count"] == 1001
+    assert summary["errors"] == 1
+    assert summary["max_us"] == 5000.0
+    # Buckets are within 12.5 % of the true value.
+    assert 500 <= summary["p50_us"] <= 500 * 1.125
+    assert 990 <= summary["p99_us"] <= 990 * 1.125
+
+
+def test_simulator_records_operations_per_index():
+    instruments = Instruments()
+    sim = ServoSimulator(clock=VirtualClock(), instruments=instruments)
+    sim.open()
+    sim.set_mode(1)
+    sim.enable_operation()
+    sim.read_actual_position()
+    with pytest.raises(SdoError):
+        sim.write_sdo(0x6041, 0, 0)
+
+    stats = instruments.snapshot()
+    for key in ("open", "set_mode", "enable_operation", "sdo_read", "sdo_write"):
+        assert stats[key]["count"] >= 1
+    assert stats["sdo_read[0x6064]"]["count"] == 1
+    assert stats["sdo_write[0x6041]"] == dict(stats["sdo_write[0x6041]"], count=1, errors=1)
+    assert stats["sdo_read"]["p99_us"] <= stats["sdo_read"]["max_us"]
+
+    line = next(l for l in instruments.dump("sim").splitlines() if "op=sdo_read[0x6064]" in l)
+    assert line.startswith("latency label=sim op=sdo_read[0x6064] count=1 errors=0 p50_us=")
+
+    instruments.reset()
+    assert instruments.snapshot() == {}
+
+
+def test_disabled_by_default_and_env_dump(tmp_path, monkeypatch):
+    sim = ServoSimulator(clock=VirtualClock())
+    assert sim.instruments is None
+    sim.open()
+    sim.read_actual_position()
+    sim.close()
+
+    log = tmp_path / "latency.txt"
+    monkeypatch.setenv(LATENCY_LOG_ENV, str(log))
+    sim = ServoSimulator(clock=VirtualClock())
+    sim.open()
+    sim.read_actual_position()
+    sim.close()
+    assert "label=ServoSimulator op=sdo_read[0x6064] count=1" in log.read_text()
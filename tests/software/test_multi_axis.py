@@ -0,0 +1,64 @@
+import importlib
+import sys
+import types
+
+import pytest
+
+from clock import VirtualClock
+from servo_simulator import ServoSimulator, SimulatedMaster
+
+
+@pytest.fixture
+def multi_axis(monkeypatch):
+    """Import multi_axis with a stubbed pysoem module."""
+    for name in ("multi_axis", "ethercat_servo"):
+        sys.modules.pop(name, None)
+    pysoem_stub = types.SimpleNamespace()
+    pysoem_stub.Master = type("Master", (), {})
+    pysoem_stub.OP_STATE = 8
+    monkeypatch.setitem(sys.modules, "pysoem", pysoem_stub)
+    return importlib.import_module("multi_axis")
+
+
+def test_axes_share_one_cycle(multi_axis):
+    clock = VirtualClock()
+    sims = [ServoSimulator(clock=clock) for _ in range(3)]
+    master = multi_axis.MultiAxisMaster(
+        "sim", cycle_time=0.001, master_factory=lambda: SimulatedMaster(sims)
+    )
+    master.open()
+    try:
+        assert len(master) == 3
+        for n, axis in enumerate(master):
+            axis.set_mode(1)
+            axis.enable_operation()
+            axis.set_target_position(-1000 * (n + 1))
+            axis.start_motion()
+        assert master.pdo_loop.wait_cycles(2)
+        clock.advance(1.0)
+        assert master.pdo_loop.wait_cycles(2)
+        assert [axis.read_actual_position() for axis in master] == [-1000, -2000, -3000]
+        assert master.pdo_loop.wkc == 9
+    finally:
+        master.close()
+    assert not any(sim.opened for sim in sims)
+
+
+def test_subset_of_slaves(multi_axis):
+    master = multi_axis.MultiAxisMaster(
+        "sim", slave_positions=[1], master_factory=lambda: SimulatedMaster(count=2)
+    )
+    master.open()
+    try:
+        assert list(master.axes) == [1]
+        assert master.axis(1).slave_pos == 1
+    finally:
+        master.close()
+
+
+def test_missing_slave_raises(multi_axis):
+    master = multi_axis.MultiAxisMaster(
+        "sim", slave_positions=[4], master_factory=lambda: SimulatedMaster(count=2)
+    )
+    with pytest.raises(RuntimeError):
+        master.open()
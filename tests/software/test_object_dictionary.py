@@ -0,0 +1,130 @@
+import pytest
+
+import object_dictionary
+from object_dictionary import SdoError, decode_int, encode_int
+
+ESI = """<?xml version="1.0" encoding="utf-8"?>
+<EtherCATInfo>
+  <Descriptions><Devices><Device>
+    <Type ProductCode="#x1234" RevisionNo="#x1">TestDrive</Type>
+    <Profile><Dictionary>
+    <DataTypes>
+      <DataType>
+        <Name>DT60FE</Name>
+        <BitSize>48</BitSize>
+        <SubItem>
+          <SubIdx>0</SubIdx><Name>SubIndex 000</Name><Type>USINT</Type><BitSize>8</BitSize>
+          <Flags><Access>ro</Access></Flags>
+        </SubItem>
+        <SubItem>
+          <SubIdx>1</SubIdx><Name>physical_outputs</Name><Type>UDINT</Type><BitSize>32</BitSize>
+          <Flags><Access>rw</Access></Flags>
+        </SubItem>
+      </DataType>
+    </DataTypes>
+    <Objects>
+    <Object>
+      <Index>#x6040</Index><Name>controlword</Name><Type>UINT</Type><BitSize>16</BitSize>
+      <Info><DefaultData>{cw}</DefaultData></Info>
+      <Flags><Access>rw</Access></Flags>
+    </Object>
+    <Object>
+      <Index>#x6064</Index><Name>actual_position</Name><Type>DINT</Type><BitSize>32</BitSize>
+      <Info><DefaultData>FFFFFFFF</DefaultData></Info>
+      <Flags><Access>ro</Access></Flags>
+    </Object>
+    <Object>
+      <Index>#x60FE</Index><Name>digital_outputs</Name><Type>DT60FE</Type><BitSize>48</BitSize>
+      <Info>
+        <SubItem><Name>SubIndex 000</Name><Info><DefaultData>01</DefaultData></Info></SubItem>
+        <SubItem><Name>physical_outputs</Name><Info><DefaultData>01000000</DefaultData></Info></SubItem>
+      </Info>
+    </Object>
+  </Objects></Dictionary></Profile></Device></Devices></Descriptions>
+</EtherCATInfo>
+"""
+
+
+def write_esi(path, cw="0000"):
+    path.write_text(ESI.format(cw=cw))
+    return str(path)
+
+
+def test_codecs_round_trip():
+    assert encode_int(-5000, 4) == (-5000).to_bytes(4, "little", signed=True)
+    assert encode_int(0x789A, 2) == b"\x9a\x78"
+    assert decode_int(encode_int(-5000, 4), signed=True) == -5000
+    assert decode_int(b"\x01\x02\x03") == 0x030201
+
+
+def test_typed_entries(tmp_path):
+    esi = write_esi(tmp_path / "drive.xml")
+    od = object_dictionary.load_dictionary(esi)
+    assert od.entry(0x6064, 0).data_type == "DINT"
+    assert od[(0x6064, 0)] == -1
+    assert od[(0x60FE, 1)] == 1
+    assert od.read(0x60FE, 1) == b"\x01\x00\x00\x00"
+
+
+def test_sdo_checks(tmp_path):
+    od = object_dictionary.load_dictionary(write_esi(tmp_path / "drive.xml"))
+    with pytest.raises(SdoError) as err:
+        od.write(0x6064, 0, b"\x00\x00\x00\x00")
+    assert err.value.abort_code == object_dictionary.ABORT_WRITE_READ_ONLY
+    with pytest.raises(SdoError) as err:
+        od.write(0x6040, 0, b"\x00")
+    assert err.value.abort_code == object_dictionary.ABORT_LENGTH_MISMATCH
+    with pytest.raises(SdoError) as err:
+        od.read(0x6040, 5)
+    assert err.value.abort_code == object_dictionary.ABORT_NO_SUBINDEX
+    with pytest.raises(SdoError) as err:
+        od.read(0x2000, 0)
+    assert err.value.abort_code == object_dictionary.ABORT_NO_OBJECT
+
+
+def test_full_drive_dictionary():
+    od = object_dictionary.load_dictionary("JMC_DRIVE_V1.8.xml", 0x2019A301)
+    assert len(od) > 1000
+    assert od[(0x1018, 2)] == 0x2019A301
+    assert od.entry(0x6060, 0).data_type == "SINT"
+    assert od.entry(0x1C12, 1).size == 2
+
+
+def test_cache_is_written_and_reused(tmp_path, monkeypatch):
+    esi = write_esi(tmp_path / "drive.xml")
+    first = object_dictionary.load_cached_devices(esi)
+    assert (tmp_path / "drive.xml.odcache").exists()
+
+    def fail(path):
+        raise AssertionError("ESI parsed although the cache is valid")
+
+    monkeypatch.setattr(object_dictionary, "parse_esi", fail)
+    assert object_dictionary.load_cached_devices(esi) == first
+
+
+def test_cache_invalidated_when_esi_changes(tmp_path):
+    esi = write_esi(tmp_path / "drive.xml")
+    object_dictionary.load_cached_devices(esi)
+    write_esi(tmp_path / "drive.xml", cw="0600")
+    od = object_dictionary.ObjectDictionary(object_dictionary.load_cached_devices(esi)[0x1234][2])
+    assert od[(0x6040, 0)] == 6
+
+
+def test_corrupt_cache_is_rebuilt(tmp_path):
+    esi = write_esi(tmp_path / "drive.xml")
+    (tmp_path / "drive.xml.odcache").write_bytes(b"garbage")
+    assert 0x1234 in object_dictionary.load_cached_devices(esi)
+
+
+def test_cache_round_trips_long_defaults_and_non_ascii_names(tmp_path):
+    from object_dictionary import ACCESS_READ, Entry, read_cache, write_cache
+
+    entries = [
+        Entry(0x1008, 0, "Gerätename " + "ä" * 200, "VISIBLE_STRING", 300 * 8, ACCESS_READ,
+              b"x" * 300),
+        Entry(0x6041, 0, "statusword", "UINT", 16, ACCESS_READ, b"\x00\x00"),
+    ]
+    devices = {0x1234: (1, "Antrieb µ" * 40, entries)}
+    path = str(tmp_path / "drive.xml.odcache")
+    write_cache(path, b"\x01" * 32, devices)
+    assert read_cache(path, b"\x01" * 32) == devices
@@ -0,0 +1,66 @@
+import pytest
+
+from parameters import ObjectCache, ParameterSet, download, drive_dictionary
+from servo_simulator import ServoSimulator
+
+
+@pytest.fixture
+def drive():
+    sim = ServoSimulator()
+    sim.open()
+    cache = ObjectCache(sim)
+    return sim, cache, drive_dictionary(cache, "JMC_DRIVE_V1.8.xml")
+
+
+def test_validation_reports_every_problem(drive):
+    _, _, dictionary = drive
+    with pytest.raises(RuntimeError) as exc:
+        ParameterSet(dictionary, {(0x7FFF, 0): 1, (0x6041, 0): 0, (0x6083, 0): -1, (0x6081, 0): 5})
+    message = str(exc.value)
+    assert "0x7FFF:0: no such object" in message
+    assert "0x6041:0" in message and "read-only" in message
+    assert "0x6083:0" in message and "outside" in message
+    assert "0x6081" not in message
+
+
+def test_only_changed_entries_are_written(drive, tmp_path, monkeypatch):
+    sim, cache, dictionary = drive
+    path = tmp_path / "params.json"
+    path.write_text('{"0x6081": 200000, "0x6083:0": 500000, "0x6084:0": 1000000}')
+    params = ParameterSet.from_file(str(path), dictionary)
+    sim.write_sdo(0x6084, 0, 1000000, size=4)
+
+    batches = []
+    write_sdo_many = sim.write_sdo_many
+    monkeypatch.setattr(sim, "write_sdo_many", lambda entries: (batches.append(list(entries)),
+                                                                write_sdo_many(entries)))
+    result = download(sim, params, cache)
+    assert sorted(result.written) == [(0x6081, 0), (0x6083, 0)]
+    assert result.unchanged == [(0x6084, 0)]
+    assert len(batches) == 1
+    assert sim.read_sdo(0x6083, 0, size=4) == 500000
+
+    reads = cache.reads
+    assert download(sim, params, cache).written == []
+    assert cache.reads == reads + 1
+    assert download(sim, params, cache, fresh=False).written == []
+    assert cache.reads == reads + 1
+
+    params.save(str(path))
+    assert ParameterSet.from_file(str(path), dictionary).values == params.values
+
+
+def test_cache_keeps_constants_and_drops_failed_writes(drive, monkeypatch):
+    sim, cache, _ = drive
+    reads = cache.reads
+    cache.read_many([(0x1018, 1, 4, False), (0x6081, 0, 4, False)], fresh=True)
+    cache.read_many([(0x1018, 1, 4, False)], fresh=True)
+    cache.read_many([(0x1018, 2, 4, False)], fresh=True)
+    assert cache.reads == reads + 1
+
+    cache.write_many([(0x6081, 0, 123, 4)])
+    assert cache.values[(0x6081, 0)] == 123
+    with pytest.raises(RuntimeError):
+        cache.write_many([(0x6081, 0, 456, 4), (0x6041, 0, 0, 2)])
+    assert (0x6081, 0) not in cache.values
+    assert cache.read(0x6081, 0) == 456
@@ -0,0 +1,125 @@
+import sys
+import types
+
+import pytest
+
+
+@pytest.fixture
+def servo_module(monkeypatch):
+    """Import ethercat_servo with a stubbed pysoem module."""
+    monkeypatch.delitem(sys.modules, "ethercat_servo", raising=False)
+    pysoem_stub = types.SimpleNamespace(Master=type("Master", (), {}), OP_STATE=8)
+    monkeypatch.setitem(sys.modules, "pysoem", pysoem_stub)
+    import ethercat_servo
+    return ethercat_servo
+
+
+def record_demo(servo_module, monkeypatch, path, target=10000):
+    import demo
+    from clock import VirtualClock
+    from servo_simulator import ServoSimulator, SimulatedMaster
+
+    clock = VirtualClock()
+    sim = ServoSimulator(clock=clock)
+    monkeypatch.setenv("ECAT_TRAFFIC_LOG", str(path))
+    servo = servo_module.EthercatServo("eth0", master_factory=lambda: SimulatedMaster([sim]),
+                                       clock=clock)
+    servo.open()
+    try:
+        result = demo.run(servo, target=target)
+    finally:
+        servo.close()
+    monkeypatch.delenv("ECAT_TRAFFIC_LOG")
+    return result
+
+
+def test_replay_reproduces_recorded_demo(servo_module, monkeypatch, tmp_path):
+    import demo
+    import replay
+
+    log = tmp_path / "demo.ectl"
+    recorded = record_demo(servo_module, monkeypatch, log)
+    records = replay.read_log(log)
+    assert records[0].kind == replay.SCAN and records[0].index == 1
+    assert any(r.kind == replay.SDO_WRITE and r.index == 0x607A for r in records)
+
+    servo = replay.replay_servo(str(log), strict=True)
+    servo.open()
+    try:
+        result = demo.run(servo)
+    finally:
+        servo.close()
+    assert result.final_position == recorded.final_position
+    assert servo.replay.finished
+    assert servo.replay.divergences == []
+    # The replay follows the recorded timeline on its own virtual clock.
+    assert servo.clock.time() >= records[-1].time
+
+
+def test_replay_detects_changed_command(servo_module, monkeypatch, tmp_path):
+    import demo
+    import replay
+
+    log = tmp_path / "demo.ectl"
+    record_demo(servo_module, monkeypatch, log)
+
+    servo = replay.replay_servo(str(log), strict=True)
+    servo.open()
+    with pytest.raises(replay.ReplayDivergence, match="0x607A"):
+        demo.run(servo, target=20000)
+
+    lenient = replay.replay_servo(str(log))
+    lenient.open()
+    demo.run(lenient, target=20000)
+    assert [d.expected.index for d in lenient.replay.divergences] == [0x607A]
+
+
+def test_recorded_aborts_are_replayed_and_truncated_logs_read(servo_module, monkeypatch, tmp_path):
+    import replay
+    from object_dictionary import SdoError
+    from servo_simulator import ServoSimulator, SimulatedMaster
+
+    log = tmp_path / "abort.ectl"
+    master = replay.RecordingMaster(SimulatedMaster([ServoSimulator()]), replay.TrafficLog(str(log)))
+    master.open()
+    master.config_init()
+    with pytest.raises(SdoError):
+        master.slaves[0].sdo_read(0x2FFF, 0)
+    master.close()
+
+    with open(log, "ab") as f:
+        f.write(replay.RECORD.pack(replay.SDO_READ, 0, 1.0, 0x6041, 0, 0, 2)[:-3])
+    player = replay.ReplayMaster(str(log))
+    assert player.config_init() == 1
+    with pytest.raises(SdoError) as excinfo:
+        player.slaves[0].sdo_read(0x2FFF, 0)
+    assert excinfo.value.abort_code != 0
+    assert player.finished
+
+
+def test_process_data_replay_follows_commands(servo_module, monkeypatch, tmp_path):
+    import demo
+    import replay
+    from servo_simulator import ServoSimulator, SimulatedMaster
+
+    log = tmp_path / "pdo.ectl"
+    sim = ServoSimulator()
+    monkeypatch.setenv("ECAT_TRAFFIC_LOG", str(log))
+    servo = servo_module.EthercatServo("eth0", cycle_time=0.001,
+                                       master_factory=lambda: SimulatedMaster([sim]))
+    servo.open()
+    try:
+        recorded = demo.run(servo, target=3000)
+    finally:
+        servo.close()
+    monkeypatch.delenv("ECAT_TRAFFIC_LOG")
+
+    # Faster cycles than recorded: inputs still wait for the servo's commands.
+    player = replay.replay_servo(str(log), cycle_time=0.0002)
+    player.open()
+    try:
+        result = demo.run(player, target=3000)
+    finally:
+        player.close()
+    assert result.final_position == recorded.final_position
+    assert player.replay.divergences == []
@@ -0,0 +1,53 @@
+import gzip
+import json
+import time
+import zlib
+
+import run_hw_tests
+
+
+def test_log_and_events_are_streamed(tmp_path):
+    test_file = tmp_path / "test_sample.py"
+    test_file.write_text(
+        "import pytest\n"
+        "def test_ok():\n    print('hello from the drive')\n"
+        "def test_bad():\n    assert False\n"
+        "@pytest.mark.skip\ndef test_skipped():\n    pass\n")
+    log, events = run_hw_tests.run_tests([str(test_file)], output_dir=tmp_path, echo=False)
+
+    assert log.suffix == ".gz"
+    text = gzip.open(log, "rt").read()
+    assert "hello from the drive" in text
+    assert "returncode=1" in text.splitlines()[-1]
+
+    records = [json.loads(line) for line in events.read_text().splitlines()]
+    outcomes = {r["test"].rsplit("::", 1)[1]: r["outcome"] for r in records}
+    assert outcomes == {"test_ok": "passed", "test_bad": "failed", "test_skipped": "skipped"}
+    assert all(r["duration"] >= 0 for r in records)
+
+
+def test_plain_log(tmp_path):
+    writer = run_hw_tests.LogWriter(tmp_path / "x.log", compress=False)
+    writer.write("line\n")
+    # Line buffered: visible before close.
+    assert (tmp_path / "x.log").read_text() == "line\n"
+    writer.close()
+
+
+def test_compressed_log_is_flushed_without_further_writes(tmp_path):
+    path = tmp_path / "x.log.gz"
+    writer = run_hw_tests.LogWriter(path, flush_interval=0.05)
+    try:
+        writer.write("last line before a long quiet stretch\n")
+        deadline = time.monotonic() + 2.0
+        text = b""
+        while time.monotonic() < deadline:
+            # Decompress what is on disk so far, as zcat would.
+            text = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(path.read_bytes())
+            if text:
+                break
+            time.sleep(0.01)
+        assert text == b"last line before a long quiet stretch\n"
+    finally:
+        writer.close()
+    assert gzip.decompress(path.read_bytes()) == b"last line before a long quiet stretch\n"
@@ -0,0 +1,65 @@
+import time
+
+import numpy as np
+
+import scope
+from acquisition import AcquisitionWorker
+from clock import VirtualClock
+from sdo_batch import SdoSnapshot
+from servo_simulator import ServoSimulator
+from telemetry import TIME_COLUMN, Recorder
+
+
+def test_decimate_keeps_extremes_of_each_column():
+    times = np.arange(10000) * 1e-4  # 10 kHz for one second
+    values = np.sin(times * 2 * np.pi * 3) * 1000
+    values[1234] = 5000  # a one-sample spike
+    mins, maxs = scope.decimate(times, values, 0.0, 1.0, 100)
+    for column in (0, 12, 57, 99):
+        chunk = values[column * 100:(column + 1) * 100]
+        assert mins[column] == chunk.min() and maxs[column] == chunk.max()
+    assert maxs.max() == 5000
+
+    # The drawn output depends on the width only, not on the sample rate.
+    dense = np.arange(1_000_000) * 1e-6
+    coords = scope.envelope(*scope.decimate(dense, dense, 0.0, 1.0, 100), 0, 1, 100, 1)
+    assert len(coords) == 4 * 100
+
+
+def test_decimate_leaves_gaps_empty():
+    times = np.array([0.1, 0.2, 0.8])
+    mins, maxs = scope.decimate(times, np.array([1.0, 2.0, 3.0]), 0.0, 1.0, 10)
+    assert np.flatnonzero(~np.isnan(mins)).tolist() == [1, 2, 8]
+    assert scope.decimate(times, times, 2.0, 3.0, 10)[0].size == 10
+
+
+def test_worker_fills_scope_buffer_and_exports_window(tmp_path):
+    clock = VirtualClock()
+    sim = ServoSimulator(clock=clock)
+    recorder = Recorder(sim, scope.SCOPE_CHANNELS, capacity=8)
+    entries = [(idx, sub, size, signed) for idx, sub, _, size, signed in scope.SCOPE_CHANNELS]
+    seen = []
+    worker = AcquisitionWorker(sim, entries, period=0.001,
+                               on_snapshot=lambda s: (recorder.store(s), seen.append(s)))
+    sim.open()
+    worker.polling = True
+    worker.start()
+    try:
+        deadline = time.monotonic() + 2.0
+        while recorder.count < 3 and time.monotonic() < deadline:
+            time.sleep(0.001)
+    finally:
+        worker.stop()
+    assert recorder.count == len(seen) >= 3
+
+    for n in range(20):
+        recorder.store(SdoSnapshot(float(n), {(0x6064, 0): -n, (0x607A, 0): 5, (0x6041, 0): 0x1400}, {}))
+    data = recorder.latest()
+    assert data[TIME_COLUMN].tolist() == [float(n) for n in range(12, 20)]
+    assert scope.bit(data, 10).tolist() == [1] * 8
+
+    path = tmp_path / "scope.csv"
+    assert scope.write_csv(str(path), scope.window(data, 15.0, 18.0)) == 3
+    lines = path.read_text().splitlines()
+    assert lines[0] == "timestamp,actual_position,target_position,statusword"
+    assert lines[1] == "15.0,-15,5,5120"
@@ -47,15 +47,28 @@ def test_read_sdo(monkeypatch):
     assert val == 0x1234
 
 
+def sim_slave():
+    from servo_simulator import ServoSimulator, SimulatedMaster
+
+    sim = ServoSimulator()
+    master = SimulatedMaster([sim])
+    master.open()
+    master.config_init()
+    return sim, master.slaves[0]
+
+
 def test_enable_operation(monkeypatch):
     mod = get_servo_module(monkeypatch)
+    sim, slave = sim_slave()
     servo = mod.EthercatServo(ifname='eth0')
+    servo.slave = slave
 
     calls = []
-    def fake_write_sdo(idx, subidx, val, size=2):
+    write_sdo = servo.write_sdo
+    def recording_write_sdo(idx, subidx, val, size=2):
         calls.append((idx, subidx, val, size))
-    monkeypatch.setattr(servo, 'write_sdo', fake_write_sdo)
-    monkeypatch.setattr(mod.time, 'sleep', lambda x: None)
+        write_sdo(idx, subidx, val, size)
+    monkeypatch.setattr(servo, 'write_sdo', recording_write_sdo)
 
     servo.enable_operation()
 
@@ -65,3 +78,259 @@ def test_enable_operation(monkeypatch):
         (mod.EthercatServo.CONTROL_WORD, 0, 0x0F, 2),
     ]
     assert calls == expected
+    assert sim.state == "operation enabled"
+
+
+def test_enable_operation_resets_fault(monkeypatch):
+    mod = get_servo_module(monkeypatch)
+    sim, slave = sim_slave()
+    servo = mod.EthercatServo(ifname='eth0')
+    servo.slave = slave
+
+    sim.inject_fault()
+    servo.enable_operation()
+    assert sim.state == "operation enabled"
+    assert sim.read_sdo(0x603F, 0) == 0
+
+
+def test_enable_operation_times_out(monkeypatch):
+    from cia402 import DriveStateError
+
+    mod = get_servo_module(monkeypatch)
+    sim, slave = sim_slave()
+    servo = mod.EthercatServo(ifname='eth0')
+    servo.slave = slave
+    # A drive that ignores the controlword stays in "switch on disabled".
+    monkeypatch.setattr(sim, '_on_controlword', lambda cw, previous: None)
+
+    with pytest.raises(DriveStateError):
+        servo.enable_operation(timeout=0.01)
+
+
+def test_set_mode_waits_for_display(monkeypatch):
+    mod = get_servo_module(monkeypatch)
+    sim, slave = sim_slave()
+    servo = mod.EthercatServo(ifname='eth0')
+    servo.slave = slave
+
+    servo.set_mode(3)
+    assert sim.read_sdo(0x6061, 0, size=1) == 3
+
+
+class FakePdoSlave:
+    def __init__(self):
+        self.sdo_writes = []
+        self.output = b""
+        self.input = b""
+        self.config_func = None
+
+    def sdo_write(self, idx, subidx, buf):
+        self.sdo_writes.append((idx, subidx, buf))
+
+    def sdo_read(self, idx, subidx):
+        raise AssertionError("unexpected SDO read in cyclic mode")
+
+
+class FakePdoMaster:
+    def __init__(self, op_state):
+        self.slaves = [FakePdoSlave()]
+        self.state = 0
+        self.op_state = op_state
+        self.sent = []
+        self.closed = False
+
+    def open(self, ifname):
+        pass
+
+    def config_init(self):
+        return len(self.slaves)
+
+    def config_map(self):
+        slave = self.slaves[0]
+        if slave.config_func:
+            slave.config_func(0)
+
+    def write_state(self):
+        pass
+
+    def state_check(self, state, timeout):
+        return self.state
+
+    def send_processdata(self):
+        self.sent.append(self.slaves[0].output)
+
+    def receive_processdata(self, timeout):
+        from process_data import TX_STRUCT
+        self.slaves[0].input = TX_STRUCT.pack(0x1237, 1, -1234, 0)
+        return 3
+
+    def close(self):
+        self.closed = True
+
+
+def test_cyclic_mode_uses_process_image(monkeypatch):
+    mod = get_servo_module(monkeypatch)
+    from process_data import RX_STRUCT, RXPDO_INDEX
+
+    master = FakePdoMaster(mod.pysoem.OP_STATE)
+    monkeypatch.setattr(mod.pysoem, "Master", lambda: master, raising=False)
+    monkeypatch.setattr(mod.time, "sleep", lambda x: None)
+
+    servo = mod.EthercatServo(ifname="eth0", cycle_time=0.001, watchdog_period=0.001)
+    master.state = mod.pysoem.OP_STATE
+    servo.open()
+    try:
+        assert servo.watchdog.pdo_loop is servo.pdo_loop
+        # PDO mapping was written during config_map()
+        mapped = [(i, s) for i, s, _ in master.slaves[0].sdo_writes if i == RXPDO_INDEX]
+        assert (RXPDO_INDEX, 1) in mapped
+
+        servo.set_mode(1)
+        servo.set_target_position(-5000)
+        servo.start_motion()
+        assert servo.pdo_loop.wait_cycles(2)
+        assert RX_STRUCT.unpack(master.sent[-1]) == (0x3F, 1, -5000, 0)
+        assert servo.read_actual_position() == -1234
+        cycles = servo.pdo_loop.cycles
+        servo.wait_until(lambda: servo.pdo_loop.cycles >= cycles + 3, timeout=1.0)
+        # Full working counter: the watchdog never needs to read AL states.
+        servo.wait_until(lambda: servo.watchdog.checks > 3, timeout=1.0)
+        assert servo.watchdog.state_reads == 0
+    finally:
+        servo.close()
+    assert servo.watchdog is None
+    assert master.closed
+
+
+def test_failed_exchange_is_surfaced_and_loop_keeps_cycling(monkeypatch):
+    mod = get_servo_module(monkeypatch)
+
+    master = FakePdoMaster(mod.pysoem.OP_STATE)
+    receive = master.receive_processdata
+    failing = [True]
+
+    def flaky_receive(timeout):
+        if failing[0]:
+            raise OSError("link down")
+        return receive(timeout)
+
+    master.receive_processdata = flaky_receive
+    servo = mod.EthercatServo(ifname="eth0", cycle_time=0.001, master_factory=lambda: master)
+    master.state = mod.pysoem.OP_STATE
+    servo.open()
+    try:
+        loop = servo.pdo_loop
+        assert not loop.wait_cycles(1, timeout=1.0)
+        assert loop.errors > 0 and loop.wkc == 0
+        with pytest.raises(RuntimeError, match="link down"):
+            servo.read_statusword()
+        failing[0] = False
+        assert loop.wait_cycles(2)
+        assert loop.error is None
+        assert servo.read_actual_position() == -1234
+    finally:
+        servo.close()
+
+
+def test_negative_values_match_simulator(monkeypatch):
+    mod = get_servo_module(monkeypatch)
+    sim, slave = sim_slave()
+
+    servo = mod.EthercatServo(ifname="eth0")
+    servo.slave = slave
+    servo.set_target_position(-5000)
+    assert sim.objects.read(0x607A, 0) == (-5000).to_bytes(4, "little", signed=True)
+    assert servo.read_sdo(0x607A, 0, size=4, signed=True) == -5000
+    assert sim.read_sdo(0x607A, 0, size=4, signed=True) == -5000
+
+
+def test_read_sdo_many_uses_complete_access(monkeypatch):
+    mod = get_servo_module(monkeypatch)
+    sim, slave = sim_slave()
+    servo = mod.EthercatServo(ifname="eth0")
+    servo.slave = slave
+    sim.write_sdo(0x60FE, 1, 0x5, size=4)
+    sim.write_sdo(0x607A, 0, -20, size=4)
+
+    reads = []
+    sdo_read = slave.sdo_read
+    def recording_sdo_read(idx, subidx, size=0, ca=False):
+        reads.append((idx, subidx, ca))
+        return sdo_read(idx, subidx, size, ca)
+    monkeypatch.setattr(slave, "sdo_read", recording_sdo_read)
+
+    snapshot = servo.read_sdo_many([
+        (0x60FE, 1, 4),
+        (0x60FE, 2, 4),
+        (0x607A, 0, 4, True),
+        (0x2FFF, 0, 2),
+    ])
+    assert snapshot[(0x60FE, 1)] == 0x5
+    assert snapshot[(0x607A, 0)] == -20
+    assert (0x2FFF, 0) in snapshot.errors
+    assert reads == [(0x60FE, 1, True), (0x607A, 0, False), (0x2FFF, 0, False)]
+
+
+def test_split_complete_access_rejects_mismatched_sizes():
+    from sdo_batch import split_complete_access
+
+    group = [(0x60FE, 1, 4, False), (0x60FE, 2, 4, False)]
+    buf = (5).to_bytes(4, "little") + (7).to_bytes(4, "little")
+    assert split_complete_access(buf, group) == {(0x60FE, 1): 5, (0x60FE, 2): 7}
+    with pytest.raises(RuntimeError, match="expected 8"):
+        split_complete_access(buf[:6], group)
+    with pytest.raises(RuntimeError, match="expected 6"):
+        split_complete_access(buf, [(0x60FE, 1, 2, False), (0x60FE, 2, 4, False)])
+
+
+def test_write_sdo_many(monkeypatch):
+    mod = get_servo_module(monkeypatch)
+    sim, slave = sim_slave()
+    servo = mod.EthercatServo(ifname="eth0")
+    servo.slave = slave
+
+    servo.write_sdo_many([(0x607A, 0, -7, 4), (0x60FF, 0, 300, 4)])
+    snapshot = sim.read_sdo_many([(0x607A, 0, 4, True), (0x60FF, 0, 4, True)])
+    assert dict(snapshot) == {(0x607A, 0): -7, (0x60FF, 0): 300}
+
+
+def test_reconnect_reuses_pdo_mapping_left_in_drive(monkeypatch, tmp_path):
+    mod = get_servo_module(monkeypatch)
+    import topology
+    from process_data import RXPDO_INDEX
+    from servo_simulator import ServoSimulator, SimulatedMaster
+
+    sim = ServoSimulator()
+    parse_esi = sim._parse_esi
+    # The drive keeps its object dictionary while the master reconnects.
+    monkeypatch.setattr(sim, "_parse_esi", lambda: sim.objects or parse_esi())
+    monkeypatch.setattr(mod.pysoem, "Master", lambda: SimulatedMaster([sim]), raising=False)
+    cache = topology.TopologyCache(tmp_path / "topology.json")
+
+    writes = []
+    download = sim.download
+    def recording_download(idx, sub, data, check=True):
+        writes.append(idx)
+        download(idx, sub, data, check)
+    monkeypatch.setattr(sim, "download", recording_download)
+
+    def reconnect():
+        writes.clear()
+        servo = mod.EthercatServo("eth0", cycle_time=0.001, topology_cache=cache)
+        servo.open()
+        servo.close()
+        return servo.warm_start
+
+    assert not reconnect()
+    assert RXPDO_INDEX in writes
+    assert reconnect()
+    assert RXPDO_INDEX not in writes
+
+    # Power cycle: the drive lost its mapping, so it is written again.
+    monkeypatch.setattr(sim, "_parse_esi", parse_esi)
+    assert not reconnect()
+    assert RXPDO_INDEX in writes
+
+    # A different drive at the same position is never trusted.
+    cache.store("eth0", 0, topology.SlaveIdentity(1, 2, 3, 4))
+    assert not reconnect()
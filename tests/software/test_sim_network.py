@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+import cia402
+from clock import VirtualClock
+from object_dictionary import SdoError
+from servo_simulator import ServoSimulator, SimulatedMaster
+from sim_network import NetworkMaster, RX_DTYPE, SimulatedNetwork, _enable_frames, benchmark
+
+
+def feedback(servo):
+    return (servo.read_actual_position(), servo.read_sdo(0x606C, 0, size=4, signed=True),
+            servo.read_statusword())
+
+
+def test_network_slave_behaves_like_simulator():
+    network = SimulatedNetwork(3, clock=VirtualClock())
+    network.open()
+    single = ServoSimulator(clock=VirtualClock())
+    single.open()
+    view = network[1]
+
+    for servo in (view, single):
+        servo.set_mode(1)
+        servo.enable_operation()
+        servo.set_target_position(-40000)
+        servo.start_motion()
+    for _ in range(60):
+        network.clock.advance(0.005)
+        single.clock.advance(0.005)
+        assert feedback(view) == feedback(single)
+    for servo in (view, single):
+        servo.wait_for_target_reached()
+        servo.set_mode(3)
+        servo.set_target_velocity(250000)
+    for _ in range(20):
+        network.clock.advance(0.01)
+        single.clock.advance(0.01)
+        assert feedback(view) == feedback(single)
+
+    # The other slaves were neither enabled nor moved.
+    assert network[0].state == network[2].state == cia402.SWITCH_ON_DISABLED
+    assert network.column(0x6064, 0).tolist()[::2] == [0, 0]
+    with pytest.raises(SdoError) as excinfo:
+        view.write_sdo(0x6041, 0, 0)
+    with pytest.raises(SdoError) as expected:
+        single.write_sdo(0x6041, 0, 0)
+    assert excinfo.value.abort_code == expected.value.abort_code
+
+
+def test_process_data_matches_per_slave_simulators():
+    count = 5
+    network = SimulatedNetwork(count, clock=VirtualClock())
+    clock = VirtualClock()
+    masters = [NetworkMaster(network),
+               SimulatedMaster([ServoSimulator(clock=clock) for _ in range(count)])]
+    clocks = [network.clock, clock]
+    for master in masters:
+        master.open()
+        master.config_init()
+        master.config_map()
+
+    velocities = np.arange(count) * 20000 - 40000
+    frames = _enable_frames(count, 0)
+    for frame in frames:
+        frame["60FF:0"] = velocities
+    for step in range(60):
+        frame = frames[min(step, len(frames) - 1)]
+        inputs = []
+        for master, clk in zip(masters, clocks):
+            clk.advance(0.001)
+            for pos, slave in enumerate(master.slaves):
+                slave.output = frame[pos:pos + 1].tobytes()
+            master.send_processdata()
+            assert master.receive_processdata() == 3 * count
+            inputs.append([slave.input for slave in master.slaves])
+        assert inputs[0] == inputs[1]
+    assert np.all(network.column(0x6041, 0) & 0x6F == 0x27)
+    assert network.column(0x606C, 0).tolist() == velocities.tolist()
+    assert RX_DTYPE.itemsize == 11
+
+
+def test_benchmark_enables_every_slave():
+    assert benchmark(50, cycles=10) > 0
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+
+import pytest
+
+import demo
+import sim_protocol as proto
+from object_dictionary import ABORT_WRITE_READ_ONLY, SdoError
+from process_data import ProcessDataLoop, ProcessImage, configure_pdo_mapping
+from servo_simulator import OP_STATE, ServoSimulator
+from sim_client import RemoteMaster, RemoteServo
+from sim_server import SimServer
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / "servo-sim.sock")
+    srv = SimServer([ServoSimulator(slave_pos=n) for n in range(2)], path)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(srv.start())
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert started.wait(5)
+    yield srv
+    asyncio.run_coroutine_threadsafe(srv.stop(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+def test_protocol_round_trip():
+    ops = [proto.Operation(proto.OP_WRITE, 1, 0x607A, 0, b"\x01\x02\x03\x04"),
+           proto.Operation(proto.OP_READ, 0, 0x6041, 0)]
+    frame = proto.encode_request(7, ops)
+    assert proto.FRAME.unpack_from(frame)[0] == len(frame) - proto.FRAME.size
+    assert proto.decode_request(frame[proto.FRAME.size:]) == (7, ops)
+    results = [proto.Result(proto.STATUS_OK), proto.Result(proto.STATUS_ABORT, 0x06010002)]
+    assert proto.decode_response(proto.encode_response(7, results)[proto.FRAME.size:]) == (7, results)
+
+
+def test_clients_share_one_drive(server):
+    first = RemoteServo(server.path, slave_pos=1)
+    second = RemoteServo(server.path, slave_pos=1)
+    first.open()
+    second.open()
+    try:
+        result = demo.run(first, target=-10, gear_ratio=1)
+        assert result.timings["enable_operation"] >= 0
+        assert second.read_statusword() & 0x6F == 0x27
+        assert second.read_sdo(0x607A, 0, size=4, signed=True) == -10
+
+        before = server.requests
+        snapshot = second.read_sdo_many([(0x6041, 0, 2), (0x607A, 0, 4, True), (0x7FFF, 0, 2)])
+        assert server.requests == before + 1
+        assert snapshot[(0x607A, 0)] == -10
+        assert (0x7FFF, 0) in snapshot.errors
+
+        with pytest.raises(SdoError) as exc:
+            second.write_sdo(0x6041, 0, 0)
+        assert exc.value.abort_code == ABORT_WRITE_READ_ONLY
+    finally:
+        first.close()
+        second.close()
+
+
+def test_backends_share_the_helper_methods():
+    from servo_helpers import ServoHelpers
+
+    for name in ("set_mode", "enable_operation", "start_motion", "wait_for_target_reached"):
+        assert getattr(RemoteServo, name) is getattr(ServoSimulator, name) is getattr(ServoHelpers, name)
+
+
+def test_failed_batch_write_leaves_later_entries_unwritten(server):
+    remote = RemoteServo(server.path)
+    remote.open()
+    local = ServoSimulator()
+    local.open()
+    batch = [(0x6041, 0, 1, 2), (0x607A, 0, 1234, 4)]
+    try:
+        for servo in (local, remote):
+            with pytest.raises(SdoError):
+                servo.write_sdo_many(batch)
+            assert servo.read_sdo(0x607A, 0, size=4, signed=True) == 0
+    finally:
+        remote.close()
+        local.close()
+
+
+def test_missing_slave_and_daemon(server, tmp_path):
+    with pytest.raises(RuntimeError, match="Not enough slaves"):
+        RemoteServo(server.path, slave_pos=5).open()
+    with pytest.raises(RuntimeError, match="not reachable"):
+        RemoteServo(str(tmp_path / "missing.sock")).open()
+
+
+def test_malformed_request_gets_error_and_connection_closes(server):
+    import socket
+
+    op = proto.OP.pack(proto.OP_WRITE, 0, 0x607A, 0, 4) + b"\x01"  # 3 data bytes missing
+    payload = proto.HEADER.pack(9, 1) + op
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(server.path)
+        sock.sendall(proto.FRAME.pack(len(payload)) + payload)
+        reply = b""
+        while chunk := sock.recv(4096):
+            reply += chunk
+    sequence, results = proto.decode_response(reply[proto.FRAME.size:])
+    assert sequence == 9
+    assert [r.status for r in results] == [proto.STATUS_ERROR]
+    assert b"Malformed request" in results[0].data
+    # The daemon keeps serving other clients.
+    servo = RemoteServo(server.path)
+    servo.open()
+    try:
+        servo.read_statusword()
+    finally:
+        servo.close()
+
+
+def test_process_data_for_all_slaves_in_one_frame(server):
+    master = RemoteMaster(server.path)
+    master.open()
+    try:
+        assert master.config_init() == 2
+        for slave in master.slaves:
+            slave.config_func = lambda pos: configure_pdo_mapping(master.slaves[pos])
+        master.config_map()
+        loop = ProcessDataLoop(master)
+        images = [ProcessImage() for _ in master.slaves]
+        for slave, image in zip(master.slaves, images):
+            loop.add(slave, image)
+        loop.exchange()
+        master.state = OP_STATE
+        master.write_state()
+        assert master.read_state() == OP_STATE
+
+        images[0].set_output(0x6060, 0, 3)
+        before = server.requests
+        assert loop.exchange() == 6
+        assert server.requests == before + 1
+        assert images[0].get_input(0x6061, 0) == 3
+        assert images[1].get_input(0x6061, 0) != 3
+    finally:
+        master.close()
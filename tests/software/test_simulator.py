@@ -0,0 +1,116 @@
+import pytest
+
+from clock import VirtualClock
+from servo_simulator import ServoSimulator, TrapezoidProfile
+
+
+@pytest.fixture
+def sim():
+    clock = VirtualClock()
+    servo = ServoSimulator(clock=clock)
+    servo.open()
+    yield servo
+    servo.close()
+
+
+def test_trapezoid_reaches_target():
+    move = TrapezoidProfile(0, 300_000, 500_000, 1_000_000, 1_000_000)
+    assert move.t_cruise == pytest.approx(0.1)
+    assert move.duration == pytest.approx(1.1)
+    assert move.position(0.5) == pytest.approx(125_000)
+    assert move.position(move.duration) == 300_000
+    assert move.velocity(0.55) == pytest.approx(500_000)
+
+
+def test_short_move_is_triangular():
+    move = TrapezoidProfile(1000, 0, 500_000, 1_000_000, 1_000_000)
+    assert move.v_peak < 500_000
+    assert move.position(move.t_accel) == pytest.approx(500)
+
+
+def test_profile_position_move_runs_on_virtual_clock(sim):
+    sim.set_mode(1)
+    sim.enable_operation()
+    sim.set_target_position(300_000)
+    sim.start_motion()
+
+    sim.clock.advance(0.5)
+    mid = sim.read_actual_position()
+    assert 0 < mid < 300_000
+    assert sim.read_sdo(0x606C, 0, size=4, signed=True) == 500_000
+
+    sim.clock.advance(2.0)
+    assert sim.read_actual_position() == 300_000
+    assert sim.read_sdo(0x606C, 0, size=4, signed=True) == 0
+
+
+def test_profile_velocity_ramp(sim):
+    sim.set_mode(3)
+    sim.enable_operation()
+    sim.set_target_velocity(-100_000)
+
+    sim.clock.advance(0.05)
+    assert sim.read_sdo(0x606C, 0, size=4, signed=True) == -50_000
+    sim.clock.advance(1.0)
+    assert sim.read_sdo(0x606C, 0, size=4, signed=True) == -100_000
+    assert sim.read_actual_position() == pytest.approx(-100_000 * 1.05 + 0.5 * 100_000 * 0.1, abs=1)
+
+
+def test_statusword_follows_controlword(sim):
+    import cia402
+
+    assert cia402.decode_state(sim.read_statusword()) == cia402.SWITCH_ON_DISABLED
+    for cw, state in ((0x06, cia402.READY_TO_SWITCH_ON),
+                      (0x07, cia402.SWITCHED_ON),
+                      (0x0F, cia402.OPERATION_ENABLED),
+                      (0x0B, cia402.QUICK_STOP_ACTIVE),
+                      (0x00, cia402.SWITCH_ON_DISABLED)):
+        sim.write_controlword(cw)
+        assert cia402.decode_state(sim.read_statusword()) == state
+
+
+def test_fault_blocks_motion_until_reset(sim):
+    import cia402
+
+    sim.set_mode(1)
+    sim.enable_operation()
+    sim.inject_fault(0x7500)
+    assert cia402.decode_state(sim.read_statusword()) == cia402.FAULT
+    sim.set_target_position(1000)
+    sim.start_motion()
+    sim.clock.advance(1.0)
+    assert sim.read_actual_position() == 0
+
+    sim.enable_operation()
+    assert sim.read_sdo(0x603F, 0) == 0
+    sim.start_motion()
+    sim.clock.advance(1.0)
+    assert sim.read_actual_position() == 1000
+
+
+def test_setpoint_handshake_and_target_reached(sim):
+    import cia402
+
+    sim.set_mode(1)
+    sim.enable_operation()
+    assert sim.read_statusword() & cia402.SW_TARGET_REACHED
+    for target in (300_000, 0):
+        sim.set_target_position(target)
+        sim.start_motion()
+        status = sim.read_statusword()
+        assert status & cia402.SW_SETPOINT_ACK
+        assert not status & cia402.SW_TARGET_REACHED
+        motion = sim.wait_for_target_reached(timeout=5.0)
+        # Adaptive polling detects the end of the 1.1 s move within 10 ms.
+        assert 1.1 <= motion.settle_time < 1.11
+        assert sim.read_actual_position() == target
+        assert not sim.read_statusword() & cia402.SW_SETPOINT_ACK
+
+
+def test_wait_until_times_out(sim):
+    import cia402
+
+    start = sim.clock.time()
+    assert sim.wait_until(lambda: sim.clock.time() >= start + 0.5, timeout=1.0) >= 0.5
+    with pytest.raises(cia402.DriveStateError):
+        sim.wait_until(lambda: False, timeout=0.2)
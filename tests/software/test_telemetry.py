@@ -0,0 +1,57 @@
+import numpy as np
+
+from clock import VirtualClock
+from servo_simulator import ServoSimulator
+from telemetry import Capture, Recorder
+
+
+def moving_sim():
+    sim = ServoSimulator(clock=VirtualClock())
+    sim.open()
+    sim.set_mode(1)
+    sim.enable_operation()
+    sim.set_target_position(-5000)
+    sim.start_motion()
+    return sim
+
+
+def test_ring_buffer_keeps_latest_samples():
+    sim = moving_sim()
+    recorder = Recorder(sim, capacity=8)
+    assert recorder.record(0.02, period=0.001) == 20
+    latest = recorder.latest()
+    assert len(latest["timestamp"]) == 8
+    assert np.all(np.diff(latest["timestamp"]) > 0)
+    assert latest["actual_position"].dtype == np.int32
+    assert latest["actual_position"][-1] == sim.read_actual_position()
+    assert latest["actual_position"][-1] < 0
+
+
+def test_capture_round_trip(tmp_path):
+    sim = moving_sim()
+    path = tmp_path / "capture"
+    recorder = Recorder(sim, capacity=64, chunk=16, path=str(path))
+    recorder.record(1.0, period=0.001)
+    tail = recorder.latest(10)
+    recorder.close()
+
+    capture = Capture(str(path))
+    assert len(capture) == 1000
+    assert isinstance(capture["actual_position"], np.memmap)
+    assert capture.objects["statusword"] == (0x6041, 0)
+    np.testing.assert_array_equal(capture["actual_position"][-10:], tail["actual_position"])
+    assert capture["actual_position"][-1] == -5000
+
+    window = capture.window(0.1, 0.2)
+    assert len(window["timestamp"]) == 100
+    assert window["timestamp"][0] >= 0.1
+
+
+def test_unclosed_capture_is_readable(tmp_path):
+    sim = moving_sim()
+    path = tmp_path / "capture"
+    recorder = Recorder(sim, capacity=32, chunk=16, path=str(path))
+    recorder.record(0.04, period=0.001)
+    recorder.writer.flush()
+    # Only completed chunks have been written.
+    assert len(Capture(str(path))) == 32
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from clock import VirtualClock
+from servo_simulator import ServoSimulator
+from trajectory import CSP_MODE, Trajectory, scurve_phases, stream_csp
+
+
+@pytest.mark.parametrize("distance", [100.0, 0.5, 0.01, -3.0])
+def test_scurve_respects_limits(distance):
+    traj = Trajectory([0.0, distance], v_max=10.0, a_max=20.0, j_max=200.0)
+    t = np.linspace(0.0, traj.duration, 20001)
+    pos, vel, acc = traj.sample(t)
+    assert pos[0] == 0.0
+    assert pos[-1] == pytest.approx(distance, abs=1e-9)
+    assert np.abs(vel).max() <= 10.0 + 1e-9
+    assert np.abs(acc).max() <= 20.0 + 1e-9
+    jerk = np.diff(acc) / np.diff(t)
+    assert np.abs(jerk).max() <= 200.0 * (1 + 1e-6)
+    assert abs(vel[-1]) < 1e-9 and abs(acc[-1]) < 1e-9
+    # Monotonic travel towards the target.
+    assert np.all(np.sign(distance) * np.diff(pos) >= -1e-12)
+
+
+def test_short_move_skips_cruise():
+    phases = scurve_phases(0.01, v_max=10.0, a_max=20.0, j_max=200.0)
+    assert phases[3][0] == 0.0
+
+
+def test_chunks_are_lazy_and_consistent():
+    traj = Trajectory([0.0, 10.0, -5.0], v_max=5.0, a_max=10.0, j_max=100.0,
+                      gear_ratio=30, dwell=0.1)
+    chunks = traj.chunks(0.001, chunk=256)
+    first = next(chunks)
+    assert len(first) == 256 and first.dtype == np.int64
+    points = np.concatenate([first] + list(chunks))
+    assert len(points) == traj.cycles(0.001)
+    expected = np.rint(traj.sample(np.arange(len(points)) * 0.001)[0] * 30)
+    np.testing.assert_array_equal(points, expected)
+    assert points[-1] == -150
+    assert list(traj.setpoints(0.001, chunk=100)) == points.tolist()
+
+
+def test_stream_csp_to_simulator():
+    sim = ServoSimulator(clock=VirtualClock())
+    sim.open()
+    sim.set_mode(CSP_MODE)
+    sim.enable_operation()
+    traj = Trajectory([0.0, 2.0], v_max=4.0, a_max=20.0, j_max=200.0, gear_ratio=1000)
+    seen = []
+    original = sim.set_target_position
+
+    def record(sp):
+        original(sp)
+        seen.append(sim.read_actual_position())
+
+    sim.set_target_position = record
+    sent = stream_csp(sim, traj.setpoints(0.001), 0.001)
+    assert sent == traj.cycles(0.001)
+    assert sim.read_actual_position() == 2000
+    # The drive follows every setpoint one cycle later.
+    assert seen[1:] == list(traj.setpoints(0.001))[:-1]
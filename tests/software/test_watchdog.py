@@ -0,0 +1,115 @@
+import types
+
+from instrumentation import Instruments
+from watchdog import (INIT_STATE, NONE_STATE, OP_STATE, SAFEOP_STATE, STATE_ERROR,
+                      LinkWatchdog)
+
+
+class FakeSlave:
+    """pysoem slave stand-in: ``state`` is what the master last read."""
+
+    def __init__(self):
+        self.actual = OP_STATE
+        self.linked = True
+        self.state = OP_STATE
+        self.calls = []
+
+    def write_state(self):
+        self.calls.append(("write_state", self.state))
+        if self.linked:
+            self.actual = self.state & 0x0F
+
+    def reconfig(self, timeout):
+        self.calls.append(("reconfig",))
+        if self.linked:
+            self.actual = SAFEOP_STATE
+        return self.linked
+
+    def recover(self, timeout):
+        self.calls.append(("recover",))
+        return self.linked
+
+    def state_check(self, expected, timeout):
+        self.state = self.actual if self.linked else NONE_STATE
+        return self.state
+
+
+class FakeMaster:
+    def __init__(self, count):
+        self.slaves = [FakeSlave() for _ in range(count)]
+        self.expected_wkc = 3 * count
+
+    def read_state(self):
+        for slave in self.slaves:
+            slave.state = slave.actual if slave.linked else NONE_STATE
+        return min(s.state for s in self.slaves)
+
+    def wkc(self):
+        return sum(3 for s in self.slaves if s.linked and s.actual == OP_STATE)
+
+
+def supervise(count=2):
+    master = FakeMaster(count)
+    loop = types.SimpleNamespace(wkc=master.wkc())
+    events = []
+    dog = LinkWatchdog(master, loop, instruments=Instruments(),
+                       on_change=lambda pos, state: events.append((pos, state)))
+
+    def cycle(now):
+        loop.wkc = master.wkc()
+        return dog.check(now)
+
+    return master, dog, cycle, events
+
+
+def test_healthy_bus_costs_no_frames():
+    master, dog, cycle, _ = supervise()
+    assert not any(cycle(t) for t in range(10))
+    assert dog.state_reads == 0 and dog.healthy
+
+
+def test_safeop_error_is_acknowledged_for_that_slave_only():
+    master, dog, cycle, events = supervise()
+    master.slaves[1].actual = SAFEOP_STATE + STATE_ERROR
+    steps = 0
+    while True:
+        cycle(float(steps))
+        steps += 1
+        if dog.healthy:
+            break
+    assert steps <= 3
+    assert master.slaves[0].calls == []
+    assert master.slaves[1].calls == [("write_state", SAFEOP_STATE + 0x10), ("write_state", OP_STATE)]
+    assert events == [(1, SAFEOP_STATE + STATE_ERROR), (1, OP_STATE)]
+    (recovery,) = dog.recoveries
+    assert recovery.position == 1 and recovery.duration == 2.0 and not recovery.lost
+    assert dog.instruments.snapshot()["link_recovery[0x0001]"]["count"] == 1
+
+
+def test_lost_slave_is_recovered_after_replug():
+    master, dog, cycle, events = supervise()
+    slave = master.slaves[0]
+    slave.linked = False
+    for t in range(3):
+        cycle(float(t))
+    assert dog.lost == {0} and not dog.healthy
+    assert ("recover",) in slave.calls
+
+    slave.linked = True
+    slave.actual = INIT_STATE  # power-on state after a replug
+    for t in range(3, 10):
+        cycle(float(t))
+        if dog.healthy:
+            break
+    assert slave.actual == OP_STATE
+    assert ("reconfig",) in slave.calls
+    assert dog.recoveries[-1].lost
+    assert master.slaves[1].calls == []
+
+
+def test_without_process_data_states_are_read_periodically():
+    master = FakeMaster(1)
+    dog = LinkWatchdog(master, state_interval=0.1)
+    assert dog.check(0.0)
+    assert not dog.check(0.05)
+    assert dog.check(0.1)
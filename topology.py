@@ -0,0 +1,140 @@
+"""Persisted slave identities and PDO mappings for warm reconnects.
+
+Writing the PDO mapping of :mod:`process_data` costs eighteen mailbox
+round trips per drive and is repeated by every ``EthercatServo.open()``.
+The drive keeps that mapping until it is power cycled, so after a process
+restart or a cable blip it is usually still in place.
+
+:class:`TopologyCache` remembers, per adapter and slave position, the
+identity (vendor, product, revision, serial number) of the drive that was
+configured and the mapping that was written.  On reconnect the mapping
+download is skipped when the drive at that position has the same identity,
+the cached mapping is the one this code would write and a read-back of the
+mapping objects confirms the drive still holds it.  Anything else falls
+back to the full configuration.
+
+The cache lives in ``~/.cache/ethercat/topology.json``; set
+``ECAT_TOPOLOGY_CACHE`` to another file, or to an empty string to disable
+it.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from object_dictionary import decode_int
+from process_data import (
+    RXPDO_ENTRIES,
+    RXPDO_INDEX,
+    SM_INPUT_ASSIGN,
+    SM_OUTPUT_ASSIGN,
+    TXPDO_ENTRIES,
+    TXPDO_INDEX,
+    mapping_words,
+)
+
+TOPOLOGY_CACHE_ENV = "ECAT_TOPOLOGY_CACHE"
+CACHE_FILE = Path.home() / ".cache" / "ethercat" / "topology.json"
+IDENTITY_OBJECT = 0x1018
+
+
+class SlaveIdentity(NamedTuple):
+    vendor: int
+    product: int
+    revision: int
+    serial: int
+
+
+def expected_mapping() -> Dict[int, Tuple[int, List[int]]]:
+    """Objects written by ``configure_pdo_mapping``: ``{index: (size, values)}``."""
+    return {
+        RXPDO_INDEX: (4, mapping_words(RXPDO_ENTRIES)),
+        TXPDO_INDEX: (4, mapping_words(TXPDO_ENTRIES)),
+        SM_OUTPUT_ASSIGN: (2, [RXPDO_INDEX]),
+        SM_INPUT_ASSIGN: (2, [TXPDO_INDEX]),
+    }
+
+
+def read_identity(slave) -> SlaveIdentity:
+    """Identity of a configured ``pysoem`` slave.
+
+    Vendor, product and revision come from the EEPROM data read by
+    ``config_init()``; the serial number costs one SDO upload and is 0 if
+    the drive does not provide it.
+    """
+    try:
+        serial = decode_int(slave.sdo_read(IDENTITY_OBJECT, 4)[:4])
+    except Exception:
+        serial = 0
+    return SlaveIdentity(getattr(slave, "man", 0), getattr(slave, "id", 0),
+                         getattr(slave, "rev", 0), serial)
+
+
+def mapping_present(slave) -> bool:
+    """Whether ``slave`` still holds :func:`expected_mapping`.
+
+    Each object is read back with its entry count and one complete-access
+    upload of the entries.
+    """
+    try:
+        for index, (size, values) in expected_mapping().items():
+            if slave.sdo_read(index, 0)[0] != len(values):
+                return False
+            data = slave.sdo_read(index, 1, ca=True)
+            found = [decode_int(data[i * size:(i + 1) * size]) for i in range(len(values))]
+            if found != values:
+                return False
+    except Exception:
+        return False
+    return True
+
+
+def _mapping_record() -> Dict[str, List[int]]:
+    return {f"0x{index:04X}": values for index, (_, values) in expected_mapping().items()}
+
+
+class TopologyCache:
+    """JSON file of configured slaves keyed by adapter and position."""
+
+    def __init__(self, path) -> None:
+        self.path = Path(path)
+        try:
+            self.entries: Dict[str, Dict[str, dict]] = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def matches(self, ifname: str, position: int, identity: SlaveIdentity) -> bool:
+        """Whether this drive was configured with the current mapping before."""
+        record = self.entries.get(ifname, {}).get(str(position))
+        return (
+            record is not None
+            and record.get("identity") == list(identity)
+            and record.get("mapping") == _mapping_record()
+        )
+
+    def store(self, ifname: str, position: int, identity: SlaveIdentity) -> None:
+        self.entries.setdefault(ifname, {})[str(position)] = {
+            "identity": list(identity),
+            "mapping": _mapping_record(),
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.entries, indent=2))
+            os.replace(tmp, self.path)
+        except OSError:
+            pass  # read-only home: reconnects just stay cold
+
+    def forget(self, ifname: str, position: int) -> None:
+        self.entries.get(ifname, {}).pop(str(position), None)
+
+
+def from_env() -> Optional[TopologyCache]:
+    """Cache selected by ``ECAT_TOPOLOGY_CACHE``; ``None`` when disabled."""
+    path = os.environ.get(TOPOLOGY_CACHE_ENV)
+    if path == "":
+        return None
+    return TopologyCache(path or CACHE_FILE)
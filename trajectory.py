@@ -0,0 +1,197 @@
+"""Jerk-limited trajectories streamed as cyclic synchronous position setpoints.
+
+A :class:`Trajectory` joins rest-to-rest S-curve moves through a list of
+waypoints.  Each move has up to seven constant-jerk phases, so the whole path
+is a table of cubic pieces; :meth:`Trajectory.sample` evaluates any array of
+times with one ``searchsorted`` and one polynomial pass in NumPy.
+
+Setpoints are produced lazily: :meth:`Trajectory.chunks` yields arrays of
+``chunk`` consecutive cycle setpoints, so a move lasting hours never needs
+more than one chunk in memory.  :func:`stream_csp` writes them to a servo in
+cyclic synchronous position mode (8), one per cycle.
+
+Run ``python trajectory.py`` for a benchmark of setpoints generated per
+second.
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import time
+from typing import Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+CSP_MODE = 8
+
+
+def scurve_phases(distance: float, v_max: float, a_max: float, j_max: float) -> List[Tuple[float, float]]:
+    """Return ``(duration, jerk)`` of the seven phases of a rest-to-rest move.
+
+    Velocity and acceleration peaks are reduced when ``distance`` is too short
+    to reach ``v_max`` or ``a_max``.  Phases that do not occur have zero
+    duration.
+    """
+    if v_max <= 0 or a_max <= 0 or j_max <= 0:
+        raise ValueError("v_max, a_max and j_max must be positive")
+    sign = 1.0 if distance >= 0 else -1.0
+    d = abs(distance)
+    if d == 0:
+        return []
+
+    def accel_time(v: float) -> Tuple[float, float]:
+        # Jerk time and total acceleration time to reach ``v`` from rest.
+        if v * j_max >= a_max * a_max:
+            return a_max / j_max, a_max / j_max + v / a_max
+        tj = math.sqrt(v / j_max)
+        return tj, 2.0 * tj
+
+    v = v_max
+    tj, ta = accel_time(v)
+    if v * ta > d:
+        # Cruise velocity not reached: solve v * ta(v) = d for the peak.
+        v = (-a_max * a_max / j_max + math.sqrt((a_max * a_max / j_max) ** 2 + 4.0 * a_max * d)) / 2.0
+        if v * j_max < a_max * a_max:
+            v = (d * d * j_max / 4.0) ** (1.0 / 3.0)
+        tj, ta = accel_time(v)
+    tv = max(0.0, (d - v * ta) / v)
+    tc = max(0.0, ta - 2.0 * tj)
+    j = sign * j_max
+    return [(tj, j), (tc, 0.0), (tj, -j), (tv, 0.0), (tj, -j), (tc, 0.0), (tj, j)]
+
+
+class Trajectory:
+    """Jerk-limited path through ``waypoints``, stopping at each of them.
+
+    Parameters
+    ----------
+    waypoints : sequence of float
+        Positions at the gearbox output; the first one is the start.
+    v_max, a_max, j_max : float
+        Velocity, acceleration and jerk limits in output units per second
+        (squared, cubed).
+    gear_ratio : float
+        Motor revolutions per output revolution; setpoints are multiplied by
+        it, like :meth:`EthercatServo.set_target_position_after_gearbox`.
+    dwell : float
+        Seconds to hold at each intermediate waypoint.
+    """
+
+    def __init__(self, waypoints: Sequence[float], v_max: float, a_max: float, j_max: float,
+                 gear_ratio: float = 1.0, dwell: float = 0.0) -> None:
+        if len(waypoints) < 2:
+            raise ValueError("A trajectory needs at least two waypoints")
+        self.waypoints = [float(p) for p in waypoints]
+        self.gear_ratio = gear_ratio
+        phases: List[Tuple[float, float]] = []
+        for n, (start, stop) in enumerate(zip(self.waypoints, self.waypoints[1:])):
+            if n and dwell > 0:
+                phases.append((dwell, 0.0))
+            phases.extend(scurve_phases(stop - start, v_max, a_max, j_max))
+        self._build(phases)
+
+    def _build(self, phases: Sequence[Tuple[float, float]]) -> None:
+        # Integrate the phases exactly to get the state at each piece start.
+        count = len(phases) + 1
+        self._t0 = np.zeros(count)
+        self._p0 = np.zeros(count)
+        self._v0 = np.zeros(count)
+        self._a0 = np.zeros(count)
+        self._jerk = np.zeros(count)
+        t, p, v, a = 0.0, self.waypoints[0], 0.0, 0.0
+        for n, (dt, j) in enumerate(phases):
+            self._t0[n], self._p0[n], self._v0[n], self._a0[n], self._jerk[n] = t, p, v, a, j
+            p += v * dt + a * dt * dt / 2.0 + j * dt ** 3 / 6.0
+            v += a * dt + j * dt * dt / 2.0
+            a += j * dt
+            t += dt
+        # Final hold; snap to the last waypoint to drop rounding drift.
+        self._t0[-1], self._p0[-1] = t, self.waypoints[-1]
+        self.duration = t
+
+    def sample(self, t: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return output position, velocity and acceleration at times ``t``."""
+        t = np.asarray(t, dtype=float)
+        piece = np.searchsorted(self._t0, t, side="right") - 1
+        np.clip(piece, 0, len(self._t0) - 1, out=piece)
+        dt = t - self._t0[piece]
+        a0, v0, j = self._a0[piece], self._v0[piece], self._jerk[piece]
+        pos = self._p0[piece] + dt * (v0 + dt * (a0 / 2.0 + dt * j / 6.0))
+        vel = v0 + dt * (a0 + dt * j / 2.0)
+        acc = a0 + dt * j
+        return pos, vel, acc
+
+    def cycles(self, period: float) -> int:
+        """Number of setpoints at ``period``, including the final position."""
+        return int(math.ceil(self.duration / period - 1e-9)) + 1
+
+    def chunks(self, period: float, chunk: int = 4096) -> Iterator[np.ndarray]:
+        """Yield motor setpoints (``int64``) for consecutive cycles in blocks."""
+        total = self.cycles(period)
+        for start in range(0, total, chunk):
+            t = np.arange(start, min(start + chunk, total)) * period
+            pos = self.sample(t)[0]
+            yield np.rint(pos * self.gear_ratio).astype(np.int64)
+
+    def setpoints(self, period: float, chunk: int = 4096) -> Iterator[int]:
+        """Yield one motor setpoint per cycle."""
+        for block in self.chunks(period, chunk):
+            yield from block.tolist()
+
+
+def stream_csp(servo, setpoints, period: float) -> int:
+    """Write ``setpoints`` to ``servo`` in CSP mode, one per cycle.
+
+    The servo must already be in mode 8 and *Operation enabled*.  With a
+    cyclic process-data loop (``cycle_time`` set) each write waits for the next
+    exchange; otherwise writes are paced by ``servo.clock``.  Returns the
+    number of setpoints sent.
+    """
+    loop = getattr(servo, "pdo_loop", None)
+    clock = servo.clock
+    start = clock.time()
+    sent = 0
+    for sp in setpoints:
+        servo.set_target_position(sp)
+        sent += 1
+        if loop is not None:
+            loop.wait_cycles(1)
+        else:
+            clock.sleep(start + sent * period - clock.time())
+    return sent
+
+
+def benchmark(seconds: float = 3600.0, period: float = 0.001, chunk: int = 4096) -> Tuple[int, float]:
+    """Generate ``seconds`` worth of setpoints; return (count, elapsed)."""
+    traj = Trajectory([0.0, 1000.0, -500.0, 0.0], v_max=1.0, a_max=5.0, j_max=50.0, gear_ratio=30)
+    # Slow limits so the path lasts roughly ``seconds``.
+    scale = seconds / traj.duration
+    traj = Trajectory([0.0, 1000.0, -500.0, 0.0], v_max=1.0 / scale, a_max=5.0 / scale ** 2,
+                      j_max=50.0 / scale ** 3, gear_ratio=30)
+    start = time.perf_counter()
+    count = 0
+    for block in traj.chunks(period, chunk):
+        count += len(block)
+    return count, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark CSP setpoint generation")
+    parser.add_argument("--seconds", type=float, default=3600.0, help="length of the path")
+    parser.add_argument("--period", type=float, default=0.001, help="cycle time in seconds")
+    parser.add_argument("--chunk", type=int, default=4096, help="setpoints per chunk")
+    args = parser.parse_args()
+
+    count, elapsed = benchmark(args.seconds, args.period, args.chunk)
+    print(f"{count} setpoints in {elapsed * 1000:.1f} ms ({count / elapsed / 1e6:.1f} M setpoints/s)")
+
+    traj = Trajectory([0.0, 1.0], v_max=1.0, a_max=5.0, j_max=50.0)
+    start = time.perf_counter()
+    count = sum(1 for _ in traj.setpoints(args.period))
+    elapsed = time.perf_counter() - start
+    print(f"per-cycle generator: {count / elapsed / 1e6:.1f} M setpoints/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Link-loss watchdog bringing individual slaves back to OP.
+
+:class:`LinkWatchdog` runs next to the process-data loop, as the ``ecatcheck``
+thread of the SOEM examples does.  Every ``period`` it compares the last
+working counter with the expected one, which costs nothing.  The AL states
+are only read (one broadcast frame) when the counter is short, while a slave
+is still being recovered, or every ``state_interval`` seconds when no process
+data is exchanged.
+
+A slave that left OP is walked back without touching the others or the
+master:
+
+* SAFE-OP with the error flag: acknowledge the error;
+* SAFE-OP: request OP;
+* INIT or PRE-OP: ``reconfig()`` it (mailbox, PDO mapping and SAFE-OP);
+* no answer: mark it lost, then ``recover()`` it once it reappears.
+
+Each completed recovery is kept as a :class:`Recovery` in ``recoveries`` and
+recorded as ``link_recovery`` in the instruments.
+
+The slave and master objects only need the ``pysoem`` attributes used here
+(``state``, ``write_state()``, ``state_check()``, ``reconfig()``,
+``recover()``, ``read_state()``), so a small fake is enough for tests.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, NamedTuple, Optional, Set
+
+# EtherCAT AL states, numerically identical to pysoem's.
+NONE_STATE = 0x00
+INIT_STATE = 0x01
+PREOP_STATE = 0x02
+SAFEOP_STATE = 0x04
+OP_STATE = 0x08
+STATE_ERROR = 0x10
+STATE_ACK = 0x10
+
+
+class Recovery(NamedTuple):
+    """One slave's trip out of OP and back."""
+
+    position: int
+    detected: float
+    recovered: float
+    lost: bool  # the slave stopped answering altogether
+
+    @property
+    def duration(self) -> float:
+        return self.recovered - self.detected
+
+
+class LinkWatchdog:
+    """Supervise the slaves of ``master`` and recover the ones that drop out.
+
+    Parameters
+    ----------
+    master
+        Opened ``pysoem.Master`` (or look-alike) whose slaves are in OP.
+    pdo_loop : ProcessDataLoop, optional
+        Its working counter is checked every ``period``.
+    period : float
+        Seconds between checks.
+    state_interval : float
+        Seconds between AL state reads while everything looks healthy and
+        no working counter is available.
+    expected_wkc : int, optional
+        Working counter of a healthy cycle; defaults to
+        ``master.expected_wkc`` or three per slave.
+    timeout_us : int
+        Timeout passed to ``reconfig()``, ``recover()`` and ``state_check()``.
+    instruments : Instruments, optional
+        Receives ``link_recovery`` durations.
+    on_change : callable, optional
+        Called with ``(position, state)`` whenever a slave leaves or regains
+        OP, from the watchdog thread.
+    """
+
+    def __init__(self, master, pdo_loop=None, period: float = 0.005, state_interval: float = 0.1,
+                 expected_wkc: Optional[int] = None, timeout_us: int = 500_000,
+                 instruments=None, on_change: Optional[Callable[[int, int], None]] = None) -> None:
+        self.master = master
+        self.pdo_loop = pdo_loop
+        self.period = period
+        self.state_interval = state_interval
+        if expected_wkc is None:
+            expected_wkc = getattr(master, "expected_wkc", None) or 3 * len(master.slaves)
+        self.expected_wkc = expected_wkc
+        self.timeout_us = timeout_us
+        self.instruments = instruments
+        self.on_change = on_change
+        self.checks = 0
+        self.state_reads = 0
+        self.recoveries: Deque[Recovery] = deque(maxlen=256)
+        # position -> clock time the slave was seen out of OP
+        self.down: Dict[int, float] = {}
+        self.lost: Set[int] = set()
+        self._was_lost: Set[int] = set()
+        self._next_state_read = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def healthy(self) -> bool:
+        return not self.down
+
+    def _wkc_low(self) -> bool:
+        return self.pdo_loop is not None and self.pdo_loop.wkc < self.expected_wkc
+
+    def check(self, now: Optional[float] = None) -> bool:
+        """Run one supervision step; return whether the AL states were read."""
+        now = time.monotonic() if now is None else now
+        self.checks += 1
+        if not (self.down or self._wkc_low() or
+                (self.pdo_loop is None and now >= self._next_state_read)):
+            return False
+        self._next_state_read = now + self.state_interval
+        self.state_reads += 1
+        self.master.read_state()
+        for pos, slave in enumerate(self.master.slaves):
+            state = slave.state
+            if state == OP_STATE and pos not in self.lost:
+                if pos in self.down:
+                    self._recovered(pos, now)
+                continue
+            if pos not in self.down:
+                self.down[pos] = now
+                self._notify(pos, state)
+            self._recover_step(pos, slave, state)
+        return True
+
+    def _recover_step(self, pos: int, slave, state: int) -> None:
+        if pos in self.lost:
+            if state == NONE_STATE and not slave.recover(self.timeout_us):
+                return
+            # Found again; it is back in INIT and gets reconfigured next.
+            self.lost.discard(pos)
+        elif state == SAFEOP_STATE + STATE_ERROR:
+            slave.state = SAFEOP_STATE + STATE_ACK
+            slave.write_state()
+        elif state == SAFEOP_STATE:
+            slave.state = OP_STATE
+            slave.write_state()
+        elif state > NONE_STATE:
+            slave.reconfig(self.timeout_us)
+        elif slave.state_check(OP_STATE, self.timeout_us) == NONE_STATE:
+            self.lost.add(pos)
+            self._was_lost.add(pos)
+
+    def _recovered(self, pos: int, now: float) -> None:
+        detected = self.down.pop(pos)
+        recovery = Recovery(pos, detected, now, pos in self._was_lost)
+        self._was_lost.discard(pos)
+        self.recoveries.append(recovery)
+        if self.instruments is not None:
+            self.instruments.record("link_recovery", int(recovery.duration * 1e9), index=pos)
+        self._notify(pos, OP_STATE)
+
+    def _notify(self, pos: int, state: int) -> None:
+        if self.on_change is not None:
+            self.on_change(pos, state)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ecat-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.period):
+            try:
+                self.check()
+            except Exception:
+                # A failing frame must not end supervision; retry next period.
+                pass